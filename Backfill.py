@@ -0,0 +1,230 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ## Carga histórica (backfill) das temporadas anteriores
+# MAGIC O notebook “MVP Dados” carrega a temporada 2023-24. Este notebook carrega, de uma só vez, as temporadas anteriores das ligas cadastradas em mvp_dados/ligas.py, a partir dos arquivos data.zip que o football-data publica para cada temporada (https://www.football-data.co.uk/mmz4281/&lt;temporada&gt;/data.zip).
+# MAGIC
+# MAGIC - Os arquivos .zip são baixados em paralelo para o mesmo diretório lido pelo notebook “MVP Dados” e não são descompactados (mvp_dados/arquivo_zip.py).
+# MAGIC - O cabeçalho de cada arquivo é mapeado para o esquema unificado da tabela bronze (mvp_dados/bronze.py). As colunas que só existem em algumas temporadas são acrescentadas à tabela uma única vez, antes da gravação.
+# MAGIC - As temporadas são carregadas em paralelo. Cada uma substitui apenas a sua partição (Temporada) da tabela bronze.europa, então gravações simultâneas não entram em conflito e a carga pode ser repetida.
+# MAGIC - Ao final, os arquivos carregados são registrados em bronze.controle_arquivos, para que a carga incremental do “MVP Dados” não os leia novamente. As chaves das partidas carregadas (temporada, liga, mês, data e times) são gravadas em bronze.alteracoes_pendentes: a próxima carga incremental do “MVP Dados” (o modo padrão) as trata como partidas alteradas e recalcula, a partir da bronze já carregada, a silver, a forma recente das equipes, os ratings Elo e as partições correspondentes das tabelas gold, sem baixar nem recarregar os arquivos. As chaves são removidas da tabela depois de propagadas.
+
+# COMMAND ----------
+
+dbutils.widgets.text("temporada_inicial", "2000", "Temporada inicial")
+dbutils.widgets.text("temporada_final", "2022", "Temporada final")
+dbutils.widgets.text("paralelismo", "8", "Temporadas em paralelo")
+
+temporada_inicial = int(dbutils.widgets.get("temporada_inicial"))
+temporada_final = int(dbutils.widgets.get("temporada_final"))
+paralelismo = int(dbutils.widgets.get("paralelismo"))
+
+# Mesmo diretório de arquivos .zip lido pelo notebook "MVP Dados"
+DIRETORIO_ZIP = "/dbfs/FileStore/tables/futebol"
+
+# COMMAND ----------
+
+import os
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def baixar_temporada(temporada):
+    """Baixa o data.zip da temporada (ano de início) para DIRETORIO_ZIP, se ainda não tiver sido baixado."""
+    codigo = f"{temporada % 100:02d}{(temporada + 1) % 100:02d}"
+    destino = f"{DIRETORIO_ZIP}/temporada_{temporada}.zip"
+    if not os.path.exists(destino):
+        urllib.request.urlretrieve(f"https://www.football-data.co.uk/mmz4281/{codigo}/data.zip", destino + ".tmp")
+        os.replace(destino + ".tmp", destino)
+    return temporada, destino
+
+os.makedirs(DIRETORIO_ZIP, exist_ok=True)
+with ThreadPoolExecutor(max_workers=paralelismo) as executor:
+    ARQUIVOS_TEMPORADAS = dict(executor.map(baixar_temporada, range(temporada_inicial, temporada_final + 1)))
+
+print(f"{len(ARQUIVOS_TEMPORADAS)} temporadas disponíveis em {DIRETORIO_ZIP}")
+
+# COMMAND ----------
+
+import glob
+import zipfile
+from mvp_dados.arquivo_zip import cabecalho, caminho_membro, ler_texto, membros_ligas
+from mvp_dados.bronze import agrupar_por_cabecalho, colunas_da_tabela
+from mvp_dados.catalogo import ler_catalogo, verificar_cabecalho
+from mvp_dados.ligas import liga_do_arquivo
+
+# Catálogo de colunas (notes.txt do dataset do Kaggle, no mesmo diretório)
+arquivo_notas = next(arquivo for arquivo in sorted(glob.glob(f"{DIRETORIO_ZIP}/*.zip"))
+                     if "notes.txt" in zipfile.ZipFile(arquivo).namelist())
+CATALOGO = ler_catalogo(ler_texto(caminho_membro(arquivo_notas, "notes.txt")))
+
+# Arquivos de ligas cadastradas dentro de cada .zip: (caminho, tamanho, CRC-32)
+MEMBROS_TEMPORADAS = {temporada: membros_ligas(arquivo) for temporada, arquivo in ARQUIVOS_TEMPORADAS.items()}
+
+# Verificação dos cabeçalhos contra o catálogo: arquivos com colunas desconhecidas, repetidas ou sem as
+# colunas essenciais ficam de fora do backfill
+colunas_bronze = spark.table("bronze.europa").columns if spark.catalog.tableExists("bronze.europa") else []
+diagnosticos = [verificar_cabecalho(caminho, cabecalho(caminho), CATALOGO, colunas_bronze,
+                                    liga_do_arquivo(caminho).colunas_extras)
+                for membros in MEMBROS_TEMPORADAS.values() for caminho, _, _ in membros]
+quarentena_arquivos = {d.arquivo for d in diagnosticos if d.acao == "quarentena"}
+for d in diagnosticos:
+    if d.acao == "quarentena":
+        print(f"Quarentena: {d.arquivo} (desconhecidas {d.desconhecidas}, ausentes {d.ausentes}, repetidas {d.repetidas})")
+MEMBROS_TEMPORADAS = {temporada: [membro for membro in membros if membro[0] not in quarentena_arquivos]
+                      for temporada, membros in MEMBROS_TEMPORADAS.items()}
+
+# Esquema unificado, a partir apenas dos cabeçalhos de todos os arquivos
+grupos = agrupar_por_cabecalho([caminho for membros in MEMBROS_TEMPORADAS.values() for caminho, _, _ in membros])
+colunas_unificadas = colunas_da_tabela(grupos)
+print(f"{len(grupos)} cabeçalhos distintos, {len(colunas_unificadas)} colunas no esquema unificado")
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC A tabela bronze.europa é criada (se ainda não existir) ou tem o esquema evoluído com as colunas novas antes das gravações em paralelo: alterações de esquema simultâneas entrariam em conflito no Delta.
+
+# COMMAND ----------
+
+from mvp_dados.bronze import PROPRIEDADE_VERSAO
+from mvp_dados.catalogo import comentarios_bronze
+from mvp_dados.esquema import VERSAO
+from mvp_dados.layout import particoes
+
+spark.sql("CREATE DATABASE IF NOT EXISTS bronze")
+
+# Colunas com a descrição gerada do catálogo, na mesma instrução que cria ou altera a tabela
+comentarios = comentarios_bronze(CATALOGO)
+
+def coluna_ddl(nome, tipo):
+    """Definição da coluna para CREATE TABLE / ADD COLUMNS, com a descrição do catálogo."""
+    if nome not in comentarios:
+        return f"`{nome}` {tipo}"
+    comentario = comentarios[nome].replace("'", "\\'")
+    return f"`{nome}` {tipo} COMMENT '{comentario}'"
+
+colunas_ddl = ", ".join(coluna_ddl(nome, tipo) for nome, tipo in colunas_unificadas.items())
+if not spark.catalog.tableExists("bronze.europa"):
+    spark.sql(f"""CREATE TABLE bronze.europa ({colunas_ddl}, {coluna_ddl("Temporada", "INT")})
+                  USING DELTA PARTITIONED BY ({", ".join(particoes("bronze.europa"))})
+                  TBLPROPERTIES ('{PROPRIEDADE_VERSAO}' = '{VERSAO}')""")
+else:
+    existentes = set(spark.table("bronze.europa").columns)
+    novas = [coluna_ddl(nome, tipo) for nome, tipo in colunas_unificadas.items() if nome not in existentes]
+    if novas:
+        spark.sql(f"ALTER TABLE bronze.europa ADD COLUMNS ({', '.join(novas)})")
+        print(f"Colunas acrescentadas a bronze.europa: {novas}")
+
+spark.sql("""CREATE TABLE IF NOT EXISTS bronze.quarentena
+             (Arquivo STRING, Registro STRING, VersaoEsquema INT, DataIngestao TIMESTAMP) USING DELTA""")
+
+# Colunas da tabela bronze, na ordem da tabela: nome -> tipo
+COLUNAS_BRONZE = dict(spark.table("bronze.europa").dtypes)
+
+# COMMAND ----------
+
+import threading
+import time
+from pyspark.sql.functions import col, lit
+from mvp_dados.bronze import completar_colunas, ler_arquivos, preparar, renomear, separar_quarentena
+from mvp_dados.datas import (arquivos_acima_do_limite, datas_nulas_por_arquivo, formatos_por_arquivo, normalizar,
+                             separar_datas_nulas)
+
+# Chave natural de uma partida (a mesma do notebook "MVP Dados")
+CHAVE_PARTIDA = ["League", "DateMatch", "HomeTeam", "AwayTeam"]
+
+relatorio = []
+trava = threading.Lock()
+inicio_backfill = time.time()
+
+def carregar_temporada(temporada):
+    """Lê os arquivos da temporada e substitui a partição da temporada na tabela bronze.europa."""
+    inicio = time.time()
+    membros = MEMBROS_TEMPORADAS[temporada]
+    df_lido = ler_arquivos(spark, [caminho for caminho, _, _ in membros]).cache()
+    df_validas, df_quarentena = separar_quarentena(df_lido)
+
+    # Datas com o formato detectado em cada arquivo; arquivos com datas inválidas demais ficam de fora
+    df_normalizado = normalizar(df_validas, formatos_por_arquivo([caminho for caminho, _, _ in membros]))
+    rejeitados = arquivos_acima_do_limite(datas_nulas_por_arquivo(df_normalizado))
+    if rejeitados:
+        df_normalizado = df_normalizado.filter(~col("_arquivo").isin(list(rejeitados)))
+    df_normalizado, df_datas_nulas = separar_datas_nulas(df_normalizado)
+    df_quarentena = df_quarentena.unionByName(df_datas_nulas)
+
+    # Apenas as partidas da temporada
+    df_carga = (completar_colunas(renomear(preparar(spark, df_normalizado)))
+                .filter(col("Temporada") == temporada)
+                .dropDuplicates(CHAVE_PARTIDA))
+    df_carga = df_carga.select(*[col(c) if c in df_carga.columns else lit(None).cast(tipo).alias(c)
+                                 for c, tipo in COLUNAS_BRONZE.items()])
+    linhas = df_carga.count()
+
+    (df_carga.write.format("delta").mode("overwrite")
+        .option("replaceWhere", f"Temporada = {temporada}")
+        .saveAsTable("bronze.europa"))
+    quarentena = df_quarentena.count()
+    if quarentena:
+        df_quarentena.write.format("delta").mode("append").saveAsTable("bronze.quarentena")
+
+    df_lido.unpersist()
+    duracao = time.time() - inicio
+    megabytes = sum(tamanho for _, tamanho, _ in membros) / 2**20
+
+    with trava:
+        relatorio.append((temporada, len(membros), linhas, quarentena, round(megabytes, 2), round(duracao, 1),
+                          round(linhas / duracao)))
+        for arquivo, proporcao in rejeitados.items():
+            print(f"Quarentena: {arquivo} ({proporcao:.1%} de datas inválidas)")
+        print(f"[{len(relatorio)}/{len(MEMBROS_TEMPORADAS)}] temporada {temporada}: {len(membros)} arquivos, "
+              f"{linhas} partidas, {quarentena} em quarentena, {megabytes:.1f} MB em {duracao:.1f} s "
+              f"({linhas / duracao:.0f} partidas/s); {time.time() - inicio_backfill:.0f} s desde o início")
+
+# Temporadas carregadas em paralelo: cada thread envia seus próprios jobs ao Spark
+with ThreadPoolExecutor(max_workers=paralelismo) as executor:
+    list(executor.map(carregar_temporada, [t for t, membros in MEMBROS_TEMPORADAS.items() if membros]))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Relatório do backfill: partidas e volume carregados por temporada e vazão (partidas por segundo).
+
+# COMMAND ----------
+
+duracao_total = time.time() - inicio_backfill
+df_relatorio = spark.createDataFrame(sorted(relatorio), "Temporada INT, Arquivos INT, Partidas LONG, Quarentena LONG, "
+                                                        "MB DOUBLE, DuracaoS DOUBLE, PartidasPorS LONG")
+display(df_relatorio)
+
+total_partidas = sum(linha[2] for linha in relatorio)
+print(f"{len(relatorio)} temporadas, {total_partidas} partidas em {duracao_total:.0f} s "
+      f"({total_partidas / duracao_total:.0f} partidas/s com {paralelismo} temporadas em paralelo)")
+
+# COMMAND ----------
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import col, current_timestamp, month
+from mvp_dados.arquivo_zip import checksum
+
+# Registra os arquivos carregados, para que a carga incremental do "MVP Dados" não os leia novamente
+controle = []
+for temporada, arquivo in ARQUIVOS_TEMPORADAS.items():
+    controle.append((arquivo, os.path.getsize(arquivo), checksum(arquivo)))
+    controle += MEMBROS_TEMPORADAS[temporada]
+df_controle = (spark.createDataFrame(controle, "Arquivo STRING, Tamanho LONG, Checksum STRING")
+               .withColumn("DataIngestao", current_timestamp()))
+
+if not spark.catalog.tableExists("bronze.controle_arquivos"):
+    df_controle.write.format("delta").saveAsTable("bronze.controle_arquivos")
+else:
+    (DeltaTable.forName(spark, "bronze.controle_arquivos").alias("t")
+        .merge(df_controle.alias("s"), "t.Arquivo = s.Arquivo")
+        .whenMatchedUpdateAll()
+        .whenNotMatchedInsertAll()
+        .execute())
+
+# Partidas das temporadas carregadas, a propagar para as camadas silver e gold pela próxima carga
+# incremental do "MVP Dados"
+temporadas_carregadas = [temporada for temporada, *_ in relatorio]
+(spark.table("bronze.europa").where(col("Temporada").isin(temporadas_carregadas))
+    .select("Temporada", "League", month("DateMatch").alias("Mes"), "DateMatch", "HomeTeam", "AwayTeam")
+    .withColumn("DataIngestao", current_timestamp())
+    .write.format("delta").mode("append").saveAsTable("bronze.alteracoes_pendentes"))
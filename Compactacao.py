@@ -0,0 +1,21 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ## Compactação das tabelas do MVP
+# MAGIC Notebook para ser agendado como job (por exemplo, uma vez por dia, depois das cargas). Compacta os arquivos pequenos das tabelas configuradas em mvp_dados/layout.py e os reordena pelas colunas de Z-order, mantendo a leitura por liga, por período e por partida eficiente à medida que novas temporadas são carregadas.
+
+# COMMAND ----------
+
+from mvp_dados.layout import LAYOUT_TABELAS, arquivos_da_tabela, compactar
+
+# Compactando cada tabela e registrando a quantidade de arquivos antes e depois
+resultado = []
+for tabela in LAYOUT_TABELAS:
+    if not spark.catalog.tableExists(tabela):
+        continue
+    arquivos_antes, bytes_antes = arquivos_da_tabela(spark, tabela)
+    compactar(spark, tabela)
+    arquivos_depois, bytes_depois = arquivos_da_tabela(spark, tabela)
+    resultado.append((tabela, arquivos_antes, arquivos_depois, bytes_antes, bytes_depois))
+
+display(spark.createDataFrame(resultado, "tabela STRING, arquivos_antes LONG, arquivos_depois LONG, "
+                                         "bytes_antes LONG, bytes_depois LONG"))
@@ -49,29 +49,36 @@
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC --Limpando os bancos de dados antes de executar o trabalho, caso seja necessário
-# MAGIC DROP TABLE IF EXISTS bronze.europa;
-# MAGIC DROP TABLE IF EXISTS silver.europa;
+# MAGIC %md
+# MAGIC O notebook pode ser executado em dois modos de carga:
+# MAGIC - incremental (padrão): apenas os arquivos .csv que mudaram desde a última execução são lidos, e as partidas novas ou alteradas são incluídas na tabela bronze através de um MERGE, usando como chave a liga, a data e os times da partida. Reexecutar o notebook não duplica partidas e não exige apagar as tabelas.
+# MAGIC - completa: apaga as tabelas e recarrega todos os arquivos, como na primeira execução.
+# MAGIC
+# MAGIC As partidas carregadas pelo notebook “Backfill” (registradas em bronze.alteracoes_pendentes) também são tratadas como alteradas pela carga incremental: a silver e as tabelas derivadas dela são recalculadas a partir da bronze, sem recarregar os arquivos.
+# MAGIC
+# MAGIC Arquivos com mais datas inválidas que o limite (mvp_dados/datas.py) podem ir para a quarentena (padrão), sem interromper a carga dos demais, ou interromper a carga (falhar).
 
 # COMMAND ----------
 
-#Limpando arquivos antes de executar o trabalho, caso seja necessário
-dbutils.fs.rm("dbfs:/FileStore/Bundesliga23.csv", recurse=True)
-dbutils.fs.rm("dbfs:/FileStore/SerieA23.csv", recurse=True)
-dbutils.fs.rm("dbfs:/FileStore/Ligue1.csv", recurse=True)
-dbutils.fs.rm("dbfs:/FileStore/PL23.csv", recurse=True)
-dbutils.fs.rm("dbfs:/FileStore/LaLiga23.csv", recurse=True)
-dbutils.fs.rm("dbfs:/FileStore/notes.txt", recurse=True)
-dbutils.fs.rm("dbfs:/FileStore/tables/archive.zip", recurse=True)
-
+#Definindo o modo de carga
+dbutils.widgets.dropdown("modo_carga", "incremental", ["incremental", "completa"], "Modo de carga")
+modo_carga = dbutils.widgets.get("modo_carga")
+dbutils.widgets.dropdown("datas_invalidas", "quarentena", ["quarentena", "falhar"], "Arquivos com datas inválidas")
 
+# COMMAND ----------
 
+#Limpando os bancos de dados antes de executar o trabalho, apenas na carga completa
+if modo_carga == "completa":
+    spark.sql("DROP TABLE IF EXISTS bronze.europa")
+    spark.sql("DROP TABLE IF EXISTS bronze.controle_arquivos")
+    spark.sql("DROP TABLE IF EXISTS bronze.alteracoes_pendentes")
+    spark.sql("DROP TABLE IF EXISTS silver.europa")
 
 # COMMAND ----------
 
-dbutils.fs.rm("dbfs:/user/hive/warehouse/bronze.db", recurse=True)
-dbutils.fs.rm("dbfs:/user/hive/warehouse/silver.db", recurse=True)
+if modo_carga == "completa":
+    dbutils.fs.rm("dbfs:/user/hive/warehouse/bronze.db", recurse=True)
+    dbutils.fs.rm("dbfs:/user/hive/warehouse/silver.db", recurse=True)
 
 # COMMAND ----------
 
@@ -87,39 +94,32 @@ dbutils.library.restartPython()
 
 # COMMAND ----------
 
-# MAGIC %sh
-# MAGIC #Baixando o arquivo com o dataset
-# MAGIC kaggle datasets download -d audreyhengruizhang/european-soccer-data
-
-# COMMAND ----------
-
-#Listando o arquivo baixado
-dbutils.fs.ls('file:/databricks/driver')
+# MAGIC %md
+# MAGIC O arquivo .zip do dataset é baixado diretamente para o FileStore e não é descompactado: os arquivos .csv são lidos de dentro dele na etapa de carga (mvp_dados/arquivo_zip.py). Assim, os dados descompactados não são gravados nem no disco do driver nem no DBFS. Qualquer outro .zip do football-data colocado no mesmo diretório também é carregado.
 
 # COMMAND ----------
 
 # MAGIC %sh
-# MAGIC #Descompactando o arquivo
-# MAGIC unzip /databricks/driver/european-soccer-data.zip
+# MAGIC #Baixando o arquivo com o dataset
+# MAGIC mkdir -p /dbfs/FileStore/tables/futebol
+# MAGIC kaggle datasets download -d audreyhengruizhang/european-soccer-data -p /dbfs/FileStore/tables/futebol
 
 # COMMAND ----------
 
-#Movendo os arquivos para o FileStore
-dbutils.fs.mv('file:/databricks/driver/Bundesliga23.csv', 'dbfs:/FileStore/', recurse=True)
-dbutils.fs.mv('file:/databricks/driver/SerieA23.csv', 'dbfs:/FileStore/', recurse=True)
-dbutils.fs.mv('file:/databricks/driver/LaLiga23.csv', 'dbfs:/FileStore/', recurse=True)
-dbutils.fs.mv('file:/databricks/driver/Ligue1.csv', 'dbfs:/FileStore/', recurse=True)
-dbutils.fs.mv('file:/databricks/driver/PL23.csv', 'dbfs:/FileStore/', recurse=True)
-dbutils.fs.mv('file:/databricks/driver/notes.txt', 'dbfs:/FileStore/', recurse=True)
+# MAGIC %md
+# MAGIC Arquivos disponíveis dentro do .zip:
 
 # COMMAND ----------
 
-# MAGIC %md
-# MAGIC Arquivos disponíveis no FileStore:
+import glob
+import zipfile
 
-# COMMAND ----------
+# Diretório com os arquivos .zip do football-data (caminho local, acessível em todos os nós)
+DIRETORIO_ZIP = "/dbfs/FileStore/tables/futebol"
+ARQUIVOS_ZIP = sorted(glob.glob(f"{DIRETORIO_ZIP}/*.zip"))
 
-dbutils.fs.ls("dbfs:/FileStore/")
+for arquivo in ARQUIVOS_ZIP:
+    print(arquivo, zipfile.ZipFile(arquivo).namelist())
 
 # COMMAND ----------
 
@@ -139,9 +139,9 @@ dbutils.fs.ls("dbfs:/FileStore/")
 # COMMAND ----------
 
 #Exibindo o catálogo de dados
-file_path = "dbfs:/FileStore/notes.txt"
-content = dbutils.fs.head(file_path)
-print(content)
+from mvp_dados.arquivo_zip import caminho_membro, ler_texto
+
+print(ler_texto(caminho_membro(ARQUIVOS_ZIP[0], "notes.txt")))
 
 # COMMAND ----------
 
@@ -159,81 +159,184 @@ print(content)
 
 # MAGIC %md
 # MAGIC ##Carga
-# MAGIC Para realizar o processo de extração, transformação e carga (ETL), inicialmente, vamos avaliar os arquivos que coletamos e já armazenamos no FileSystem:
+# MAGIC Para realizar o processo de extração, transformação e carga (ETL), inicialmente, vamos avaliar os arquivos que coletamos e já armazenamos no FileSystem.
+# MAGIC
+# MAGIC As ligas carregadas estão cadastradas no registro de ligas (mvp_dados/ligas.py): para cada código de liga, os padrões de nome dos arquivos, o nome exibido nas consultas e as particularidades de colunas de cada liga (como a coluna “Referee”, que só existe nos arquivos da liga inglesa). Novas divisões ou temporadas passadas são carregadas apenas colocando os arquivos .zip do football-data no diretório DIRETORIO_ZIP, sem alterar o notebook.
 
 # COMMAND ----------
 
 # DBTITLE 1,e,
-dfbl = spark.read.format('csv').option('header', 'true').load('/FileStore/Bundesliga23.csv')
-dfsa = spark.read.format('csv').option('header', 'true').load('/FileStore/SerieA23.csv')
-dfl1 = spark.read.format('csv').option('header', 'true').load('/FileStore/Ligue1.csv')
-dfll = spark.read.format('csv').option('header', 'true').load('/FileStore/LaLiga23.csv')
-dfpl = spark.read.format('csv').option('header', 'true').load('/FileStore/PL23.csv')
+from mvp_dados.arquivo_zip import cabecalho, membros_ligas
+
+# Arquivos de ligas cadastradas no registro, dentro de cada .zip: (caminho, tamanho, CRC-32)
+MEMBROS_LIGAS = [membro for arquivo in ARQUIVOS_ZIP for membro in membros_ligas(arquivo)]
+ARQUIVOS_LIGAS = [caminho for caminho, _, _ in MEMBROS_LIGAS]
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Ao analisar os arquivos, foi observado que o arquivo PL23.csv possui uma coluna a mais que os demais. Analisando os arquivos percebemos que a coluna a mais que o arquivo possuía era a “Referee” (árbitro). Esta não será necessária para as perguntas do nosso MVP.
+# MAGIC Para avaliar os arquivos basta ler o cabeçalho (primeira linha) de cada um. Em vez de comparar os cabeçalhos manualmente, o catálogo de dados (notes.txt) é convertido em uma lista de colunas com descrição e tipo (mvp_dados/catalogo.py, que inclui as cotações de fechamento), e o cabeçalho de cada arquivo é comparado com o catálogo e com as colunas atuais da tabela bronze antes de qualquer leitura dos dados. Para cada arquivo, a verificação decide:
+# MAGIC - carregar: todas as colunas já existem na tabela bronze;
+# MAGIC - evoluir: há colunas do catálogo que ainda não existem na tabela; elas serão acrescentadas na gravação;
+# MAGIC - quarentena: há colunas fora do catálogo, colunas repetidas ou faltam colunas essenciais (liga, data, times e resultado); o arquivo não é carregado e fica registrado na tabela bronze.quarentena_arquivos.
+# MAGIC
+# MAGIC Colunas que o registro de ligas declara como extras (como a Referee) aparecem como descartadas.
 
 # COMMAND ----------
 
-dfpl = spark.read.format('csv').option('header', 'true').load('/FileStore/PL23.csv').drop('Referee')
+from mvp_dados.arquivo_zip import caminho_membro, ler_texto
+from mvp_dados.catalogo import ler_catalogo, verificar_cabecalho
+from mvp_dados.ligas import liga_do_arquivo
+
+# Catálogo de colunas, a partir do notes.txt do primeiro .zip que o contém
+arquivo_notas = next(arquivo for arquivo in ARQUIVOS_ZIP if "notes.txt" in zipfile.ZipFile(arquivo).namelist())
+CATALOGO = ler_catalogo(ler_texto(caminho_membro(arquivo_notas, "notes.txt")))
+
+# Colunas atuais da tabela bronze (apenas metadados; vazio na primeira carga)
+colunas_bronze = spark.table("bronze.europa").columns if spark.catalog.tableExists("bronze.europa") else []
+
+DIAGNOSTICOS = {arquivo: verificar_cabecalho(arquivo, cabecalho(arquivo), CATALOGO, colunas_bronze,
+                                             liga_do_arquivo(arquivo).colunas_extras)
+                for arquivo in ARQUIVOS_LIGAS}
+ARQUIVOS_QUARENTENA = [arquivo for arquivo, diagnostico in DIAGNOSTICOS.items() if diagnostico.acao == "quarentena"]
+
+display(spark.createDataFrame(
+    [(d.arquivo, d.acao, d.novas, d.descartadas, d.desconhecidas, d.ausentes, d.repetidas) for d in DIAGNOSTICOS.values()],
+    "Arquivo STRING, Acao STRING, Novas ARRAY<STRING>, Descartadas ARRAY<STRING>, Desconhecidas ARRAY<STRING>, "
+    "Ausentes ARRAY<STRING>, Repetidas ARRAY<STRING>"))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Ao analisar os arquivos, foi observado que o arquivo PL23.csv possui uma coluna a mais que os demais. Analisando os arquivos percebemos que a coluna a mais que o arquivo possuía era a “Referee” (árbitro). Esta não será necessária para as perguntas do nosso MVP, e será descartada na leitura do arquivo.
 
 # COMMAND ----------
 
 # MAGIC %md
 # MAGIC Outro ponto que precisará ser trabalhado são os tipos de dados. Todas as colunas dos arquivos .csv estão no formato string. Vamos converter os campos dos arquivos em formatos que possam ser trabalhados posteriormente (data, hora, int e double). E depois vamos fazer uma junção dos arquivos correspondentes a cada liga em uma única visão (o nosso modelo flat).
+# MAGIC
+# MAGIC Em vez de deixar o Spark inferir os tipos (inferSchema, que percorre cada arquivo duas vezes), os arquivos são lidos com um esquema tipado e versionado do layout do football-data, definido em mvp_dados/esquema.py e que inclui as colunas de cotações de fechamento (*C*). Cada arquivo é lido pelos nomes das colunas do seu cabeçalho (mvp_dados/bronze.py): arquivos de outras temporadas, com outras colunas, são mapeados para o mesmo esquema unificado, e colunas novas são acrescentadas à tabela bronze. As linhas que não puderem ser convertidas para o esquema não viram valores nulos silenciosamente: elas são separadas e gravadas na tabela de quarentena bronze.quarentena.
+# MAGIC
+# MAGIC As datas e os horários passam por uma etapa própria de normalização (mvp_dados/datas.py). O formato da data é detectado em uma amostra das primeiras linhas de cada arquivo (as temporadas antigas usam o ano com 2 dígitos, e o século vem do ano da primeira data do arquivo, igual no Spark e na execução local), e o horário, publicado pelo football-data no horário do Reino Unido, é combinado com a data no instante de início da partida (TimeMatch, em UTC) e no horário local da liga (InicioLocal). A proporção de datas nulas de cada arquivo é calculada sobre os dados já em cache, sem uma nova leitura: acima do limite, o arquivo inteiro vai para a quarentena (ou a carga é interrompida, conforme o parâmetro datas_invalidas); abaixo dele, apenas as linhas sem data vão para a tabela bronze.quarentena.
+# MAGIC
+# MAGIC Na carga incremental, antes de ler os arquivos, comparamos o checksum (MD5) de cada .zip com o registrado na tabela de controle bronze.controle_arquivos na última carga. Se o .zip não mudou, nada é lido. Se mudou, comparamos o CRC-32 de cada .csv dentro dele (registrado no próprio .zip, sem precisar descompactá-lo) e lemos apenas os arquivos que mudaram.
 
 # COMMAND ----------
 
+import os
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, to_date
+from pyspark.sql.functions import col, current_timestamp, month
+from mvp_dados.arquivo_zip import checksum, rdd_linhas
+from mvp_dados.bronze import ler_arquivos, preparar, separar_quarentena, versao_da_tabela
+from mvp_dados.datas import (LIMITE_DATAS_NULAS, arquivos_acima_do_limite, datas_nulas_por_arquivo,
+                             formatos_por_arquivo, normalizar, separar_datas_nulas)
+from mvp_dados.esquema import VERSAO
+from mvp_dados.layout import layout_atualizado
 
 # Inicialize a sessão do Spark
 spark = SparkSession.builder.getOrCreate()
 
-# Carregue o arquivo CSV como DataFrame
-dfbl = spark.read.csv("/FileStore/Bundesliga23.csv", header=True, inferSchema=True)
-dfsa = spark.read.csv("/FileStore/SerieA23.csv", header=True, inferSchema=True)
-dfl1 = spark.read.csv("/FileStore/Ligue1.csv", header=True, inferSchema=True)
-dfll = spark.read.csv("/FileStore/LaLiga23.csv", header=True, inferSchema=True)
-dfpl = spark.read.csv("/FileStore/PL23.csv", header=True, inferSchema=True).drop('Referee')
-
-# Converta a coluna "date" para o tipo "date"
-dfbl = dfbl.withColumn("Date", to_date(col("Date"), "dd-MM-yyyy"))
-dfsa = dfsa.withColumn("Date", to_date(col("Date"), "dd-MM-yyyy"))
-dfl1 = dfl1.withColumn("Date", to_date(col("Date"), "dd-MM-yyyy"))
-dfll = dfll.withColumn("Date", to_date(col("Date"), "dd-MM-yyyy"))
-dfpl = dfpl.withColumn("Date", to_date(col("Date"), "dd-MM-yyyy"))
-
-# Unir as 5 tabelas
-df_final = dfbl.union(dfl1).union(dfll).union(dfsa).union(dfpl)
+modo_carga = dbutils.widgets.get("modo_carga")
+
+# Uma tabela bronze gravada com outro particionamento precisa ser recarregada por completo
+if modo_carga == "incremental" and spark.catalog.tableExists("bronze.europa") and not layout_atualizado(spark, "bronze.europa"):
+    print("O particionamento de bronze.europa mudou: todos os arquivos serão recarregados")
+    modo_carga = "completa"
+
+# Uma tabela bronze gravada com outra versão do esquema (por exemplo, com o horário sem a data) também
+if modo_carga == "incremental" and spark.catalog.tableExists("bronze.europa") and versao_da_tabela(spark, "bronze.europa") != VERSAO:
+    print(f"A tabela bronze.europa não está na versão {VERSAO} do esquema: todos os arquivos serão recarregados")
+    modo_carga = "completa"
+
+# Checksums registrados na última carga
+if modo_carga == "incremental" and spark.catalog.tableExists("bronze.controle_arquivos"):
+    checksums_carregados = dict(spark.table("bronze.controle_arquivos").select("Arquivo", "Checksum").collect())
+else:
+    checksums_carregados = {}
+
+# Arquivos .zip e .csv (dentro dos .zip) novos ou alterados desde a última carga: (Arquivo, Tamanho, Checksum)
+pendentes = []
+for arquivo in ARQUIVOS_ZIP:
+    checksum_zip = checksum(arquivo)
+    if checksums_carregados.get(arquivo) == checksum_zip:
+        continue
+    pendentes.append((arquivo, os.path.getsize(arquivo), checksum_zip))
+    pendentes += [membro for membro in MEMBROS_LIGAS
+                  if membro[0].startswith(arquivo + "/") and checksums_carregados.get(membro[0]) != membro[2]]
+# Arquivos em quarentena não são lidos nem registrados no controle: serão verificados de novo na próxima carga
+pendentes = [pendente for pendente in pendentes if pendente[0] not in ARQUIVOS_QUARENTENA]
+df_pendentes = spark.createDataFrame(pendentes, "Arquivo STRING, Tamanho LONG, Checksum STRING")
+arquivos_pendentes = [arquivo for arquivo, _, _ in pendentes if arquivo in ARQUIVOS_LIGAS]
+print(f"Arquivos a carregar: {arquivos_pendentes}")
+
+# Carregue os arquivos pendentes como DataFrame, cada um com o esquema do seu cabeçalho, unidos pelo nome das colunas.
+# O cache é necessário para filtrar pela coluna de registros corrompidos.
+df_lido = ler_arquivos(spark, arquivos_pendentes).cache()
+
+# Linhas que não puderam ser convertidas para o esquema vão para a quarentena
+df_validas, df_quarentena = separar_quarentena(df_lido)
+
+# Datas convertidas com o formato detectado em cada arquivo e início da partida no fuso da liga
+FORMATOS_DATA_ARQUIVOS = formatos_por_arquivo(arquivos_pendentes)
+df_normalizado = normalizar(df_validas, FORMATOS_DATA_ARQUIVOS)
+
+# Proporção de datas nulas por arquivo, calculada sobre os dados em cache
+ARQUIVOS_DATAS_INVALIDAS = arquivos_acima_do_limite(datas_nulas_por_arquivo(df_normalizado))
+for arquivo, proporcao in ARQUIVOS_DATAS_INVALIDAS.items():
+    print(f"{arquivo}: {proporcao:.1%} de datas inválidas (formato detectado: {FORMATOS_DATA_ARQUIVOS[arquivo][0]})")
+if ARQUIVOS_DATAS_INVALIDAS and dbutils.widgets.get("datas_invalidas") == "falhar":
+    raise ValueError(f"Arquivos com mais de {LIMITE_DATAS_NULAS:.0%} de datas inválidas: {list(ARQUIVOS_DATAS_INVALIDAS)}")
+
+# Arquivos acima do limite vão inteiros para a quarentena e, como os da verificação do cabeçalho, não
+# são registrados no controle; nos demais, apenas as linhas sem data vão para a quarentena
+if ARQUIVOS_DATAS_INVALIDAS:
+    df_normalizado = df_normalizado.filter(~col("_arquivo").isin(list(ARQUIVOS_DATAS_INVALIDAS)))
+    df_pendentes = df_pendentes.filter(~col("Arquivo").isin(list(ARQUIVOS_DATAS_INVALIDAS)))
+df_normalizado, df_datas_nulas = separar_datas_nulas(df_normalizado)
+df_quarentena = df_quarentena.unionByName(df_datas_nulas)
+
+# Temporada e nome da liga
+df_final = preparar(spark, df_normalizado)
+
 # Exibir
 display(df_final)
 
 # COMMAND ----------
 
+# MAGIC %md
+# MAGIC Comparando o tempo de leitura dos arquivos com o esquema explícito e com o inferSchema (a gravação no formato "noop" força a leitura completa sem gravar nada):
+
+# COMMAND ----------
+
+import time
+
+def tempo_leitura(leituras):
+    """Tempo, em segundos, para ler por completo os DataFrames retornados pela função leituras."""
+    inicio = time.time()
+    for df in leituras():
+        df.write.format("noop").mode("overwrite").save()
+    return round(time.time() - inicio, 2)
+
+tempos = [
+    ("inferSchema", tempo_leitura(
+        lambda: [spark.read.csv(rdd_linhas(spark, [arquivo]), inferSchema=True) for arquivo in ARQUIVOS_LIGAS])),
+    (f"esquema explícito (versão {VERSAO})", tempo_leitura(
+        lambda: [ler_arquivos(spark, ARQUIVOS_LIGAS)])),
+]
+display(spark.createDataFrame(tempos, ["leitura", "duracao_s"]))
+
+# COMMAND ----------
+
 # MAGIC %md
 # MAGIC Também foi observado que algumas colunas dos arquivos .csv apresentavam nomes que poderiam vir a causar erro nas etapas posteriores, seja porque são palavras que já pertencem à linguagem SQL ou por apresentarem espaços ou caracteres inválidos.
 
 # COMMAND ----------
 
-# Renomeie as colunas usando a função withColumnRenamed
-df_final = df_final.withColumnRenamed('Div', 'League')
-df_final = df_final.withColumnRenamed('Date', 'DateMatch')
-df_final = df_final.withColumnRenamed('Time', 'TimeMatch')
-df_final = df_final.withColumnRenamed('AS', 'ASS')
-df_final = df_final.withColumnRenamed('FTHG and HG', 'FTHGandHG')
-df_final = df_final.withColumnRenamed('FTAG and AG', 'FTAGandAG')
-df_final = df_final.withColumnRenamed('FTR and Res', 'FTRandRes')
-df_final = df_final.withColumnRenamed('B365>2.5', 'B365O25')
-df_final = df_final.withColumnRenamed('B365<2.5', 'B365U25')
-df_final = df_final.withColumnRenamed('P>2.5', 'PO25')
-df_final = df_final.withColumnRenamed('P<2.5', 'PU25')
-df_final = df_final.withColumnRenamed('Max>2.5', 'MaxO25')
-df_final = df_final.withColumnRenamed('Max<2.5', 'MaxU25')
-df_final = df_final.withColumnRenamed('Avg>2.5', 'AvgO25')
-df_final = df_final.withColumnRenamed('Avg<2.5', 'AvgU25')
+from mvp_dados.bronze import completar_colunas, renomear
+
+# Renomeie as colunas (NOMES_TABELA em mvp_dados/esquema.py) e inclua, nulas, as colunas do esquema
+# atual que não existem nos arquivos de temporadas antigas
+df_final = completar_colunas(renomear(df_final))
 
 # Exibir DataFrame com a coluna renomeada
 display(df_final)
@@ -242,6 +345,8 @@ display(df_final)
 
 # MAGIC %md
 # MAGIC Já tendo os dados e no formato desejado, vamos providenciar a criação do banco de dados “bronze”, para salvar os dados dos 5 arquivos em uma única tabela “europa”. Nela, os dados serão salvos já no formato adequado para o trabalho (seja string, date, timestamp, int ou double).
+# MAGIC
+# MAGIC Apenas para fins didáticos neste MVP, os valores da coluna “League”, que no dataset original contém códigos, são transformados no nome do país de cada liga já na leitura dos arquivos (junção com o registro de ligas), para facilitar a visualização dos resultados das consultas. Como a liga faz parte da chave da partida usada no MERGE, a transformação precisa acontecer antes da gravação, e não depois com um UPDATE na tabela.
 
 # COMMAND ----------
 
@@ -250,93 +355,121 @@ display(df_final)
 
 # COMMAND ----------
 
-dbutils.fs.rm('dbfs:/user/hive/warehouse/bronze.db/europa',True) 
-df_final.write.format("delta").mode("append").saveAsTable("bronze.europa")
-
-# COMMAND ----------
-
 # MAGIC %md
-# MAGIC Podemos observar que o banco foi criado. Entretanto, o schema não possui a descrição de cada coluna do banco. Vamos providenciar o cadastro dos metadados da tabela "europa".
-
-# COMMAND ----------
-
-#exibindo schema com metadados
-spark.sql("DESCRIBE EXTENDED bronze.europa").show(truncate=False)
+# MAGIC Como a base deve crescer com novas temporadas, vamos registrar, para cada etapa do pipeline (leitura dos arquivos, gravações e consultas de análise), o tempo de execução, as linhas e os bytes lidos e gravados, os arquivos adicionados e removidos (reescritos), o shuffle e o spill (mvp_dados/metricas.py). Os números de linhas e arquivos gravados vêm do histórico da tabela Delta (DESCRIBE HISTORY), sem precisar de uma nova leitura da tabela; os de leitura, shuffle e spill, das métricas dos estágios do Spark executados pela etapa. As métricas desta execução, identificadas por ID_EXECUCAO, são gravadas ao final do notebook na tabela ops.pipeline_metrics.
+
+# COMMAND ----------
+
+import uuid
+from delta.tables import DeltaTable
+from mvp_dados.metricas import ESQUEMA_METRICAS, medir_etapa
+
+# Identificador desta execução do notebook, comum às métricas das etapas e ao relatório de qualidade
+ID_EXECUCAO = str(uuid.uuid4())
+
+# Métricas de cada etapa executada nesta sessão
+metricas_etapas = []
+
+def executar_etapa(etapa, tabela, funcao):
+    """Executa uma etapa (que grava na tabela Delta informada ou, com tabela None, uma consulta) e registra as métricas."""
+    retorno, metricas = medir_etapa(spark, ID_EXECUCAO, etapa, tabela, funcao)
+    metricas_etapas.append(metricas)
+    return retorno
+
+# COMMAND ----------
+
+from pyspark.sql.functions import col, lit, max as maximo
+from mvp_dados.bronze import comentar, mesclar_partidas, partidas_alteradas, registrar_versao
+from mvp_dados.catalogo import comentarios_bronze
+from mvp_dados.layout import particoes
+
+# Chave natural de uma partida
+CHAVE_PARTIDA = ["League", "DateMatch", "HomeTeam", "AwayTeam"]
+
+# Descrição de cada coluna, gerada do catálogo (notes.txt) e gravada junto com os dados
+df_carga = comentar(df_final.dropDuplicates(CHAVE_PARTIDA), comentarios_bronze(CATALOGO))
+
+# Partidas novas ou alteradas em relação à bronze (todas as colunas comparadas, antes do MERGE): o
+# football-data republica a temporada inteira a cada rodada, mas apenas as equipes com partidas novas ou
+# alteradas são recalculadas
+# (primeira ação sobre os arquivos pendentes: a leitura e a conversão para o esquema são medidas aqui)
+df_alteradas = df_carga if modo_carga == "completa" else partidas_alteradas(spark, "bronze.europa", df_carga)
+df_chaves = df_alteradas.select("Temporada", "League", month("DateMatch").alias("Mes"), "DateMatch", "HomeTeam", "AwayTeam")
+
+# Partidas carregadas pelo notebook "Backfill" e ainda não propagadas para as camadas silver e gold (as
+# registradas até este ponto são removidas ao final da camada gold)
+limite_pendentes = None
+if modo_carga == "incremental" and spark.catalog.tableExists("bronze.alteracoes_pendentes"):
+    limite_pendentes = spark.table("bronze.alteracoes_pendentes").agg(maximo("DataIngestao")).first()[0]
+if limite_pendentes is not None:
+    df_chaves = df_chaves.unionByName(spark.table("bronze.alteracoes_pendentes")
+                                      .where(col("DataIngestao") <= lit(limite_pendentes))
+                                      .select(*df_chaves.columns))
+chaves_alteradas = executar_etapa("leitura arquivos", None, lambda: df_chaves.collect())
+print(f"Partidas novas ou alteradas: {len(chaves_alteradas)}")
+particoes_alteradas = sorted({(p.Temporada, p.League, p.Mes) for p in chaves_alteradas})
+
+# Primeira data com partida nova ou alterada de cada equipe
+equipes_alteradas = {}
+for p in chaves_alteradas:
+    for equipe in (p.HomeTeam, p.AwayTeam):
+        equipes_alteradas[equipe] = min(p.DateMatch, equipes_alteradas.get(equipe, p.DateMatch))
+
+# Linhas rejeitadas na leitura
+if not df_quarentena.isEmpty():
+    df_quarentena.write.format("delta").mode("append").saveAsTable("bronze.quarentena")
+
+# Arquivos rejeitados na verificação do cabeçalho ou por excesso de datas inválidas
+arquivos_rejeitados = [(arquivo, "cabeçalho", DIAGNOSTICOS[arquivo].desconhecidas, DIAGNOSTICOS[arquivo].ausentes,
+                        DIAGNOSTICOS[arquivo].repetidas, None) for arquivo in ARQUIVOS_QUARENTENA]
+arquivos_rejeitados += [(arquivo, "datas", [], [], [], proporcao) for arquivo, proporcao in ARQUIVOS_DATAS_INVALIDAS.items()]
+if arquivos_rejeitados:
+    (spark.createDataFrame(arquivos_rejeitados,
+                           "Arquivo STRING, Motivo STRING, Desconhecidas ARRAY<STRING>, Ausentes ARRAY<STRING>, "
+                           "Repetidas ARRAY<STRING>, ProporcaoDatasNulas DOUBLE")
+        .withColumn("DataIngestao", current_timestamp())
+        .write.format("delta").mode("append").option("mergeSchema", "true")
+        .saveAsTable("bronze.quarentena_arquivos"))
+
+if modo_carga == "completa" or not spark.catalog.tableExists("bronze.europa"):
+    executar_etapa("carga bronze", "bronze.europa",
+                   lambda: df_carga.write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                       .partitionBy(*particoes("bronze.europa"))
+                       .saveAsTable("bronze.europa"))
+    registrar_versao(spark, "bronze.europa")
+else:
+    # Partidas novas são inseridas e as já gravadas só são atualizadas se alguma coluna mudou. Colunas
+    # novas (de arquivos de outras temporadas) são acrescentadas ao esquema da tabela pelo MERGE e, como
+    # ainda não existem na tabela, contam como alteração apenas quando vêm preenchidas (mvp_dados/bronze.py)
+    executar_etapa("merge bronze", "bronze.europa",
+                   lambda: mesclar_partidas(spark, "bronze.europa", df_carga, CHAVE_PARTIDA))
+
+# Registra o checksum dos arquivos carregados, para que não sejam lidos novamente enquanto não mudarem
+df_controle = df_pendentes.withColumn("DataIngestao", current_timestamp())
+if not spark.catalog.tableExists("bronze.controle_arquivos"):
+    df_controle.write.format("delta").saveAsTable("bronze.controle_arquivos")
+else:
+    (DeltaTable.forName(spark, "bronze.controle_arquivos").alias("t")
+        .merge(df_controle.alias("s"), "t.Arquivo = s.Arquivo")
+        .whenMatchedUpdateAll()
+        .whenNotMatchedInsertAll()
+        .execute())
+df_lido.unpersist()
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC  
-# MAGIC ![test image](files/tables/mvp_2.jpg)
+# MAGIC Podemos observar que o banco foi criado. A descrição de cada coluna (metadados) não é cadastrada com um ALTER TABLE por coluna, o que gera um commit no log da tabela Delta para cada uma: as descrições são geradas a partir do catálogo de dados (notes.txt, incluindo as cotações de fechamento) e do mapa de renomeação das colunas, e gravadas no esquema da tabela junto com os dados, na mesma transação da carga. Na carga incremental, as colunas novas também chegam com a descrição pelo MERGE.
+# MAGIC
+# MAGIC Caso a tabela já existisse com descrições diferentes (por exemplo, depois de uma correção no catálogo), apenas as colunas divergentes são atualizadas:
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC --Incluindo metadados no schema
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	League 	League 	STRING	COMMENT 'League Division';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	DateMatch 	DateMatch 	DATE	COMMENT 'Match Date (dd/mm/yy)';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	TimeMatch 	TimeMatch 	TIMESTAMP	COMMENT 'Time of match kick off';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HomeTeam 	HomeTeam 	STRING	COMMENT 'Home Team';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AwayTeam 	AwayTeam 	STRING	COMMENT 'Away Team';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	FTHG	FTHG	INT	COMMENT 'Full Time Home Team Goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	FTAG	FTAG	INT	COMMENT 'Full Time Away Team Goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	FTR	FTR	STRING	COMMENT 'Full Time Result (H Home Win, D Draw, A Away Win)';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HTHG 	HTHG 	INT	COMMENT 'Half Time Home Team Goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HTAG 	HTAG 	INT	COMMENT 'Half Time Away Team Goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HTR 	HTR 	STRING	COMMENT 'Half Time Result (H Home Win, D Draw, A Away Win)';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HS 	HS 	INT	COMMENT 'Home Team Shots';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	ASS 	ASS 	INT	COMMENT 'Away Team Shots';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HST 	HST 	INT	COMMENT 'Home Team Shots on Target';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AST 	AST 	INT	COMMENT 'Away Team Shots on Target';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HC 	HC 	INT	COMMENT 'Home Team Corners';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AC 	AC 	INT	COMMENT 'Away Team Corners';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HF 	HF 	INT	COMMENT 'Home Team Fouls Committed';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AF 	AF 	INT	COMMENT 'Away Team Fouls Committed';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HY 	HY 	INT	COMMENT 'Home Team Yellow Cards';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AY 	AY 	INT	COMMENT 'Away Team Yellow Cards';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	HR 	HR 	INT	COMMENT 'Home Team Red Cards';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AR 	AR 	INT	COMMENT 'Away Team Red Cards';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	B365H 	B365H 	DOUBLE	COMMENT 'Bet365 home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	B365D 	B365D 	DOUBLE	COMMENT 'Bet365 draw odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	B365A 	B365A 	DOUBLE	COMMENT 'Bet365 away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	BWH 	BWH 	DOUBLE	COMMENT 'Bet&Win home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	BWD 	BWD 	DOUBLE	COMMENT 'Bet&Win draw odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	BWA 	BWA 	DOUBLE	COMMENT 'Bet&Win away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	IWH 	IWH 	DOUBLE	COMMENT 'Interwetten home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	IWD 	IWD 	DOUBLE	COMMENT 'Interwetten draw odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	IWA 	IWA 	DOUBLE	COMMENT 'Interwetten away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	PSH	PSH	DOUBLE	COMMENT 'Pinnacle home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	PSD	PSD	DOUBLE	COMMENT 'Pinnacle draw odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	PSA	PSA	DOUBLE	COMMENT 'Pinnacle away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	VCH 	VCH 	DOUBLE	COMMENT 'VC Bet home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	VCD 	VCD 	DOUBLE	COMMENT 'VC Bet draw odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	VCA 	VCA 	DOUBLE	COMMENT 'VC Bet away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	WHH 	WHH 	DOUBLE	COMMENT 'William Hill home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	WHD 	WHD 	DOUBLE	COMMENT 'William Hill draw odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	WHA 	WHA 	DOUBLE	COMMENT 'William Hill away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	MaxH 	MaxH 	DOUBLE	COMMENT 'Market maximum home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	MaxD 	MaxD 	DOUBLE	COMMENT 'Market maximum draw win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	MaxA 	MaxA 	DOUBLE	COMMENT 'Market maximum away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AvgH 	AvgH 	DOUBLE	COMMENT 'Market average home win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AvgD 	AvgD 	DOUBLE	COMMENT 'Market average draw win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AvgA 	AvgA 	DOUBLE	COMMENT 'Market average away win odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AHh 	AHh 	DOUBLE	COMMENT 'Market size of handicap (home team) (since 2019/2020)';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	B365AHH 	B365AHH 	DOUBLE	COMMENT 'Bet365 Asian handicap home team odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	B365AHA 	B365AHA 	DOUBLE	COMMENT 'Bet365 Asian handicap away team odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	PAHH 	PAHH 	DOUBLE	COMMENT 'Pinnacle Asian handicap home team odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	PAHA 	PAHA 	DOUBLE	COMMENT 'Pinnacle Asian handicap away team odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	MaxAHH 	MaxAHH 	DOUBLE	COMMENT 'Market maximum Asian handicap home team odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	MaxAHA 	MaxAHA 	DOUBLE	COMMENT '	" Market maximum Asian handicap away team odds	"';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AvgAHH 	AvgAHH 	DOUBLE	COMMENT 'Market average Asian handicap home team odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AvgAHA 	AvgAHA 	DOUBLE	COMMENT 'Market average Asian handicap away team odds';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	B365O25 	B365O25 	DOUBLE	COMMENT 'Bet365 over 2.5 goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	B365U25 	B365U25 	DOUBLE	COMMENT 'Bet365 under 2.5 goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	PO25 	PO25 	DOUBLE	COMMENT 'Pinnacle over 2.5 goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	PU25 	PU25 	DOUBLE	COMMENT 'Pinnacle under 2.5 goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	MaxO25 	MaxO25 	DOUBLE	COMMENT 'Market maximum over 2.5 goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	MaxU25 	MaxU25 	DOUBLE	COMMENT 'Market maximum under 2.5 goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AvgO25 	AvgO25 	DOUBLE	COMMENT 'Market average over 2.5 goals';
-# MAGIC ALTER TABLE bronze.europa CHANGE COLUMN 	AvgU25 	AvgU25 	DOUBLE	COMMENT 'Market average under 2.5 goals';
+from mvp_dados.bronze import comentarios_divergentes
+
+for coluna, comentario in comentarios_divergentes(spark, "bronze.europa", comentarios_bronze(CATALOGO)):
+    comentario = comentario.replace("'", "\\'")
+    spark.sql(f"ALTER TABLE bronze.europa ALTER COLUMN `{coluna}` COMMENT '{comentario}'")
 
 # COMMAND ----------
 
@@ -357,30 +490,15 @@ spark.sql("DESCRIBE EXTENDED bronze.europa").show(truncate=False)
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Por fim, apenas para fins didáticos neste MVP, vamos transformar os valores da nova coluna “League”, que no dataset original continha códigos, para o nome do país de cada liga, para facilitar a visualização dos resultados das consultas.
+# MAGIC Por fim, conferimos a quantidade de partidas de cada liga, já com o nome do país no lugar do código da liga. Reexecutar a carga incremental não deve alterar estes números.
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC UPDATE bronze.europa 
-# MAGIC SET League = 'Inglaterra' 
-# MAGIC WHERE League = 'E0';
-# MAGIC
-# MAGIC UPDATE bronze.europa 
-# MAGIC SET League = 'Itália' 
-# MAGIC WHERE League = 'I1';
-# MAGIC
-# MAGIC UPDATE bronze.europa 
-# MAGIC SET League = 'Espanha' 
-# MAGIC WHERE League = 'SP1';
-# MAGIC
-# MAGIC UPDATE bronze.europa 
-# MAGIC SET League = 'Alemanha' 
-# MAGIC WHERE League = 'D1';
-# MAGIC
-# MAGIC UPDATE bronze.europa 
-# MAGIC SET League = 'França' 
-# MAGIC WHERE League = 'F1';
+# MAGIC SELECT League, COUNT(*) AS partidas
+# MAGIC FROM bronze.europa
+# MAGIC GROUP BY League
+# MAGIC ORDER BY League;
 
 # COMMAND ----------
 
@@ -425,7 +543,7 @@ spark.sql("DESCRIBE EXTENDED bronze.europa").show(truncate=False)
 # MAGIC     AvgH,
 # MAGIC     ROUND((B365D + BWD + IWD + PSD + WHD + VCD) / 6, 2) AS media_D,
 # MAGIC     AvgD,
-# MAGIC     ROUND((B365H + BWA + IWA + PSA + WHA + VCA) / 6, 2) AS media_A,
+# MAGIC     ROUND((B365A + BWA + IWA + PSA + WHA + VCA) / 6, 2) AS media_A,
 # MAGIC     AvgA
 # MAGIC FROM
 # MAGIC     bronze.europa
@@ -438,6 +556,8 @@ spark.sql("DESCRIBE EXTENDED bronze.europa").show(truncate=False)
 # MAGIC %md
 # MAGIC Os arquivos apresentam as cotações de 6 casas de apostas, enquanto o arquivo de catálogo de informações mostra dados de 12 casas. Acreditamos que os máximos e médias tenham sido calculados em cima da base completa com estas 12 casas, mas não podemos garantir essa hipótese. O mesmo problema com máximos e médias ocorre para as cotações de “over/under” e “asian handicap” (mas estas, a princípio, não serão necessárias para responder às perguntas, por isso não iremos ajustar neste MVP).
 # MAGIC
+# MAGIC Em vez de conferir partidas isoladas, essas e outras verificações são feitas em todas as partidas na criação da camada silver, como expectativas de qualidade (mvp_dados/qualidade.py): máximos e médias do mercado coerentes com as cotações das casas, margem de cada casa (1/H + 1/D + 1/A) dentro de limites, cotações preenchidas por casa e resultado (FTR) coerente com o placar. As violações são contadas durante a própria gravação da tabela silver (métricas observadas, sem consultas adicionais) e cada execução registra o resultado na tabela silver.relatorio_qualidade.
+# MAGIC
 # MAGIC Antes de iniciar o tratamento destas colunas, vamos criar a camada silver do banco de dados para trabalhar.
 # MAGIC
 
@@ -449,11 +569,38 @@ spark.sql("DESCRIBE EXTENDED bronze.europa").show(truncate=False)
 
 # COMMAND ----------
 
-# Define o banco de dados "bronze" como o banco de dados padrão
-spark.sql("USE bronze")
+# MAGIC %md
+# MAGIC Agora vamos corrigir as informações de máximos e médias. Para isso, a sugestão do trabalho será criar colunas para registrar os valores de máximo e média que sejam necessários para responder às perguntas propostas, considerando apenas das empresas cujos dados constam no dataset.
+# MAGIC
+# MAGIC Como foi observado que, para algumas partidas, o valor das cotações de alguma casa de apostas poderia estar indisponível (estando assim “null” no banco de dados), usamos um tratamento com a função COALESCE para que as médias desconsiderassem esses casos.
+# MAGIC
+# MAGIC Em vez de copiar a tabela bronze e depois acrescentar cada coluna com um ALTER TABLE seguido de um UPDATE (cada UPDATE reescreve todos os arquivos da tabela Delta), todas as colunas derivadas da camada silver são declaradas em uma única lista (DERIVACOES_SILVER, em mvp_dados/silver.py), na ordem em que dependem umas das outras. A tabela silver é então gerada com uma única projeção sobre a bronze e gravada uma única vez. As colunas VencedorAposta, PercentAbsol*, Percent* e Percentual, explicadas na seção “Solução do Problema”, também fazem parte desta lista.
+
+# COMMAND ----------
+
+from datetime import datetime
+from pyspark.sql.functions import expr
+from mvp_dados.layout import particoes
+from mvp_dados.qualidade import ESQUEMA_RELATORIO, observar, relatorio
+from mvp_dados.silver import derivar_silver
+
+# Gera a tabela "europa" do banco de dados "silver" com uma única leitura da bronze e uma única gravação.
+# As expectativas de qualidade são contadas na mesma execução da gravação.
+df_silver_carga, observacao_qualidade = observar(derivar_silver(spark.table("bronze.europa")))
+executar_etapa("carga silver", "silver.europa",
+               lambda: df_silver_carga
+                   .write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                   .partitionBy(*particoes("silver.europa"))
+                   .saveAsTable("silver.europa"))
 
-# Copia a tabela "europa" para o banco de dados "silver"
-spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa")
+# Relatório de qualidade desta execução
+df_qualidade = spark.createDataFrame(
+    relatorio(observacao_qualidade.get, ID_EXECUCAO, datetime.now(), "silver.europa"), ESQUEMA_RELATORIO)
+df_qualidade.write.format("delta").mode("append").saveAsTable("silver.relatorio_qualidade")
+display(df_qualidade)
+
+# Tempo e linhas gravadas por etapa
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
 
 # COMMAND ----------
 
@@ -463,58 +610,438 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 
 # COMMAND ----------
 
+# MAGIC %sql
+# MAGIC --Máximos e médias recalculados para a partida entre Lyon e Le Havre
+# MAGIC SELECT MaiorValorH, MaiorValorD, MaiorValorA, MediaH, MediaD, MediaA
+# MAGIC FROM silver.europa
+# MAGIC WHERE HomeTeam = "Lyon"
+# MAGIC AND AwayTeam = "Le Havre"
+
+# COMMAND ----------
+
 # MAGIC %md
-# MAGIC Agora vamos corrigir as informações de máximos e médias. Para isso, a sugestão do trabalho será criar colunas para registrar os valores de máximo e média que sejam necessários para responder às perguntas propostas, considerando apenas das empresas cujos dados constam no dataset.
+# MAGIC As mesmas colunas derivadas também são calculadas, sem Spark, pelo módulo mvp_dados/probabilidades.py, que opera sobre arrays NumPy com os mesmos arredondamentos e tipos do Spark SQL. Assim, o cálculo pode ser executado e conferido localmente, direto sobre os .csv do archive.zip (função partidas_do_zip), ou no cluster através de pandas UDFs. Abaixo comparamos o tempo dos três caminhos (a gravação "noop" força o cálculo completo sem gravar nada) e conferimos se os resultados coincidem com a tabela silver.
+
+# COMMAND ----------
+
+from mvp_dados.probabilidades import CASAS_MEDIA, COLUNAS_DERIVADAS, RESULTADOS, derivar, udfs_spark
+
+colunas_cotacoes = ["FTR"] + [f"{casa}{r}" for r in RESULTADOS for casa in CASAS_MEDIA]
+
+def tempo(funcao):
+    """Tempo, em segundos, para executar a função."""
+    inicio = time.time()
+    funcao()
+    return round(time.time() - inicio, 2)
+
+tempos = [
+    ("Spark SQL (DERIVACOES_SILVER)", tempo(
+        lambda: derivar_silver(spark.table("bronze.europa")).write.format("noop").mode("overwrite").save())),
+    ("pandas UDF (mapInPandas)", tempo(
+        lambda: udfs_spark()["derivar"](spark.table("bronze.europa")).write.format("noop").mode("overwrite").save())),
+    ("NumPy no driver (toPandas + derivar)", tempo(
+        lambda: derivar(spark.table("bronze.europa").select(*colunas_cotacoes).toPandas()))),
+]
+display(spark.createDataFrame(tempos, ["caminho", "duracao_s"]))
+
+# Linhas em que alguma coluna calculada pelo NumPy difere da tabela silver (o esperado é 0)
+df_numpy = udfs_spark()["derivar"](spark.table("bronze.europa").select(*CHAVE_PARTIDA, *colunas_cotacoes))
+divergentes = (df_numpy.alias("n")
+               .join(spark.table("silver.europa").alias("s"), CHAVE_PARTIDA)
+               .filter(" OR ".join(f"NOT (n.{c} <=> s.{c})" for c in COLUNAS_DERIVADAS))
+               .count())
+print(f"Linhas divergentes entre NumPy e Spark SQL: {divergentes}")
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Movimento das cotações
+# MAGIC As análises usam as cotações de abertura, mas os arquivos também trazem as de fechamento (últimas antes do início da partida). Para responder se o mercado “acerta mais” perto do início da partida sem varrer as mais de 100 colunas da tabela silver, criamos a tabela silver.movimento_odds, com uma linha por partida e casa de apostas (e também o máximo e a média do mercado):
+# MAGIC - OddH/D/A e OddCH/CD/CA: cotações de abertura e de fechamento; VariacaoH/D/A: fechamento menos abertura;
+# MAGIC - ProbH/D/A e ProbCH/CD/CA: probabilidades implícitas normalizadas (sem a margem), em %; DerivaH/D/A: variação da probabilidade;
+# MAGIC - MargemAbertura e MargemFechamento: margem da casa (soma das probabilidades implícitas menos 100%);
+# MAGIC - ProbResultado e ProbCResultado: probabilidade atribuída ao resultado ocorrido na abertura e no fechamento.
+# MAGIC
+# MAGIC A tabela é calculada em uma única projeção sobre a bronze e particionada por liga.
+
+# COMMAND ----------
+
+from mvp_dados.casas import RESULTADOS, casas_com_fechamento, stack_movimento
+
+def movimento_odds(df):
+    """Uma linha por partida e casa, com as cotações de abertura e de fechamento e a deriva das probabilidades."""
+    df = (df.select("Temporada", "League", "DateMatch", "HomeTeam", "AwayTeam", "FTR",
+                    expr(stack_movimento(casas_com_fechamento(df.columns))))
+          .where(" AND ".join(f"Odd{c}{r} IS NOT NULL" for c in ("", "C") for r in RESULTADOS)))
+    for c, margem in (("", "MargemAbertura"), ("C", "MargemFechamento")):
+        soma = " + ".join(f"1 / Odd{c}{r}" for r in RESULTADOS)
+        df = df.withColumn(margem, expr(f"({soma} - 1) * 100"))
+        for r in RESULTADOS:
+            df = df.withColumn(f"Prob{c}{r}", expr(f"(1 / Odd{c}{r}) * 100 / ({soma})"))
+        df = df.withColumn(f"Prob{c}Resultado", expr(f"CASE FTR WHEN 'H' THEN Prob{c}H WHEN 'D' THEN Prob{c}D WHEN 'A' THEN Prob{c}A END"))
+    for r in RESULTADOS:
+        df = (df.withColumn(f"Variacao{r}", expr(f"OddC{r} - Odd{r}"))
+                .withColumn(f"Deriva{r}", expr(f"ProbC{r} - Prob{r}")))
+    return df
+
+executar_etapa("carga movimento_odds", "silver.movimento_odds",
+               lambda: movimento_odds(spark.table("bronze.europa"))
+                   .write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                   .partitionBy(*particoes("silver.movimento_odds"))
+                   .saveAsTable("silver.movimento_odds"))
+
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
 
 # COMMAND ----------
 
 # MAGIC %sql
+# MAGIC --O mercado fica mais preciso até o início da partida? Probabilidade média atribuída ao resultado ocorrido, na abertura e no fechamento
+# MAGIC SELECT League, CasaAposta,
+# MAGIC        COUNT(*) AS Partidas,
+# MAGIC        ROUND(AVG(ProbResultado), 2) AS ProbResultadoAbertura,
+# MAGIC        ROUND(AVG(ProbCResultado), 2) AS ProbResultadoFechamento,
+# MAGIC        ROUND(AVG(ProbCResultado - ProbResultado), 2) AS Ganho,
+# MAGIC        ROUND(AVG(MargemAbertura), 2) AS MargemAbertura,
+# MAGIC        ROUND(AVG(MargemFechamento), 2) AS MargemFechamento
+# MAGIC FROM silver.movimento_odds
+# MAGIC GROUP BY League, CasaAposta
+# MAGIC ORDER BY League, Ganho DESC
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Liquidação dos mercados de handicap asiático e de gols
+# MAGIC Além do 1X2, os arquivos trazem as cotações de handicap asiático (linha AHh/AHCh e cotações do mandante e do visitante) e de mais/menos de 2,5 gols, da Bet365, da Pinnacle e do máximo e da média do mercado, na abertura e no fechamento. Para responder às perguntas que esses mercados permitem, criamos a tabela silver.liquidacao_mercados, com uma linha por partida, casa, mercado e momento, e o resultado de cada lado da aposta a partir do placar final:
+# MAGIC - Fator1/Fator2 e Resultado1/Resultado2: 1 (vitória), 0,5 (meia vitória), 0 (devolução), -0,5 (meia derrota) ou -1 (derrota); nas linhas de quarto (como -0,75), a aposta é dividida entre as duas linhas vizinhas;
+# MAGIC - Lucro1/Lucro2: lucro por unidade apostada em cada lado;
+# MAGIC - Prob1/Prob2 e Margem: probabilidades implícitas sem a margem e margem da casa, em %;
+# MAGIC - Favorito e AcertoFavorito: lado de menor cotação e se ele venceu (ou meio-venceu) a aposta.
 # MAGIC
-# MAGIC ALTER TABLE silver.europa ADD COLUMN MaiorValorH DOUBLE;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN MaiorValorD DOUBLE;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN MaiorValorA DOUBLE;
+# MAGIC Assim como a movimento_odds, a tabela é calculada com expressões SQL (stack e CASE) em uma única projeção sobre a silver (mvp_dados/liquidacao.py), sem UDFs, e particionada por liga.
+
+# COMMAND ----------
+
+from mvp_dados.liquidacao import liquidar
+
+executar_etapa("carga liquidacao_mercados", "silver.liquidacao_mercados",
+               lambda: liquidar(spark.table("silver.europa"))
+                   .write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                   .partitionBy(*particoes("silver.liquidacao_mercados"))
+                   .saveAsTable("silver.liquidacao_mercados"))
+
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC --Índice de acerto do favorito e lucro médio de cada lado, por casa, mercado e momento
+# MAGIC SELECT CasaAposta, Mercado, Momento,
+# MAGIC        COUNT(*) AS Apostas,
+# MAGIC        ROUND(AVG(CAST(AcertoFavorito AS INT)) * 100, 2) AS AcertoFavorito,
+# MAGIC        ROUND(AVG(CASE WHEN Fator1 = 0 THEN 100 ELSE 0 END), 2) AS Devolucoes,
+# MAGIC        ROUND(AVG(Margem), 2) AS Margem,
+# MAGIC        ROUND(AVG(Lucro1) * 100, 2) AS YieldLado1,
+# MAGIC        ROUND(AVG(Lucro2) * 100, 2) AS YieldLado2
+# MAGIC FROM silver.liquidacao_mercados
+# MAGIC GROUP BY CasaAposta, Mercado, Momento
+# MAGIC ORDER BY Mercado, CasaAposta, Momento
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Forma recente das equipes
+# MAGIC Para relacionar as estatísticas das partidas (chutes, escanteios, gols) com as cotações, criamos a tabela silver.forma_equipes, com uma linha por partida e equipe (nas perspectivas do mandante e do visitante) e, para cada uma, as médias das 5 partidas anteriores da equipe: gols marcados e sofridos, chutes no alvo, escanteios, pontos e força implícita nas cotações (probabilidade normalizada de vitória da equipe). A partida da própria linha não entra nas médias, que representam o que se sabia antes dela, e por isso podem ser usadas como variáveis de modelos.
 # MAGIC
-# MAGIC UPDATE silver.europa
-# MAGIC SET MaiorValorH = GREATEST(B365H, BWH, IWH, PSH, WHH, VCH),
-# MAGIC     MaiorValorD = GREATEST(B365D, BWD, IWD, PSD, WHD, VCD),
-# MAGIC     MaiorValorA = GREATEST(B365A, BWA, IWA, PSA, WHA, VCA);
+# MAGIC As médias são calculadas com funções de janela particionadas por equipe (mvp_dados/forma.py). Na carga incremental, apenas as equipes com partidas novas ou alteradas são recalculadas, e apenas as linhas a partir da primeira partida alterada de cada uma são atualizadas com um MERGE. A tabela é ordenada (Z-order) por equipe e data, para a busca das variáveis de uma equipe em uma data.
+
+# COMMAND ----------
+
+from pyspark.sql.functions import broadcast, col
+from mvp_dados.forma import CHAVE_FORMA, forma_equipes, partidas_por_equipe
+
+if modo_carga == "completa" or not spark.catalog.tableExists("silver.forma_equipes"):
+    executar_etapa("carga forma_equipes", "silver.forma_equipes",
+                   lambda: forma_equipes(partidas_por_equipe(spark.table("silver.europa")))
+                       .write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                       .partitionBy(*particoes("silver.forma_equipes"))
+                       .saveAsTable("silver.forma_equipes"))
+elif equipes_alteradas:
+    # Janela recalculada com todo o histórico das equipes alteradas; apenas as linhas a partir da
+    # primeira partida alterada de cada equipe são gravadas
+    df_equipes = spark.createDataFrame(list(equipes_alteradas.items()), "Equipe STRING, DataInicial DATE")
+    df_forma = (forma_equipes(partidas_por_equipe(spark.table("silver.europa"), list(equipes_alteradas)))
+                .join(broadcast(df_equipes), "Equipe")
+                .where(col("DateMatch") >= col("DataInicial"))
+                .drop("DataInicial"))
+    colunas_merge = CHAVE_FORMA + [c for c in particoes("silver.forma_equipes") if c not in CHAVE_FORMA]
+    executar_etapa("merge forma_equipes", "silver.forma_equipes",
+                   lambda: DeltaTable.forName(spark, "silver.forma_equipes").alias("t")
+                       .merge(df_forma.alias("s"), " AND ".join(f"t.`{c}` <=> s.`{c}`" for c in colunas_merge))
+                       .whenMatchedUpdateAll()
+                       .whenNotMatchedInsertAll()
+                       .execute())
+
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC --Forma das equipes antes da partida entre Barcelona e Girona
+# MAGIC SELECT Equipe, Mando, DateMatch, PartidasNaJanela, MediaGolsPro, MediaGolsContra, MediaChutesNoAlvo,
+# MAGIC        MediaEscanteios, MediaPontos, MediaForcaImplicita
+# MAGIC FROM silver.forma_equipes
+# MAGIC WHERE HomeTeam = "Barcelona"
+# MAGIC AND AwayTeam = "Girona"
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Como foi observado que, para algumas partidas, o valor das cotações de alguma casa de apostas poderia estar indisponível (estando assim “null” no banco de dados), usamos um tratamento com a função COALESCE para que as médias desconsiderassem esses casos.
+# MAGIC ###Ratings Elo das equipes
+# MAGIC Para avaliar se as casas de apostas erram mais em algum período (por exemplo, no início da temporada), precisamos de uma previsão de referência que não venha das cotações. Criamos a tabela silver.elo_partidas com, para cada partida, os ratings Elo das duas equipes antes dela (EloH, EloA), as probabilidades de vitória do mandante, empate e vitória do visitante dadas pelos ratings (EloProbH/D/A) e o resultado mais provável (EloPrevisto), ao lado da previsão das casas (VencedorAposta e PercentH/D/A).
+# MAGIC
+# MAGIC Os ratings são calculados em ordem cronológica, uma liga por vez e as ligas em paralelo (mvp_dados/elo.py), com as partidas de cada data processadas juntas. O último rating de cada equipe fica na tabela silver.elo_estado, que funciona como checkpoint: na carga incremental, apenas as ligas com partidas novas ou alteradas são processadas, a partir da primeira data alterada de cada uma. Como o resultado de uma partida muda os ratings de todas as partidas seguintes da liga, as partidas a partir dessa data (inclusive as corrigidas ou republicadas, que já estavam na tabela) são recalculadas, partindo do checkpoint, se a data for posterior a ele (o caso comum: partidas novas de uma rodada), ou do estado das equipes antes dela, obtido das partidas já calculadas. As datas vêm apenas das partidas novas ou alteradas em relação à bronze, e não de todas as partidas do arquivo republicado a cada rodada; o checkpoint é regravado apenas nas ligas recalculadas.
+
+# COMMAND ----------
+
+from pyspark.sql.functions import broadcast, col, max as maximo
+from mvp_dados.elo import COLUNAS_PARTIDAS, calcular_spark, estado_spark
+
+# Previsão das casas, ao lado da previsão dos ratings
+df_partidas_elo = spark.table("silver.europa").select(*COLUNAS_PARTIDAS, "VencedorAposta", "PercentH", "PercentD", "PercentA")
+
+if modo_carga == "completa" or not spark.catalog.tableExists("silver.elo_partidas"):
+    df_estado = spark.createDataFrame([], "League STRING, Equipe STRING, Rating DOUBLE, Temporada INT, DateMatch DATE, Partidas LONG")
+    df_novas = df_partidas_elo
+else:
+    # Primeira data com partida nova ou alterada de cada liga: como o resultado de uma partida muda os
+    # ratings de todas as partidas seguintes da liga, elas são recalculadas a partir dessa data
+    datas_alteradas = {}
+    for p in chaves_alteradas:
+        datas_alteradas[p.League] = min(p.DateMatch, datas_alteradas.get(p.League, p.DateMatch))
+    df_datas = spark.createDataFrame(list(datas_alteradas.items()), "League STRING, DataAlterada DATE")
+    df_novas = (df_partidas_elo.join(broadcast(df_datas), "League")
+                .where(col("DateMatch") >= col("DataAlterada")).drop("DataAlterada"))
+
+    # Estado antes da data: o checkpoint (silver.elo_estado) nas ligas em que ela é posterior a ele e,
+    # nas demais, o último rating de cada equipe nas partidas já calculadas antes dela
+    checkpoints = {linha.League: linha.Checkpoint for linha in spark.table("silver.elo_estado")
+                   .groupBy("League").agg(maximo("DateMatch").alias("Checkpoint")).collect()}
+    ligas_checkpoint = [liga for liga, data in datas_alteradas.items()
+                        if liga in checkpoints and data > checkpoints[liga]]
+    ligas_recalculadas = [liga for liga in datas_alteradas if liga not in ligas_checkpoint]
+    if ligas_recalculadas:
+        datas_recalculadas = {liga: str(datas_alteradas[liga]) for liga in ligas_recalculadas}
+        print(f"Ligas recalculadas a partir de partidas já processadas: {datas_recalculadas}")
+    df_estado = (spark.table("silver.elo_estado").where(col("League").isin(ligas_checkpoint))
+                 .unionByName(estado_spark(spark.table("silver.elo_partidas")
+                                           .where(col("League").isin(ligas_recalculadas))
+                                           .join(broadcast(df_datas), "League")
+                                           .where(col("DateMatch") < col("DataAlterada")))))
+
+df_elo = calcular_spark(df_novas, df_estado)
+if modo_carga == "completa" or not spark.catalog.tableExists("silver.elo_partidas"):
+    executar_etapa("carga elo_partidas", "silver.elo_partidas",
+                   lambda: df_elo.write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                       .partitionBy(*particoes("silver.elo_partidas"))
+                       .saveAsTable("silver.elo_partidas"))
+
+    # Checkpoint: último rating de cada equipe
+    executar_etapa("carga elo_estado", "silver.elo_estado",
+                   lambda: estado_spark(spark.table("silver.elo_partidas"))
+                       .write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                       .saveAsTable("silver.elo_estado"))
+elif datas_alteradas:
+    executar_etapa("merge elo_partidas", "silver.elo_partidas",
+                   lambda: DeltaTable.forName(spark, "silver.elo_partidas").alias("t")
+                       .merge(df_elo.alias("s"), " AND ".join(f"t.`{c}` <=> s.`{c}`" for c in CHAVE_PARTIDA))
+                       .whenMatchedUpdateAll()
+                       .whenNotMatchedInsertAll()
+                       .execute())
+
+    # Checkpoint atualizado apenas nas ligas recalculadas; o das demais não muda
+    ligas_alteradas = list(datas_alteradas)
+    filtro_ligas = "League IN ({})".format(", ".join("'" + liga.replace("'", "\\'") + "'" for liga in ligas_alteradas))
+    executar_etapa("carga elo_estado ligas alteradas", "silver.elo_estado",
+                   lambda: estado_spark(spark.table("silver.elo_partidas").where(col("League").isin(ligas_alteradas)))
+                       .write.format("delta").mode("overwrite").option("replaceWhere", filtro_ligas)
+                       .saveAsTable("silver.elo_estado"))
+
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC ALTER TABLE silver.europa ADD COLUMN MediaH DOUBLE;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN MediaD DOUBLE;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN MediaA DOUBLE;
-# MAGIC
-# MAGIC UPDATE silver.europa
-# MAGIC SET MediaH = ROUND((COALESCE(B365H, 0) + COALESCE(BWH, 0) + COALESCE(IWH, 0) + COALESCE(PSH, 0) + COALESCE(WHH, 0) + COALESCE(VCH, 0)) / 
-# MAGIC                   (CASE WHEN B365H IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN BWH IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN IWH IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN PSH IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN WHH IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN VCH IS NOT NULL THEN 1 ELSE 0 END), 2),
-# MAGIC     MediaD = ROUND((COALESCE(B365D, 0) + COALESCE(BWD, 0) + COALESCE(IWD, 0) + COALESCE(PSD, 0) + COALESCE(WHD, 0) + COALESCE(VCD, 0)) / 
-# MAGIC                   (CASE WHEN B365D IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN BWD IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN IWD IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN PSD IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN WHD IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN VCD IS NOT NULL THEN 1 ELSE 0 END), 2),
-# MAGIC     MediaA = ROUND((COALESCE(B365A, 0) + COALESCE(BWA, 0) + COALESCE(IWA, 0) + COALESCE(PSA, 0) + COALESCE(WHA, 0) + COALESCE(VCA, 0)) / 
-# MAGIC                   (CASE WHEN B365A IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN BWA IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN IWA IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN PSA IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN WHA IS NOT NULL THEN 1 ELSE 0 END +
-# MAGIC                    CASE WHEN VCA IS NOT NULL THEN 1 ELSE 0 END), 2);
+# MAGIC --Acertos das casas e dos ratings Elo por mês da temporada
+# MAGIC SELECT MONTH(DateMatch) AS Mes,
+# MAGIC        COUNT(*) AS Partidas,
+# MAGIC        ROUND(AVG(CASE WHEN FTR = VencedorAposta THEN 100 ELSE 0 END), 2) AS AcertoCasas,
+# MAGIC        ROUND(AVG(CASE WHEN FTR = EloPrevisto THEN 100 ELSE 0 END), 2) AS AcertoElo
+# MAGIC FROM silver.elo_partidas
+# MAGIC GROUP BY MONTH(DateMatch)
+# MAGIC ORDER BY MIN(DateMatch)
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Layout físico das tabelas
+# MAGIC As consultas da seção “Solução do Problema” agrupam ou filtram por liga e por mês, ou buscam uma partida pelos times. Para que, com muitas temporadas, estas consultas leiam apenas os arquivos necessários, as tabelas bronze e silver são particionadas por temporada e liga, e os arquivos de cada partição são ordenados (Z-order) pela data da partida e pelos times. A configuração fica em mvp_dados/layout.py.
 # MAGIC
+# MAGIC A compactação (OPTIMIZE ... ZORDER BY) junta os arquivos pequenos gerados pelas cargas incrementais. Como ela reescreve as tabelas inteiras, fica no job agendado com o notebook “Compactacao”: aqui medimos a quantidade de arquivos e de bytes lidos por consultas representativas e só compactamos as tabelas que acumularam arquivos pequenos demais (mais de ARQUIVOS_POR_PARTICAO arquivos por partição, em média, em mvp_dados/layout.py), comparando a leitura antes e depois. Nas demais execuções, a carga incremental não reescreve as tabelas.
+
+# COMMAND ----------
+
+from mvp_dados.layout import LAYOUT_TABELAS, arquivos_da_tabela, compactar, leitura_da_consulta, precisa_compactar
+
+# Consultas representativas das análises: por liga, por período e por partida
+CONSULTAS_LAYOUT = {
+    "por liga": "League = 'Inglaterra'",
+    "por mês": "DateMatch BETWEEN '2023-12-01' AND '2023-12-31'",
+    "por partida": "HomeTeam = 'Barcelona' AND AwayTeam = 'Girona'",
+}
+
+def relatorio_layout(momento, tabelas):
+    """Arquivos e bytes lidos por cada consulta representativa, em cada tabela informada."""
+    linhas = []
+    for tabela in tabelas:
+        arquivos_tabela, bytes_tabela = arquivos_da_tabela(spark, tabela)
+        for consulta, filtro in CONSULTAS_LAYOUT.items():
+            arquivos_lidos, bytes_lidos = leitura_da_consulta(spark.table(tabela).where(filtro))
+            linhas.append((momento, tabela, consulta, arquivos_lidos, bytes_lidos, arquivos_tabela, bytes_tabela))
+    return linhas
+
+# Apenas as tabelas com arquivos pequenos demais são compactadas nesta execução
+tabelas_compactar = [tabela for tabela in LAYOUT_TABELAS if precisa_compactar(spark, tabela)]
+print(f"Tabelas compactadas nesta execução: {tabelas_compactar}")
+
+relatorio = relatorio_layout("antes da compactação" if tabelas_compactar else "atual", LAYOUT_TABELAS)
+for tabela in tabelas_compactar:
+    compactar(spark, tabela)
+relatorio += relatorio_layout("depois da compactação", tabelas_compactar)
+
+display(spark.createDataFrame(relatorio, "momento STRING, tabela STRING, consulta STRING, arquivos_lidos LONG, "
+                                         "bytes_lidos LONG, arquivos_tabela LONG, bytes_tabela LONG"))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Camada gold
+# MAGIC As consultas de índice de acerto por liga e por mês eram feitas com junções da tabela silver com subconsultas agrupadas, relendo a tabela inteira a cada execução. Para os painéis lerem apenas algumas centenas de linhas, criamos a camada gold com tabelas agregadas por temporada, liga e mês:
+# MAGIC - gold.acertos_liga_mes: quantidade de partidas, acertos absolutos (FTR = VencedorAposta) e soma de Percentual;
+# MAGIC - gold.acertos_casa_mes: quantidade de partidas e acertos do favorito de cada casa de apostas.
+# MAGIC
+# MAGIC Na carga incremental, apenas as combinações de temporada, liga e mês com partidas novas ou alteradas na última carga (comparadas com a bronze antes do MERGE, e não todas as partidas do arquivo republicado a cada rodada) são recalculadas e atualizadas com um MERGE, que também remove os grupos dessas partições que deixaram de existir. As agregações ficam em mvp_dados/gold.py, compartilhadas com a carga contínua do notebook “Streaming”, que aplica o mesmo MERGE às partições das partidas de cada micro-lote.
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC --Criando o banco de dados gold
+# MAGIC CREATE DATABASE IF NOT EXISTS gold
+
+# COMMAND ----------
+
+from pyspark.sql.functions import col, lit, month
+from mvp_dados.gold import TABELAS_GOLD, mesclar_gold
+
+df_silver = spark.table("silver.europa").withColumn("Mes", month("DateMatch"))
+
+for tabela, (agregar, chave) in TABELAS_GOLD.items():
+    if modo_carga == "completa" or not spark.catalog.tableExists(tabela):
+        executar_etapa(f"carga {tabela}", tabela,
+                       lambda: agregar(df_silver).write.format("delta").mode("overwrite")
+                           .option("overwriteSchema", "true").saveAsTable(tabela))
+    elif particoes_alteradas:
+        # Apenas as partições com partidas novas ou alteradas na última carga; os grupos que deixaram de
+        # existir nelas são removidos
+        executar_etapa(f"merge {tabela}", tabela,
+                       lambda: mesclar_gold(spark, tabela, df_silver, particoes_alteradas))
+
+# Partidas do backfill já propagadas até a camada gold
+if limite_pendentes is not None:
+    DeltaTable.forName(spark, "bronze.alteracoes_pendentes").delete(col("DataIngestao") <= lit(limite_pendentes))
+
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Simulação de estratégias de apostas
+# MAGIC Os índices de acerto não dizem quanto uma estratégia de apostas teria ganhado ou perdido. A tabela gold.backtest_estrategias traz, para cada estratégia, liga, temporada e mês, a quantidade de apostas e de acertos, o lucro (com uma unidade por aposta) e o yield (lucro sobre o total apostado) do mês. A banca de cada estratégia, com 100 unidades no início de cada temporada, é simulada em ordem cronológica ao longo de toda a temporada da liga: a tabela traz o seu valor ao fim de cada mês (Banca), o ROI acumulado na temporada até o mês e o rebaixamento máximo no mês em relação ao maior valor já atingido pela banca na temporada (MaxDrawdown, em %).
 # MAGIC
+# MAGIC As estratégias (mvp_dados/backtest.py) incluem apostar no favorito das casas a diferentes preços (média, melhor preço entre as casas, Bet365, Pinnacle), apostas de valor contra as probabilidades dos ratings Elo, com diferentes margens, e mais/menos de 2,5 gols. Todas são avaliadas juntas, em operações vetorizadas, com uma liga por grupo do Spark.
+
+# COMMAND ----------
+
+from mvp_dados.backtest import backtest_spark
+
+# Partidas com as probabilidades dos ratings Elo, para as apostas de valor
+df_backtest = (spark.table("silver.europa")
+               .join(spark.table("silver.elo_partidas").select(*CHAVE_PARTIDA, "EloProbH", "EloProbD", "EloProbA"),
+                     CHAVE_PARTIDA, "left"))
+
+executar_etapa("carga backtest_estrategias", "gold.backtest_estrategias",
+               lambda: backtest_spark(df_backtest)
+                   .write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                   .saveAsTable("gold.backtest_estrategias"))
+
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC --Resultado de cada estratégia em todas as ligas e meses
+# MAGIC SELECT Estrategia,
+# MAGIC        SUM(Apostas) AS Apostas,
+# MAGIC        ROUND(SUM(Acertos) * 100 / SUM(Apostas), 2) AS PercentualAcertos,
+# MAGIC        ROUND(SUM(Lucro), 2) AS Lucro,
+# MAGIC        ROUND(SUM(Lucro) * 100 / SUM(Apostas), 2) AS Yield,
+# MAGIC        ROUND(MAX(MaxDrawdown), 2) AS MaiorDrawdown
+# MAGIC FROM gold.backtest_estrategias
+# MAGIC GROUP BY Estrategia
+# MAGIC ORDER BY Yield DESC
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Calibração das probabilidades
+# MAGIC O percentual ponderado (média de Percentual) mede apenas a probabilidade dada ao resultado ocorrido. Para avaliar as probabilidades como previsões, calculamos as medidas usuais de qualidade de previsões probabilísticas (mvp_dados/calibracao.py), para o mercado (PercentH/D/A) e para cada casa (probabilidades implícitas nas suas cotações, sem a margem):
+# MAGIC - gold.calibracao_scores: Brier, RPS (ranked probability score) e log-loss médios por previsor, liga, temporada e mês (quanto menores, melhores);
+# MAGIC - gold.calibracao_confiabilidade: diagrama de confiabilidade de cada previsor. As probabilidades são divididas em 10 faixas pelos quantis aproximados e, em cada faixa, a probabilidade média deve ficar próxima da frequência com que o resultado ocorreu.
+# MAGIC
+# MAGIC As duas tabelas vêm de uma única agregação sobre as previsões e têm poucas centenas de linhas, podendo ser mantidas em cache pelos painéis.
+
+# COMMAND ----------
+
+from mvp_dados.calibracao import avaliar as avaliar_calibracao
+
+df_scores, df_confiabilidade = avaliar_calibracao(spark, spark.table("silver.europa"))
+for tabela, df in (("gold.calibracao_scores", df_scores), ("gold.calibracao_confiabilidade", df_confiabilidade)):
+    executar_etapa(f"carga {tabela}", tabela,
+                   lambda: df.write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+                       .saveAsTable(tabela))
+
+display(spark.createDataFrame(metricas_etapas, ESQUEMA_METRICAS))
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC --Scores de cada previsor em todas as ligas e meses (médias ponderadas pela quantidade de partidas)
+# MAGIC SELECT Previsor,
+# MAGIC        SUM(Partidas) AS Partidas,
+# MAGIC        ROUND(SUM(Brier * Partidas) / SUM(Partidas), 4) AS Brier,
+# MAGIC        ROUND(SUM(RPS * Partidas) / SUM(Partidas), 4) AS RPS,
+# MAGIC        ROUND(SUM(LogLoss * Partidas) / SUM(Partidas), 4) AS LogLoss
+# MAGIC FROM gold.calibracao_scores
+# MAGIC GROUP BY Previsor
+# MAGIC ORDER BY RPS
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC --Diagrama de confiabilidade do mercado: probabilidade média x frequência observada em cada faixa
+# MAGIC SELECT Faixa, Previsoes, ROUND(ProbMedia * 100, 2) AS ProbMedia, ROUND(FrequenciaObservada * 100, 2) AS FrequenciaObservada
+# MAGIC FROM gold.calibracao_confiabilidade
+# MAGIC WHERE Previsor = 'Mercado'
+# MAGIC ORDER BY Faixa
 
 # COMMAND ----------
 
@@ -522,6 +1049,18 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 # MAGIC ##Solução do Problema
 # MAGIC Vamos repetir aqui as perguntas inicialmente feitas, e para responde-las, precisaremos dar algumas explicações e possivelmente realizar novas transformações de dados antes de buscar a resposta adequada.
 # MAGIC
+# MAGIC As tabelas silver e gold só mudam nas cargas, mas as consultas desta seção eram executadas de novo a cada abertura do notebook. Os índices de acerto, a dispersão das cotações e a distribuição dos resultados passam por um cache de resultados (mvp_dados/cache_resultados.py): cada resultado é guardado em Parquet, identificado pelo texto da consulta e pela identidade (id) e versão Delta das tabelas consultadas (uma tabela recriada pela carga completa recomeça da versão 0, mas com outro id), e reaproveitado enquanto as tabelas não receberem um novo commit. A versão de cada tabela é lida dos nomes dos arquivos do seu _delta_log, pelo driver, sem executar jobs no cluster (os arquivos Parquet do cache usam o pyarrow, já instalado no Databricks Runtime). As entradas menos usadas são descartadas quando o cache passa dos limites de quantidade ou de tamanho.
+
+# COMMAND ----------
+
+from mvp_dados.cache_resultados import CacheResultados
+
+# Cache dos resultados das consultas de análise (caminho local do driver)
+cache_resultados = CacheResultados(spark, "/dbfs/FileStore/tables/futebol/cache_resultados")
+
+def consultar(nome, consulta):
+    """Resultado da consulta de análise (pelo cache), medido como uma etapa sem tabela gravada."""
+    return executar_etapa(f"análise {nome}", None, lambda: cache_resultados.consultar(consulta))
 
 # COMMAND ----------
 
@@ -574,53 +1113,45 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 # MAGIC
 # MAGIC Para ambas as abordagens, será necessário voltar a trabalhar com novas etapas de transformação da nossa tabela flat, acrescentando colunas e dados nela. 
 # MAGIC
-# MAGIC Desta forma, incluímos uma nova coluna chamada VencedorAposta. Ela indica através de um caractere (H = home, time da casa; D = draw, empate; A = away, visitante), qual o mais provável vencedor segundo a média das cotações das casas de apostas.
+# MAGIC Desta forma, incluímos uma nova coluna chamada VencedorAposta. Ela indica através de um caractere (H = home, time da casa; D = draw, empate; A = away, visitante), qual o mais provável vencedor segundo a média das cotações das casas de apostas. A coluna é calculada junto com as demais colunas derivadas, na criação da camada silver (lista DERIVACOES_SILVER).
 # MAGIC
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC
-# MAGIC ALTER TABLE silver.europa
-# MAGIC ADD COLUMN VencedorAposta VARCHAR(1);
-# MAGIC
-# MAGIC UPDATE silver.europa
-# MAGIC SET VencedorAposta = CASE
-# MAGIC     WHEN MediaH < MediaD AND MediaH < MediaA THEN 'H'
-# MAGIC     WHEN MediaD < MediaH AND MediaD < MediaA THEN 'D'
-# MAGIC     ELSE 'A'
-# MAGIC END;
+# MAGIC --vencedor apontado pelas cotações médias da partida entre Barcelona e Girona
+# MAGIC SELECT HomeTeam, AwayTeam, FTR, MediaH, MediaD, MediaA, VencedorAposta
+# MAGIC FROM silver.europa
+# MAGIC WHERE HomeTeam = "Barcelona"
+# MAGIC AND AwayTeam = "Girona"
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC A partir daí podemos tentar responder à pergunta sobre o índice de acerto absoluto das casas de apostas. Neste caso, em 55,05% dos casos a equipe que tinha melhores cotações de fato venceu a partida.
+# MAGIC A partir daí podemos tentar responder à pergunta sobre o índice de acerto absoluto das casas de apostas. Neste caso, em 55,05% dos casos a equipe que tinha melhores cotações de fato venceu a partida. Os índices de acerto desta seção são calculados a partir das tabelas agregadas da camada gold.
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC --percentual de acertos das casas de aposta - abordagem absoluta
-# MAGIC SELECT FORMAT_NUMBER((COUNT(*) * 100.0 / (SELECT COUNT(*) FROM bronze.europa)), 2) AS percentual
-# MAGIC FROM silver.europa
-# MAGIC WHERE FTR = VencedorAposta;
+#percentual de acertos das casas de aposta - abordagem absoluta
+display(consultar("acerto absoluto", """
+SELECT FORMAT_NUMBER((SUM(AcertosAbsolutos) * 100.0 / SUM(Partidas)), 2) AS percentual
+FROM gold.acertos_liga_mes
+"""))
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Para tratarmos a segunda abordagem, ponderando o peso de cada cotação, vamos precisar novamente enriquecer a tabela flat, incluindo novas informações vindas de cálculos com base na própria tabela. Primeiro os percentuais absolutos para cada resultado. No exemplo da partida Barcelona x Girona, é quele em que a soma das probabilidades ficou em 105,12%, incluindo a margem das casas de apostas.
+# MAGIC Para tratarmos a segunda abordagem, ponderando o peso de cada cotação, vamos precisar novamente enriquecer a tabela flat, incluindo novas informações vindas de cálculos com base na própria tabela. Primeiro os percentuais absolutos para cada resultado (colunas PercentAbsolH, PercentAbsolD e PercentAbsolA, calculadas como (1 / Media) * 100). No exemplo da partida Barcelona x Girona, é quele em que a soma das probabilidades ficou em 105,12%, incluindo a margem das casas de apostas.
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC
-# MAGIC ALTER TABLE silver.europa ADD COLUMN PercentAbsolH FLOAT;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN PercentAbsolD FLOAT;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN PercentAbsolA FLOAT;
-# MAGIC
-# MAGIC UPDATE silver.europa
-# MAGIC SET PercentAbsolH = (1 / MediaH) * 100,
-# MAGIC     PercentAbsolD = (1 / MediaD) * 100,
-# MAGIC     PercentAbsolA = (1 / MediaA) * 100;
+# MAGIC --percentuais absolutos da partida entre Barcelona e Girona
+# MAGIC SELECT HomeTeam, AwayTeam, PercentAbsolH, PercentAbsolD, PercentAbsolA,
+# MAGIC        PercentAbsolH + PercentAbsolD + PercentAbsolA AS SomaPercentAbsol
+# MAGIC FROM silver.europa
+# MAGIC WHERE HomeTeam = "Barcelona"
+# MAGIC AND AwayTeam = "Girona"
 
 # COMMAND ----------
 
@@ -630,36 +1161,22 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC ALTER TABLE silver.europa ADD COLUMN PercentH FLOAT;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN PercentD FLOAT;
-# MAGIC ALTER TABLE silver.europa ADD COLUMN PercentA FLOAT;
-# MAGIC
-# MAGIC UPDATE silver.europa
-# MAGIC SET PercentH = (PercentAbsolH * 100) / (PercentAbsolH + PercentAbsolD + PercentAbsolA),
-# MAGIC     PercentD = (PercentAbsolD * 100) / (PercentAbsolH + PercentAbsolD + PercentAbsolA),
-# MAGIC     PercentA = (PercentAbsolA * 100) / (PercentAbsolH + PercentAbsolD + PercentAbsolA);
-# MAGIC
+# MAGIC --probabilidades normalizadas (PercentH, PercentD e PercentA)
 # MAGIC SELECT * FROM silver.europa;
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Para facilitar as operações, mais uma coluna será incluída, consolidando a cotação do resultado efetivamente ocorrido. Apesar de ser possível fazer esta operação sem a necessidade de criação desta coluna, achamos que isso traria mais clareza na visualização dos resultados. 
+# MAGIC Para facilitar as operações, mais uma coluna será incluída, consolidando a cotação do resultado efetivamente ocorrido (coluna Percentual). Apesar de ser possível fazer esta operação sem a necessidade de criação desta coluna, achamos que isso traria mais clareza na visualização dos resultados. 
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC
-# MAGIC ALTER TABLE silver.europa ADD COLUMN Percentual FLOAT;
-# MAGIC
-# MAGIC UPDATE silver.europa 
-# MAGIC SET Percentual = 
-# MAGIC     CASE 
-# MAGIC         WHEN FTR = 'H' THEN PercentH
-# MAGIC         WHEN FTR = 'D' THEN PercentD
-# MAGIC         WHEN FTR = 'A' THEN PercentA
-# MAGIC         ELSE 0
-# MAGIC     END;
+# MAGIC --probabilidade atribuída ao resultado ocorrido na partida entre Barcelona e Girona
+# MAGIC SELECT HomeTeam, AwayTeam, FTR, PercentH, PercentD, PercentA, Percentual
+# MAGIC FROM silver.europa
+# MAGIC WHERE HomeTeam = "Barcelona"
+# MAGIC AND AwayTeam = "Girona"
 
 # COMMAND ----------
 
@@ -668,10 +1185,11 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC --percentual de acertos das casas de aposta - abordagem ponderada
-# MAGIC SELECT FORMAT_NUMBER((SUM(Percentual) / COUNT(Percentual)), 2) AS percentual_final
-# MAGIC FROM silver.europa;
+#percentual de acertos das casas de aposta - abordagem ponderada
+display(consultar("acerto ponderado", """
+SELECT FORMAT_NUMBER((SUM(SomaPercentual) / SUM(PartidasComPercentual)), 2) AS percentual_final
+FROM gold.acertos_liga_mes
+"""))
 
 # COMMAND ----------
 
@@ -687,19 +1205,13 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC SELECT europa.League, 
-# MAGIC        FORMAT_NUMBER((COUNT(*) * 100.0 / total_por_div), 2) AS percentual_div--,
-# MAGIC        --FORMAT_NUMBER((COUNT(*) * 100.0 / (SELECT COUNT(*) FROM silver.europa )), 2) AS percentual_total
-# MAGIC FROM silver.europa
-# MAGIC INNER JOIN (
-# MAGIC     SELECT League AS subquery_Div, COUNT(*) AS total_por_div
-# MAGIC     FROM silver.europa
-# MAGIC     GROUP BY League
-# MAGIC ) AS subquery ON europa.League = subquery.subquery_Div
-# MAGIC WHERE FTR = VencedorAposta
-# MAGIC GROUP BY europa.League, total_por_div
-# MAGIC ORDER BY percentual_div DESC;
+display(consultar("acerto absoluto por liga", """
+SELECT League,
+       FORMAT_NUMBER((SUM(AcertosAbsolutos) * 100.0 / SUM(Partidas)), 2) AS percentual_div
+FROM gold.acertos_liga_mes
+GROUP BY League
+ORDER BY percentual_div DESC
+"""))
 
 # COMMAND ----------
 
@@ -708,11 +1220,12 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 
 # COMMAND ----------
 
-# MAGIC %sql 
-# MAGIC SELECT League, FORMAT_NUMBER(SUM(Percentual) / COUNT(Percentual), 2) AS soma_dividida
-# MAGIC FROM silver.europa
-# MAGIC GROUP BY League
-# MAGIC ORDER BY soma_dividida DESC;
+display(consultar("acerto ponderado por liga", """
+SELECT League, FORMAT_NUMBER(SUM(SomaPercentual) / SUM(PartidasComPercentual), 2) AS soma_dividida
+FROM gold.acertos_liga_mes
+GROUP BY League
+ORDER BY soma_dividida DESC
+"""))
 
 # COMMAND ----------
 
@@ -735,31 +1248,25 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC --percentual absoluto de acertos das casas de apostas, segmentado por mês
-# MAGIC SELECT mes,
-# MAGIC        FORMAT_NUMBER((COUNT(*) * 100.0 / total_por_mes), 2) AS percentual
-# MAGIC FROM (
-# MAGIC     SELECT MONTH(DateMatch) AS mes,
-# MAGIC            COUNT(*) AS total_por_mes
-# MAGIC     FROM silver.europa
-# MAGIC     GROUP BY MONTH(DateMatch)
-# MAGIC ) AS subquery
-# MAGIC JOIN silver.europa 
-# MAGIC     ON MONTH(silver.europa.DateMatch) = subquery.mes
-# MAGIC WHERE FTR = VencedorAposta
-# MAGIC GROUP BY mes, total_por_mes
-# MAGIC ORDER BY percentual DESC;
-
-# COMMAND ----------
-
-# MAGIC %sql 
-# MAGIC --percentual ponderado de acertos das casas de apostas, segmentado por mês
-# MAGIC SELECT MONTH(DateMatch) AS mes, 
-# MAGIC   FORMAT_NUMBER(SUM(Percentual) / COUNT(Percentual), 2) AS Percentual_mes
-# MAGIC FROM silver.europa
-# MAGIC GROUP BY mes 
-# MAGIC ORDER BY Percentual_mes DESC;
+#percentual absoluto de acertos das casas de apostas, segmentado por mês
+display(consultar("acerto absoluto por mês", """
+SELECT Mes AS mes,
+       FORMAT_NUMBER((SUM(AcertosAbsolutos) * 100.0 / SUM(Partidas)), 2) AS percentual
+FROM gold.acertos_liga_mes
+GROUP BY Mes
+ORDER BY percentual DESC
+"""))
+
+# COMMAND ----------
+
+#percentual ponderado de acertos das casas de apostas, segmentado por mês
+display(consultar("acerto ponderado por mês", """
+SELECT Mes AS mes,
+  FORMAT_NUMBER(SUM(SomaPercentual) / SUM(PartidasComPercentual), 2) AS Percentual_mes
+FROM gold.acertos_liga_mes
+GROUP BY Mes
+ORDER BY Percentual_mes DESC
+"""))
 
 # COMMAND ----------
 
@@ -781,56 +1288,60 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 # MAGIC
 # MAGIC Para verificar se as empresas trabalham com cotações parecidas, fizemos uma análise do desvio padrão para a cotação de vitória do time da casa, empate e vitória do visitante para cada uma das empresas, calculando o seu desvio padrão da média das cotações.
 # MAGIC
+# MAGIC Em vez de uma consulta por casa de apostas unidas com UNION ALL (que lê a tabela silver uma vez para cada casa), as cotações são transformadas uma única vez em linhas (partida, casa, resultado, cotação) e todas as medidas de todas as casas são calculadas em uma única agregação. Além do desvio padrão, calculamos o desvio médio absoluto, a margem média de cada casa e a diferença entre a probabilidade de cada casa (sem a margem) e a do mercado. A função considera todas as casas descritas no catálogo de dados (mvp_dados/casas.py) cujas colunas existam na tabela.
+# MAGIC
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC --desvio padrão das cotações de cada casa de aposta
-# MAGIC SELECT "Bet365" AS Casa_aposta,
-# MAGIC        ROUND(STDDEV(B365H - MediaH), 3) AS DesvioPadraoHome,
-# MAGIC        ROUND(STDDEV(B365D - MediaD), 3) AS DesvioPadraoDraw,
-# MAGIC        ROUND(STDDEV(B365A - MediaA), 3) AS DesvioPadraoAway
-# MAGIC FROM silver.europa
-# MAGIC
-# MAGIC UNION ALL
-# MAGIC
-# MAGIC SELECT "Bet&Win" AS Casa_aposta,
-# MAGIC        ROUND(STDDEV(BWH - MediaH), 3) AS DesvioPadraoHome,
-# MAGIC        ROUND(STDDEV(BWD - MediaD), 3) AS DesvioPadraoDraw,
-# MAGIC        ROUND(STDDEV(BWA - MediaA), 3) AS DesvioPadraoAway
-# MAGIC FROM silver.europa
-# MAGIC
-# MAGIC UNION ALL
-# MAGIC
-# MAGIC SELECT "Interwetten" AS Casa_aposta,
-# MAGIC        ROUND(STDDEV(IWH - MediaH), 3) AS DesvioPadraoHome,
-# MAGIC        ROUND(STDDEV(IWD - MediaD), 3) AS DesvioPadraoDraw,
-# MAGIC        ROUND(STDDEV(IWA - MediaA), 3) AS DesvioPadraoAway
-# MAGIC FROM silver.europa
-# MAGIC
-# MAGIC UNION ALL
-# MAGIC
-# MAGIC SELECT "Pinnacle" AS Casa_aposta,
-# MAGIC        ROUND(STDDEV(PSH - MediaH), 3) AS DesvioPadraoHome,
-# MAGIC        ROUND(STDDEV(PSD - MediaD), 3) AS DesvioPadraoDraw,
-# MAGIC        ROUND(STDDEV(PSA - MediaA), 3) AS DesvioPadraoAway
-# MAGIC FROM silver.europa
-# MAGIC
-# MAGIC UNION ALL
-# MAGIC
-# MAGIC SELECT "VC Bet" AS Casa_aposta,
-# MAGIC        ROUND(STDDEV(VCH - MediaH), 3) AS DesvioPadraoHome,
-# MAGIC        ROUND(STDDEV(VCD - MediaD), 3) AS DesvioPadraoDraw,
-# MAGIC        ROUND(STDDEV(VCA - MediaA), 3) AS DesvioPadraoAway
-# MAGIC FROM silver.europa
-# MAGIC
-# MAGIC UNION ALL
-# MAGIC
-# MAGIC SELECT "William Hill" AS Casa_aposta,
-# MAGIC        ROUND(STDDEV(WHH - MediaH), 3) AS DesvioPadraoHome,
-# MAGIC        ROUND(STDDEV(WHD - MediaD), 3) AS DesvioPadraoDraw,
-# MAGIC        ROUND(STDDEV(WHA - MediaA), 3) AS DesvioPadraoAway
-# MAGIC FROM silver.europa;
+from pyspark.sql.functions import abs as absoluto, avg, col, count, expr, round as arredondar, stddev, when
+from mvp_dados.casas import casas_presentes, stack_odds
+
+def dispersao_casas(df):
+    """Dispersão das cotações de cada casa de apostas em relação à média do mercado, em uma única agregação.
+
+    As cotações são transformadas uma única vez em linhas (partida, casa, resultado, cotação). Para cada casa
+    são calculados, por resultado, o desvio padrão e o desvio médio absoluto da cotação em relação à média
+    (MediaH/D/A) e a diferença média entre a probabilidade da casa (sem a margem) e a do mercado
+    (PercentH/D/A), além da margem média da casa (overround).
+    """
+    # Uma linha por partida e casa, com a margem e as probabilidades sem margem da casa
+    df_casas = (df.select("MediaH", "MediaD", "MediaA", "PercentH", "PercentD", "PercentA",
+                          expr(stack_odds(casas_presentes(df.columns))))
+                .withColumn("SomaInversos", expr("1 / OddH + 1 / OddD + 1 / OddA"))
+                .withColumn("Margem", (col("SomaInversos") - 1) * 100))
+
+    # Uma linha por partida, casa e resultado
+    df_longo = df_casas.select(
+        "CasaAposta", "Margem",
+        expr("""stack(3,
+                      'H', OddH, MediaH, 100 / OddH / SomaInversos, PercentH,
+                      'D', OddD, MediaD, 100 / OddD / SomaInversos, PercentD,
+                      'A', OddA, MediaA, 100 / OddA / SomaInversos, PercentA)
+                AS (Resultado, Odd, Media, ProbCasa, ProbMercado)"""))
+
+    sufixos = {"H": "Home", "D": "Draw", "A": "Away"}
+    agregacoes = [count(when(col("Resultado") == "H", col("Odd"))).alias("Partidas"),
+                  arredondar(avg(when(col("Resultado") == "H", col("Margem"))), 3).alias("MargemMedia")]
+    for resultado, sufixo in sufixos.items():
+        do_resultado = col("Resultado") == resultado
+        agregacoes += [
+            arredondar(stddev(when(do_resultado, col("Odd") - col("Media"))), 3).alias(f"DesvioPadrao{sufixo}"),
+            arredondar(avg(when(do_resultado, absoluto(col("Odd") - col("Media")))), 3).alias(f"DesvioMedio{sufixo}"),
+            arredondar(avg(when(do_resultado, col("ProbCasa") - col("ProbMercado"))), 3).alias(f"DiferencaProb{sufixo}"),
+        ]
+    return (df_longo.groupBy(col("CasaAposta").alias("Casa_aposta")).agg(*agregacoes)
+            .orderBy("Casa_aposta"))
+
+df_dispersao = executar_etapa("análise dispersão", None,
+                              lambda: cache_resultados.calcular(dispersao_casas, "silver.europa"))
+
+#desvio padrão das cotações de cada casa de aposta
+display(df_dispersao[["Casa_aposta", "DesvioPadraoHome", "DesvioPadraoDraw", "DesvioPadraoAway"]])
+
+# COMMAND ----------
+
+#desvio médio, margem e diferença de probabilidade em relação ao mercado, por casa de aposta
+display(df_dispersao)
 
 # COMMAND ----------
 
@@ -841,14 +1352,14 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 
 # COMMAND ----------
 
-# MAGIC %sql
-# MAGIC --Resultado das partidas do dataset
-# MAGIC SELECT 
-# MAGIC        FORMAT_NUMBER((SUM(CASE WHEN HTR = 'H' THEN 1 ELSE 0 END)/COUNT(*) * 100.0 ), 2) AS vitoria_casa,
-# MAGIC        FORMAT_NUMBER((SUM(CASE WHEN HTR = 'D' THEN 1 ELSE 0 END)/COUNT(*) * 100.0 ), 2) AS empate,
-# MAGIC        FORMAT_NUMBER((SUM(CASE WHEN HTR = 'A' THEN 1 ELSE 0 END)/COUNT(*) * 100.0 ), 2) AS vitoria_visitante
-# MAGIC FROM silver.europa;
-# MAGIC
+#Resultado das partidas do dataset
+display(consultar("resultados no intervalo", """
+SELECT
+       FORMAT_NUMBER((SUM(CASE WHEN HTR = 'H' THEN 1 ELSE 0 END)/COUNT(*) * 100.0 ), 2) AS vitoria_casa,
+       FORMAT_NUMBER((SUM(CASE WHEN HTR = 'D' THEN 1 ELSE 0 END)/COUNT(*) * 100.0 ), 2) AS empate,
+       FORMAT_NUMBER((SUM(CASE WHEN HTR = 'A' THEN 1 ELSE 0 END)/COUNT(*) * 100.0 ), 2) AS vitoria_visitante
+FROM silver.europa
+"""))
 
 # COMMAND ----------
 
@@ -857,6 +1368,37 @@ spark.sql("CREATE TABLE silver.europa USING DELTA AS SELECT * FROM bronze.europa
 
 # COMMAND ----------
 
+# MAGIC %md
+# MAGIC Uso do cache de resultados nesta execução. Reabrindo o notebook sem uma nova carga, todas as consultas da seção são atendidas pelo cache:
+
+# COMMAND ----------
+
+display(spark.createDataFrame([cache_resultados.estatisticas()],
+                              "acertos LONG, falhas LONG, taxa_acertos DOUBLE, remocoes LONG, nao_armazenados LONG, "
+                              "entradas LONG, bytes LONG"))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ##Métricas de execução
+# MAGIC As métricas de todas as etapas desta execução (carga e análise) são acrescentadas à tabela ops.pipeline_metrics. A view ops.etapas_mais_lentas resume as últimas 10 execuções: para cada etapa, a duração média, a máxima e a da última execução, as linhas gravadas, os arquivos reescritos, o shuffle e o spill médios, da etapa mais lenta para a mais rápida. Quando uma execução demorar mais que o normal, basta comparar a duração da última execução com a média de cada etapa.
+
+# COMMAND ----------
+
+from mvp_dados.metricas import criar_view_etapas_lentas, gravar_metricas
+
+gravar_metricas(spark, metricas_etapas)
+criar_view_etapas_lentas(spark)
+
+display(spark.table("ops.pipeline_metrics").where(f"IdExecucao = '{ID_EXECUCAO}'").orderBy("DataInicio"))
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT * FROM ops.etapas_mais_lentas
+
+# COMMAND ----------
+
 # MAGIC %md
 # MAGIC ##Autoavaliação
 # MAGIC Inicialmente, a ideia deste trabalho seria trabalhar alguma forma de detectar indícios de fraude em apostas esportivas. Mas isso requereria uma base com dados de volumes de apostas e de quantias financeiras envolvidas. Estas informações, entretanto, não são abertas pelas empresas, e esta possibilidade foi descartada no início.
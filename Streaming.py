@@ -0,0 +1,94 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ## Carga contínua (streaming) das rodadas da temporada
+# MAGIC O notebook “MVP Dados” faz cargas em lote: cada execução lê os arquivos .zip e recalcula as camadas silver e gold. Durante a temporada, o football-data republica o .csv de cada liga a cada rodada, e os resultados devem chegar às tabelas poucos minutos depois. Este notebook mantém uma consulta do Structured Streaming que monitora um diretório de entrada e processa os arquivos novos em micro-lotes (mvp_dados/streaming.py):
+# MAGIC
+# MAGIC - cada versão de um .csv é depositada em um subdiretório próprio do diretório de entrada, com o nome original do arquivo (E0.csv, I1.csv, ...), pela função depositar ou por qualquer processo que siga a mesma convenção;
+# MAGIC - os arquivos de cada lote passam pelas mesmas verificações da carga em lote (cabeçalho, esquema tipado, datas e quarentena);
+# MAGIC - apenas as partidas novas ou alteradas em relação à bronze são gravadas na bronze.europa e na silver.europa (MERGE), e apenas as partições (temporada, liga e mês) dessas partidas são reagregadas nas tabelas gold;
+# MAGIC - cada lote registra as partidas que alterou na tabela bronze.lotes_streaming. Com o checkpoint da consulta e as gravações idempotentes do Delta, um lote interrompido pode ser reprocessado sem duplicar nem perder alterações (exatamente uma vez).
+# MAGIC
+# MAGIC As tabelas bronze.europa e silver.europa devem ter sido criadas pela carga completa do “MVP Dados” (ou são criadas pelo primeiro lote). As demais tabelas derivadas da silver (movimento_odds, forma_equipes, ratings Elo etc.) continuam sendo recalculadas pelo “MVP Dados”.
+# MAGIC
+# MAGIC Para testar fora do Databricks, com um diretório local, basta executar `python -m mvp_dados.streaming` (detalhes no README).
+
+# COMMAND ----------
+
+dbutils.widgets.text("diretorio_entrada", "/dbfs/FileStore/tables/futebol/entrada", "Diretório de entrada")
+dbutils.widgets.text("diretorio_checkpoint", "/dbfs/FileStore/tables/futebol/checkpoint_streaming", "Checkpoint")
+dbutils.widgets.dropdown("modo", "continuo", ["continuo", "disponiveis"], "Modo")
+dbutils.widgets.text("intervalo", "1 minute", "Intervalo entre lotes")
+
+DIRETORIO_ENTRADA = dbutils.widgets.get("diretorio_entrada")
+DIRETORIO_CHECKPOINT = dbutils.widgets.get("diretorio_checkpoint")
+
+# Mesmo diretório de arquivos .zip lido pelo notebook "MVP Dados" (catálogo de colunas)
+DIRETORIO_ZIP = "/dbfs/FileStore/tables/futebol"
+
+# COMMAND ----------
+
+import glob
+import zipfile
+from mvp_dados.arquivo_zip import caminho_membro, ler_texto
+from mvp_dados.catalogo import ler_catalogo
+
+# Catálogo de colunas, a partir do notes.txt do primeiro .zip que o contém
+arquivo_notas = next(arquivo for arquivo in sorted(glob.glob(f"{DIRETORIO_ZIP}/*.zip"))
+                     if "notes.txt" in zipfile.ZipFile(arquivo).namelist())
+CATALOGO = ler_catalogo(ler_texto(caminho_membro(arquivo_notas, "notes.txt")))
+
+for banco in ("bronze", "silver", "gold"):
+    spark.sql(f"CREATE DATABASE IF NOT EXISTS {banco}")
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Depósito da versão atual dos arquivos da temporada em andamento, baixados do football-data (https://www.football-data.co.uk/mmz4281/&lt;temporada&gt;/&lt;liga&gt;.csv). Esta célula pode ser agendada como um job separado, por exemplo a cada hora nos dias de jogos: cada execução deposita uma nova versão de cada arquivo, e a consulta processa apenas as partidas que mudaram.
+
+# COMMAND ----------
+
+from datetime import date
+from mvp_dados.ligas import LIGAS
+from mvp_dados.streaming import depositar
+
+# Temporada em andamento (ano de início): as temporadas europeias começam em julho/agosto
+hoje = date.today()
+temporada = hoje.year if hoje.month >= 7 else hoje.year - 1
+codigo = f"{temporada % 100:02d}{(temporada + 1) % 100:02d}"
+
+for liga in LIGAS:
+    print(depositar(f"https://www.football-data.co.uk/mmz4281/{codigo}/{liga.codigo}.csv", DIRETORIO_ENTRADA))
+
+# COMMAND ----------
+
+from mvp_dados.streaming import iniciar
+
+# No modo "disponiveis", a consulta processa os arquivos já depositados e termina (por exemplo, em um job
+# agendado); no modo "continuo", verifica o diretório de entrada a cada intervalo
+consulta = iniciar(spark, DIRETORIO_ENTRADA, DIRETORIO_CHECKPOINT, CATALOGO,
+                   intervalo=dbutils.widgets.get("intervalo"),
+                   disponiveis=dbutils.widgets.get("modo") == "disponiveis")
+
+if dbutils.widgets.get("modo") == "disponiveis":
+    consulta.awaitTermination()
+print(consulta.status)
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Partidas novas ou alteradas por lote e tempo de cada lote (progresso da consulta):
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT IdLote, MIN(DataIngestao) AS DataIngestao, COUNT(*) AS Partidas,
+# MAGIC        COUNT(DISTINCT League) AS Ligas, COLLECT_SET(CONCAT(Temporada, '-', League, '-', Mes)) AS ParticoesGold
+# MAGIC FROM bronze.lotes_streaming
+# MAGIC GROUP BY IdLote
+# MAGIC ORDER BY IdLote DESC
+
+# COMMAND ----------
+
+display(spark.createDataFrame([(p["batchId"], p["timestamp"], p["numInputRows"], p["durationMs"].get("triggerExecution"))
+                               for p in consulta.recentProgress],
+                              "IdLote LONG, Momento STRING, Arquivos LONG, DuracaoMs LONG"))
@@ -0,0 +1 @@
+"""Código compartilhado pelo notebook "MVP Dados" e pelas execuções fora do Databricks."""
@@ -0,0 +1,111 @@
+"""Leitura dos .csv das ligas direto de dentro de arquivos .zip do football-data (como o archive.zip do Kaggle).
+
+Os arquivos não são descompactados em disco: cada .csv é lido em streaming de dentro do .zip pelos
+executores do Spark. Um arquivo dentro de um .zip é identificado pelo caminho "<arquivo .zip>/<nome>",
+de modo que o nome do .csv continua sendo a última parte do caminho (como em liga_do_arquivo).
+
+As funções de leitura dos .csv (cabecalho, amostra e linhas_de_dados) também aceitam o caminho de um
+.csv avulso, fora de um .zip, como os depositados no diretório de entrada da carga contínua
+(mvp_dados/streaming.py).
+
+O caminho do .zip precisa estar acessível como arquivo local em todos os nós do cluster (no Databricks,
+por exemplo, "/dbfs/FileStore/...").
+"""
+
+import csv
+import hashlib
+import io
+import zipfile
+from contextlib import contextmanager
+
+from mvp_dados.ligas import liga_do_arquivo
+
+_SUFIXO_ZIP = ".zip/"
+
+
+def checksum(caminho, tamanho_bloco=1 << 20):
+    """MD5 do conteúdo do arquivo, lido em blocos."""
+    md5 = hashlib.md5()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b""):
+            md5.update(bloco)
+    return md5.hexdigest()
+
+
+def caminho_membro(caminho_zip, nome):
+    """Caminho que identifica o arquivo nome dentro do .zip."""
+    return f"{caminho_zip}/{nome}"
+
+
+def separar_caminho(caminho):
+    """Inverso de caminho_membro: (caminho do .zip, nome do arquivo dentro dele)."""
+    posicao = caminho.index(_SUFIXO_ZIP) + len(_SUFIXO_ZIP)
+    return caminho[:posicao - 1], caminho[posicao:]
+
+
+def membros_ligas(caminho_zip):
+    """Arquivos de ligas cadastradas dentro do .zip: lista de (caminho, tamanho, CRC-32).
+
+    As informações vêm do diretório central do .zip, sem descompactar os arquivos; o CRC-32 serve
+    como checksum de cada arquivo para a carga incremental.
+    """
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        return [(caminho_membro(caminho_zip, info.filename), info.file_size, f"{info.CRC:08x}")
+                for info in arquivo_zip.infolist()
+                if not info.is_dir() and liga_do_arquivo(info.filename) is not None]
+
+
+@contextmanager
+def abrir(caminho):
+    """Abre, em modo binário, um arquivo dentro de um .zip (caminho_membro) ou um .csv avulso."""
+    if _SUFIXO_ZIP not in caminho:
+        with open(caminho, "rb") as conteudo:
+            yield conteudo
+        return
+    caminho_zip, nome = separar_caminho(caminho)
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip, arquivo_zip.open(nome) as conteudo:
+        yield conteudo
+
+
+def ler_texto(caminho):
+    """Conteúdo (texto) de um arquivo dentro do .zip, como o catálogo notes.txt."""
+    caminho_zip, nome = separar_caminho(caminho)
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        return arquivo_zip.read(nome).decode("utf-8-sig")
+
+
+def cabecalho(caminho):
+    """Colunas do cabeçalho (primeira linha) de um .csv dentro do .zip, sem ler o restante do arquivo."""
+    with abrir(caminho) as conteudo:
+        return io.TextIOWrapper(conteudo, encoding="utf-8-sig", errors="replace").readline().rstrip("\r\n").split(",")
+
+
+def amostra(caminho, linhas=20):
+    """Primeiras linhas de dados (sem o cabeçalho) de um .csv dentro do .zip, já separadas em colunas."""
+    with abrir(caminho) as conteudo:
+        texto = io.TextIOWrapper(conteudo, encoding="utf-8-sig", errors="replace")
+        leitor = csv.reader(texto)
+        next(leitor, None)
+        return [linha for _, linha in zip(range(linhas), leitor)]
+
+
+def linhas_de_dados(caminho):
+    """Linhas de dados (sem o cabeçalho) de um .csv dentro do .zip, descompactadas em streaming, sem alteração.
+
+    Na leitura de linhas pelo Spark não há input_file_name(): a origem de cada linha é acrescentada como
+    uma coluna do DataFrame lido de um único arquivo (mvp_dados.bronze.ler_arquivos), e não ao texto da
+    linha, onde seria deslocada em linhas com campos faltando ou sobrando.
+    """
+    with abrir(caminho) as conteudo:
+        texto = io.TextIOWrapper(conteudo, encoding="utf-8-sig", errors="replace")
+        next(texto, None)
+        for linha in texto:
+            linha = linha.rstrip("\r\n")
+            if linha:
+                yield linha
+
+
+def rdd_linhas(spark, caminhos):
+    """RDD com as linhas de dados dos .csv informados, um arquivo por partição."""
+    return spark.sparkContext.parallelize(caminhos, max(len(caminhos), 1)).flatMap(linhas_de_dados)
+
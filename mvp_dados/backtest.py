@@ -0,0 +1,149 @@
+"""Simulação (backtest) de estratégias de apostas sobre as cotações da camada silver.
+
+Uma estratégia define em que resultado apostar em cada partida e a que preço: o favorito das casas
+(VencedorAposta), apostas de valor contra as probabilidades de um modelo (ratings Elo, em
+mvp_dados/elo.py) ou mais/menos de 2,5 gols. O preço pode ser a média das casas (Media*), o melhor
+preço entre elas (MaiorValor*), o do mercado (Avg*, Max*) ou o de uma casa (B365*, PS*, ...).
+
+Todas as estratégias são avaliadas juntas: cada uma é uma linha de matrizes NumPy (estratégias x
+partidas), com uma unidade apostada por aposta, e a banca de cada estratégia é simulada em ordem
+cronológica com somas acumuladas ao longo de toda a temporada de cada liga, a partir de BANCA_INICIAL.
+Os resultados são informados por liga, temporada e mês: as apostas, os acertos, o lucro e o yield do
+mês e, da banca simulada desde o início da temporada, o valor ao fim do mês, o ROI acumulado até ele e o
+rebaixamento máximo no mês em relação ao maior valor já atingido pela banca na temporada. As ligas são
+independentes e podem ser avaliadas em paralelo, em processos (backtest) ou no Spark (backtest_spark).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from mvp_dados.probabilidades import RESULTADOS
+
+# Banca inicial de cada estratégia, em unidades apostadas
+BANCA_INICIAL = 100.0
+
+# Esquema da tabela de resultados (uma linha por estratégia, liga, temporada e mês)
+ESQUEMA_RESULTADOS = ("Estrategia STRING, League STRING, Temporada INT, Mes INT, Apostas LONG, Acertos LONG, "
+                      "Lucro DOUBLE, Yield DOUBLE, Banca DOUBLE, ROI DOUBLE, MaxDrawdown DOUBLE")
+
+COLUNAS_RESULTADOS = [definicao.split()[0] for definicao in ESQUEMA_RESULTADOS.split(", ")]
+
+
+@dataclass(frozen=True)
+class Estrategia:
+    nome: str
+    aposta: str                  # "favorito", "valor", "mais" (mais de 2,5 gols) ou "menos"
+    preco: str = "Media"         # prefixo das colunas de cotação usadas no preço da aposta
+    margem: float = 0.0          # "valor": vantagem mínima (probabilidade do modelo x cotação - 1)
+    modelo: str = "EloProb"      # "valor": prefixo das colunas de probabilidade do modelo (em %)
+
+
+def grade(aposta, **parametros):
+    """Estratégias com todas as combinações dos valores informados para cada parâmetro.
+
+    grade("valor", preco=("Media", "MaiorValor"), margem=(0.0, 0.05)) gera 4 estratégias.
+    """
+    nomes = list(parametros)
+    estrategias = []
+    for valores in product(*parametros.values()):
+        sufixo = "_".join(str(valor) for valor in valores)
+        estrategias.append(Estrategia(f"{aposta}_{sufixo}", aposta, **dict(zip(nomes, valores))))
+    return estrategias
+
+
+# Estratégias avaliadas pelo notebook
+ESTRATEGIAS = (
+    grade("favorito", preco=("Media", "MaiorValor", "B365", "PS"))
+    + grade("valor", preco=("Media", "MaiorValor"), margem=(0.0, 0.05, 0.10))
+    + grade("mais", preco=("Avg", "Max", "B365"))
+    + grade("menos", preco=("Avg", "Max", "B365"))
+)
+
+
+def _apostas(df, estrategia):
+    """Resultado apostado ("" sem aposta), cotação e acerto de cada partida para a estratégia."""
+    n = len(df)
+    if estrategia.aposta in ("mais", "menos"):
+        sufixo = "O25" if estrategia.aposta == "mais" else "U25"
+        coluna = f"{estrategia.preco}{sufixo}"
+        cotacao = df[coluna].to_numpy(dtype=float) if coluna in df else np.full(n, np.nan)
+        gols = (df["FTHG"] + df["FTAG"]).to_numpy(dtype=float)
+        acerto = gols > 2.5 if estrategia.aposta == "mais" else gols < 2.5
+        aposta = np.where(np.isnan(gols), "", sufixo)
+        return aposta, cotacao, acerto
+
+    colunas = [f"{estrategia.preco}{r}" for r in RESULTADOS]
+    cotacoes = np.column_stack([df[c].to_numpy(dtype=float) if c in df else np.full(n, np.nan) for c in colunas])
+    if estrategia.aposta == "favorito":
+        escolha = pd.Index(RESULTADOS).get_indexer(df["VencedorAposta"])
+        valida = escolha >= 0
+    else:
+        colunas_modelo = [f"{estrategia.modelo}{r}" for r in RESULTADOS]
+        if not all(c in df for c in colunas_modelo):
+            return np.full(n, ""), np.full(n, np.nan), np.zeros(n, dtype=bool)
+        modelo = np.column_stack([df[c].to_numpy(dtype=float) for c in colunas_modelo]) / 100
+        vantagem = np.where(np.isnan(modelo * cotacoes), -np.inf, modelo * cotacoes - 1)
+        escolha = vantagem.argmax(axis=1)
+        valida = vantagem[np.arange(n), escolha] > estrategia.margem
+
+    escolha = np.where(valida, escolha, 0)
+    aposta = np.where(valida, np.array(RESULTADOS)[escolha], "")
+    return aposta, cotacoes[np.arange(n), escolha], aposta == df["FTR"].to_numpy()
+
+
+def avaliar(df, estrategias=ESTRATEGIAS):
+    """Resultados (COLUNAS_RESULTADOS) das estratégias nas partidas de df, por liga, temporada e mês.
+
+    df tem as partidas da camada silver (e, para as apostas de valor, as probabilidades do modelo).
+    """
+    df = df.sort_values(["DateMatch", "League", "HomeTeam"], kind="stable").reset_index(drop=True)
+
+    # Matrizes estratégias x partidas: aposta feita, acerto e lucro de cada aposta (1 unidade)
+    apostas = [_apostas(df, estrategia) for estrategia in estrategias]
+    cotacao = np.vstack([a[1] for a in apostas])
+    apostou = np.vstack([a[0] != "" for a in apostas]) & ~np.isnan(cotacao)
+    acerto = np.vstack([a[2] for a in apostas]) & apostou
+    lucro = np.where(apostou, np.where(acerto, cotacao - 1, -1.0), 0.0)
+
+    meses = df["DateMatch"].map(lambda data: data.month).to_numpy()
+    linhas = []
+    for (liga, temporada), indices in df.groupby(["League", "Temporada"], sort=False).indices.items():
+        # Banca de cada estratégia ao longo da temporada, em ordem cronológica, e rebaixamento em relação
+        # ao maior valor já atingido (pelo menos a banca inicial)
+        banca = BANCA_INICIAL + np.cumsum(lucro[:, indices], axis=1)
+        pico = np.maximum(np.maximum.accumulate(banca, axis=1), BANCA_INICIAL)
+        rebaixamento = (pico - banca) / pico * 100
+        meses_temporada = meses[indices]
+        for mes in pd.unique(meses_temporada):
+            posicoes = np.flatnonzero(meses_temporada == mes)
+            partidas = indices[posicoes]
+            quantidade = apostou[:, partidas].sum(axis=1)
+            total = lucro[:, partidas].sum(axis=1)
+            acertos = acerto[:, partidas].sum(axis=1)
+            banca_mes = banca[:, posicoes[-1]]
+            drawdown = rebaixamento[:, posicoes].max(axis=1)
+            for i, estrategia in enumerate(estrategias):
+                linhas.append((estrategia.nome, liga, int(temporada), int(mes), int(quantidade[i]),
+                               int(acertos[i]), float(total[i]),
+                               float(total[i] / quantidade[i] * 100) if quantidade[i] else None,
+                               float(banca_mes[i]),
+                               float((banca_mes[i] - BANCA_INICIAL) / BANCA_INICIAL * 100),
+                               float(drawdown[i])))
+    return pd.DataFrame(linhas, columns=COLUNAS_RESULTADOS)
+
+
+def backtest(df, estrategias=ESTRATEGIAS, processos=None):
+    """Avalia as estratégias com uma liga por processo (processos=None: um por CPU)."""
+    ligas = [partidas for _, partidas in df.groupby("League")]
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        resultados = list(executor.map(avaliar, ligas, [estrategias] * len(ligas)))
+    return pd.concat(resultados, ignore_index=True)
+
+
+def backtest_spark(df, estrategias=ESTRATEGIAS):
+    """Avalia as estratégias no Spark, uma liga por grupo (em paralelo): DataFrame com ESQUEMA_RESULTADOS."""
+    return df.groupBy("League").applyInPandas(lambda partidas: avaliar(partidas, estrategias), ESQUEMA_RESULTADOS)
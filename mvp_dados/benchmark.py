@@ -0,0 +1,398 @@
+"""Benchmark das etapas do pipeline com dados sintéticos em escala (10x, 100x, 1000x o archive.zip).
+
+O gerador cria um .zip no formato do football-data a partir dos arquivos da temporada 2023-24. Cada
+arquivo sintético é a cópia de um arquivo original, com as mesmas colunas, na mesma ordem, e as mesmas
+células vazias (IW em cerca de metade das partidas, BW e Pinnacle em algumas), em outra divisão (E1,
+I2, ...), em outra temporada (2000-01 a 2023-24, com o ano de 2 dígitos nas datas até 2016-17, como nos
+arquivos antigos) e, a partir de 48 cópias de cada arquivo, com outros nomes de equipes. As cotações
+recebem um ruído pequeno nas probabilidades de cada resultado, igual para todas as casas da partida: a
+margem da média do mercado e a ordem entre as casas (o máximo continua maior que a média) não mudam. A
+primeira cópia de cada arquivo é idêntica ao original, de modo que na escala 1 os índices de acerto são
+os do notebook. As colunas são as do esquema (mvp_dados/esquema.py), com as 6 casas da temporada
+2023-24: a escala cresce em temporadas, ligas e partidas, não em casas de apostas.
+
+Cada escala é executada em um processo novo, com as etapas de mvp_dados/local.py (as mesmas do
+notebook) e a consulta de dispersão das cotações das casas. Para cada etapa são registrados a duração,
+a vazão (partidas por segundo) e o pico da memória residente do processo durante a etapa (amostrada em
+uma thread). O relatório (JSON) traz também a versão do código e das bibliotecas e pode ser comparado
+com o relatório de outra versão: as etapas mais lentas ou com mais memória que a tolerância são
+listadas como regressões.
+
+Os .zip gerados são reaproveitados entre as execuções. O nome de cada um inclui a versão do gerador
+(versao_gerador: hash do código e dos parâmetros do gerador, do esquema e do .zip de origem), também
+registrada no relatório: uma mudança no gerador gera novos arquivos, e relatórios medidos com dados de
+versões diferentes do gerador não são comparados.
+
+Os .zip gerados também podem ser copiados para o diretório dos arquivos do notebook "MVP Dados", que
+registra o tempo das etapas no Spark na tabela ops.pipeline_metrics (mvp_dados/metricas.py).
+
+Uso:
+    python -m mvp_dados.benchmark [archive.zip] [escalas] [relatorio.json] [relatorio_base.json]
+
+escalas é uma lista separada por vírgulas (padrão: 1,10,100).
+"""
+
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from mvp_dados import local
+from mvp_dados.arquivo_zip import checksum
+from mvp_dados.casas import casas_presentes
+from mvp_dados.datas import FORMATOS_DATA, detectar_formato
+from mvp_dados.esquema import COLUNAS, VERSAO
+from mvp_dados.ligas import liga_do_arquivo
+
+ESCALAS = (1, 10, 100)
+
+# Semente do gerador: a mesma semente gera o mesmo .zip
+SEMENTE = 20240501
+
+# Segunda divisão de cada liga dos arquivos originais (as cópias alternam entre as duas)
+SEGUNDAS_DIVISOES = {"E0": "E1", "I1": "I2", "SP1": "SP2", "D1": "D2", "F1": "F2"}
+
+# Temporadas das cópias (ano de início): TEMPORADA_FINAL e as anteriores; até ULTIMA_TEMPORADA_ANO_CURTO,
+# as datas são gravadas com o ano de 2 dígitos
+TEMPORADA_FINAL = 2023
+TEMPORADAS = 24
+ULTIMA_TEMPORADA_ANO_CURTO = 2016
+
+# Desvio padrão do ruído (log) aplicado às probabilidades de cada resultado
+RUIDO_COTACOES = 0.03
+
+# Cotação de referência de cada mercado e resultado: as probabilidades da média do mercado
+REFERENCIAS = {
+    "1X2": {"H": "AvgH", "D": "AvgD", "A": "AvgA"},
+    "OU": {">2.5": "Avg>2.5", "<2.5": "Avg<2.5"},
+    "AH": {"AHH": "AvgAHH", "AHA": "AvgAHA"},
+}
+
+# Intervalo (s) entre as amostras de memória
+INTERVALO_AMOSTRAS = 0.01
+
+# Comparação de relatórios: aumento relativo tolerado e duração mínima (s) de uma etapa comparada
+TOLERANCIA = 0.25
+DURACAO_MINIMA = 0.05
+
+
+def mercado_da_coluna(coluna):
+    """(mercado, resultado) de uma coluna de cotação do esquema, ou None para as demais colunas."""
+    tipos = dict(COLUNAS)
+    if tipos.get(coluna) != "DOUBLE" or coluna in ("AHh", "AHCh"):
+        return None
+    for resultado in (">2.5", "<2.5"):
+        if coluna.endswith(resultado):
+            return "OU", resultado
+    if coluna.endswith(("AHH", "AHA")):
+        return "AH", coluna[-3:]
+    return "1X2", coluna[-1]
+
+
+def _copia(k):
+    """Divisão (0 = principal, 1 = segunda), temporada e grupo de equipes da cópia k de um arquivo."""
+    return k % 2, TEMPORADA_FINAL - (k // 2) % TEMPORADAS, k // (2 * TEMPORADAS)
+
+
+class _Modelo:
+    """Arquivo original usado como modelo das cópias: texto das colunas, datas e cotações numéricas."""
+
+    def __init__(self, conteudo, nome):
+        self.nome = nome
+        self.texto = pd.read_csv(conteudo, dtype=str, keep_default_na=False)
+        self.divisao = self.texto["Div"].iloc[0]
+        formato = detectar_formato(self.texto["Date"].head(20).tolist())
+        self.datas = pd.to_datetime(self.texto["Date"], format=formato[1] if formato else "%d/%m/%Y",
+                                    errors="coerce")
+        self.temporada = int(self.datas.min().year)
+        self.cotacoes = {}
+        for coluna in self.texto.columns:
+            mercado = mercado_da_coluna(coluna)
+            if mercado is not None:
+                self.cotacoes[coluna] = (mercado, pd.to_numeric(self.texto[coluna], errors="coerce").to_numpy())
+        self.probabilidades = {}
+        for mercado, referencias in REFERENCIAS.items():
+            if all(coluna in self.cotacoes for coluna in referencias.values()):
+                inversos = np.column_stack([1 / self.cotacoes[coluna][1] for coluna in referencias.values()])
+                # Partidas sem a média do mercado recebem probabilidades iguais
+                inversos = np.where(np.isnan(inversos).any(axis=1, keepdims=True), 1.0, inversos)
+                self.probabilidades[mercado] = inversos / inversos.sum(axis=1, keepdims=True)
+
+    def copiar(self, k, gerador):
+        """Cópia k do arquivo (k = 0 é o próprio original): (nome do arquivo, conteúdo .csv)."""
+        if k == 0:
+            return self.nome, self.texto.to_csv(index=False)
+        segunda, temporada, grupo = _copia(k)
+        divisao = SEGUNDAS_DIVISOES[self.divisao] if segunda else self.divisao
+        df = self.texto.copy()
+        df["Div"] = divisao
+
+        sufixo = (" II" if segunda else "") + (f" {grupo + 1}" if grupo else "")
+        for coluna in ("HomeTeam", "AwayTeam"):
+            df[coluna] = df[coluna] + sufixo
+
+        formato = "%d/%m/%y" if temporada <= ULTIMA_TEMPORADA_ANO_CURTO else "%d/%m/%Y"
+        datas = self.datas - pd.DateOffset(years=self.temporada - temporada)
+        df["Date"] = datas.dt.strftime(formato).where(datas.notna(), df["Date"])
+
+        # Fator de cada resultado: divide a cotação pela variação da probabilidade, normalizada para
+        # manter a soma das probabilidades da média do mercado (a margem)
+        fatores = {}
+        for mercado, probabilidades in self.probabilidades.items():
+            variacoes = np.exp(gerador.normal(0, RUIDO_COTACOES, probabilidades.shape))
+            normalizacao = (probabilidades * variacoes).sum(axis=1, keepdims=True)
+            for i, resultado in enumerate(REFERENCIAS[mercado]):
+                fatores[mercado, resultado] = normalizacao[:, 0] / variacoes[:, i]
+        for coluna, (mercado, valores) in self.cotacoes.items():
+            if mercado in fatores:
+                novas = np.maximum(np.round(valores * fatores[mercado], 2), 1.01)
+                df[coluna] = np.where(np.isnan(valores), "", np.char.mod("%.2f", novas))
+
+        nome = f"{divisao}_{temporada}" + (f"_{grupo + 1}" if grupo else "") + ".csv"
+        return nome, df.to_csv(index=False)
+
+
+def gerar(caminho_zip, escala, destino, semente=SEMENTE):
+    """Gera em destino um .zip com escala cópias de cada arquivo de liga de caminho_zip (e o notes.txt)."""
+    gerador = np.random.default_rng(semente)
+    with zipfile.ZipFile(caminho_zip) as origem:
+        nomes = sorted(origem.namelist())
+        modelos = []
+        for nome in nomes:
+            if liga_do_arquivo(nome) is not None and liga_do_arquivo(nome).codigo in SEGUNDAS_DIVISOES:
+                with origem.open(nome) as conteudo:
+                    modelos.append(_Modelo(conteudo, nome))
+        temporario = f"{destino}.tmp"
+        with zipfile.ZipFile(temporario, "w", zipfile.ZIP_DEFLATED) as saida:
+            if "notes.txt" in nomes:
+                saida.writestr("notes.txt", origem.read("notes.txt"))
+            for k in range(escala):
+                for modelo in modelos:
+                    saida.writestr(*modelo.copiar(k, gerador))
+    os.replace(temporario, destino)
+    return destino
+
+
+def consultar_dispersao(con):
+    """Dispersão das cotações de cada casa em relação à média do mercado (dispersao_casas do notebook)."""
+    colunas_silver = [linha[0] for linha in con.execute("DESCRIBE silver_europa").fetchall()]
+    odds = ", ".join(f'({prefixo}H, {prefixo}D, {prefixo}A) AS "{nome}"'
+                     for prefixo, nome in casas_presentes(colunas_silver))
+    agregacoes = ",\n".join(
+        f"""ROUND(STDDEV(Odd{r} - Media{r}), 3) AS DesvioPadrao{sufixo},
+            ROUND(AVG(ABS(Odd{r} - Media{r})), 3) AS DesvioMedio{sufixo},
+            ROUND(AVG(100 / Odd{r} / SomaInversos - Percent{r}), 3) AS DiferencaProb{sufixo}"""
+        for r, sufixo in (("H", "Home"), ("D", "Draw"), ("A", "Away")))
+    return con.sql(f"""
+        SELECT CasaAposta AS Casa_aposta,
+               COUNT(*) AS Partidas,
+               ROUND(AVG((SomaInversos - 1) * 100), 3) AS MargemMedia,
+               {agregacoes}
+        FROM (
+            SELECT *, 1 / OddH + 1 / OddD + 1 / OddA AS SomaInversos
+            FROM (UNPIVOT silver_europa ON {odds} INTO NAME CasaAposta VALUE OddH, OddD, OddA)
+            WHERE OddH IS NOT NULL AND OddD IS NOT NULL AND OddA IS NOT NULL
+        )
+        GROUP BY CasaAposta
+        ORDER BY CasaAposta
+    """).df()
+
+
+def memoria_residente():
+    """Memória residente (RSS) atual do processo, em MB; fora do Linux, o pico do processo até o momento."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2**20 if sys.platform == "darwin" else pico / 2**10
+
+
+class _PicoMemoria:
+    """Pico da memória residente enquanto o bloco executa, amostrado em uma thread."""
+
+    def _amostrar(self):
+        while not self._fim.wait(INTERVALO_AMOSTRAS):
+            self.pico = max(self.pico, memoria_residente())
+
+    def __enter__(self):
+        self.pico = memoria_residente()
+        self._fim = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._fim.set()
+        self._thread.join()
+        self.pico = max(self.pico, memoria_residente())
+
+
+def medir(caminho_zip, escala):
+    """Executa as etapas do pipeline sobre um .zip e mede cada uma: lista de dicionários (uma por etapa)."""
+    con = duckdb.connect()
+    medidas = []
+
+    def etapa(nome, funcao):
+        with _PicoMemoria() as memoria:
+            inicio = time.perf_counter()
+            retorno = funcao()
+            duracao = time.perf_counter() - inicio
+        medidas.append({"Escala": escala, "Etapa": nome, "DuracaoS": duracao, "PicoMemoriaMB": memoria.pico})
+        return retorno
+
+    destino = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        partidas, quarentena = etapa("leitura", lambda: local.ler_zip(caminho_zip))
+        con.register("bronze_quarentena", quarentena)
+        etapa("bronze", lambda: local.criar_bronze(con, partidas))
+        etapa("silver", lambda: local.criar_silver(con))
+        etapa("qualidade", lambda: local.verificar_qualidade(con))
+        etapa("gold", lambda: local.criar_gold(con))
+        etapa("análise", lambda: local.analisar(con))
+        etapa("dispersão", lambda: consultar_dispersao(con))
+        etapa("gravação", lambda: local.gravar(con, destino))
+    finally:
+        shutil.rmtree(destino, ignore_errors=True)
+
+    total = con.execute("SELECT COUNT(*) FROM bronze_europa").fetchone()[0]
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        arquivos = sum(liga_do_arquivo(nome) is not None for nome in arquivo_zip.namelist())
+    medidas.append({"Escala": escala, "Etapa": "total", "DuracaoS": sum(m["DuracaoS"] for m in medidas),
+                    "PicoMemoriaMB": max(m["PicoMemoriaMB"] for m in medidas)})
+    for medida in medidas:
+        medida.update({
+            "Arquivos": arquivos,
+            "Partidas": total,
+            "BytesZip": os.path.getsize(caminho_zip),
+            "PartidasPorS": round(total / medida["DuracaoS"]) if medida["DuracaoS"] > 0 else None,
+            "DuracaoS": round(medida["DuracaoS"], 4),
+            "PicoMemoriaMB": round(medida["PicoMemoriaMB"], 1),
+        })
+    return medidas
+
+
+def versao_gerador(caminho_zip):
+    """Versão dos dados sintéticos: hash do código e dos parâmetros do gerador, do esquema e do .zip de origem."""
+    partes = [inspect.getsource(objeto) for objeto in (mercado_da_coluna, _copia, _Modelo, gerar, detectar_formato)]
+    partes += [repr(parametro) for parametro in (SEGUNDAS_DIVISOES, TEMPORADA_FINAL, TEMPORADAS,
+                                                 ULTIMA_TEMPORADA_ANO_CURTO, RUIDO_COTACOES, REFERENCIAS,
+                                                 [formato[:2] for formato in FORMATOS_DATA], COLUNAS, VERSAO)]
+    partes.append(checksum(caminho_zip))
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()[:12]
+
+
+def versao_codigo():
+    """Commit (git describe) do código medido, ou None fora de um repositório git."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(caminho_zip="archive.zip", escalas=ESCALAS, diretorio_dados="benchmark_dados", repeticoes=1,
+             semente=SEMENTE):
+    """Gera os dados de cada escala (se ainda não existirem) e mede as etapas: retorna o relatório.
+
+    Cada medição roda em um processo novo, para que o pico de memória de uma escala não conte na
+    seguinte. Com repeticoes > 1, o relatório traz a mediana das durações e o maior pico de memória.
+    """
+    os.makedirs(diretorio_dados, exist_ok=True)
+    gerador = versao_gerador(caminho_zip)
+    medidas = []
+    for escala in escalas:
+        caminho = os.path.join(diretorio_dados, f"sintetico_x{escala}_{semente}_{gerador}.zip")
+        if not os.path.exists(caminho):
+            gerar(caminho_zip, escala, caminho, semente)
+        execucoes = []
+        for _ in range(repeticoes):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as processo:
+                execucoes.append(processo.submit(medir, caminho, escala).result())
+        for etapas in zip(*execucoes):
+            medida = dict(etapas[0])
+            medida["DuracaoS"] = round(float(np.median([e["DuracaoS"] for e in etapas])), 4)
+            medida["PartidasPorS"] = (round(medida["Partidas"] / medida["DuracaoS"])
+                                      if medida["DuracaoS"] > 0 else None)
+            medida["PicoMemoriaMB"] = max(e["PicoMemoriaMB"] for e in etapas)
+            medidas.append(medida)
+
+    return {
+        "metadados": {
+            "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "versao_codigo": versao_codigo(),
+            "versao_esquema": VERSAO,
+            "versao_gerador": gerador,
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "semente": semente,
+            "repeticoes": repeticoes,
+        },
+        "etapas": medidas,
+    }
+
+
+def comparar(relatorio, base, tolerancia=TOLERANCIA, duracao_minima=DURACAO_MINIMA):
+    """Compara as etapas de dois relatórios (mesma escala e etapa): DataFrame com as razões atual/base.
+
+    Regressao indica uma etapa mais lenta que a base além da tolerância (se a duração for de pelo menos
+    duracao_minima segundos, para não comparar ruído) ou com pico de memória maior além da tolerância.
+    """
+    chaves = ["Escala", "Etapa"]
+    atual = pd.DataFrame(relatorio["etapas"])[chaves + ["DuracaoS", "PicoMemoriaMB"]]
+    anterior = (pd.DataFrame(base["etapas"])[chaves + ["DuracaoS", "PicoMemoriaMB"]]
+                .rename(columns={"DuracaoS": "DuracaoBaseS", "PicoMemoriaMB": "PicoMemoriaBaseMB"}))
+    df = atual.merge(anterior, on=chaves)
+    df["RazaoDuracao"] = (df["DuracaoS"] / df["DuracaoBaseS"]).round(3)
+    df["RazaoMemoria"] = (df["PicoMemoriaMB"] / df["PicoMemoriaBaseMB"]).round(3)
+    df["Regressao"] = (((df["RazaoDuracao"] > 1 + tolerancia) & (df["DuracaoS"] >= duracao_minima))
+                       | (df["RazaoMemoria"] > 1 + tolerancia))
+    return df[chaves + ["DuracaoBaseS", "DuracaoS", "RazaoDuracao", "PicoMemoriaBaseMB", "PicoMemoriaMB",
+                        "RazaoMemoria", "Regressao"]]
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    caminho_zip = argumentos[0] if len(argumentos) > 0 else "archive.zip"
+    escalas = tuple(int(escala) for escala in argumentos[1].split(",")) if len(argumentos) > 1 else ESCALAS
+    caminho_relatorio = argumentos[2] if len(argumentos) > 2 else "benchmark.json"
+
+    relatorio = executar(caminho_zip, escalas)
+    with open(caminho_relatorio, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    colunas = ["Escala", "Etapa", "Partidas", "DuracaoS", "PartidasPorS", "PicoMemoriaMB"]
+    print(f"Relatório gravado em {caminho_relatorio} ({relatorio['metadados']['versao_codigo']}):")
+    print(pd.DataFrame(relatorio["etapas"])[colunas].to_string(index=False))
+
+    if len(argumentos) > 3:
+        with open(argumentos[3], encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        gerador_base = base["metadados"].get("versao_gerador")
+        if gerador_base != relatorio["metadados"]["versao_gerador"]:
+            sys.exit(f"\n{argumentos[3]} foi medido com dados de outra versão do gerador ({gerador_base}): "
+                     f"gere o relatório base com a versão atual ({relatorio['metadados']['versao_gerador']}).")
+        comparacao = comparar(relatorio, base)
+        print(f"\nComparação com {argumentos[3]}:\n{comparacao.to_string(index=False)}")
+        if comparacao["Regressao"].any():
+            sys.exit(1)
@@ -0,0 +1,208 @@
+"""Leitura e preparação dos .csv das ligas para a tabela bronze, compartilhadas pelo notebook
+"MVP Dados" (carga incremental) e pelo notebook "Backfill" (carga de temporadas anteriores).
+
+Cada arquivo é lido pelo nome das colunas do seu cabeçalho, e não pela posição: arquivos de temporadas
+diferentes têm conjuntos de colunas diferentes, e todos são mapeados para o esquema unificado da
+tabela bronze (colunas que só existem em algumas temporadas ficam nulas nas demais).
+"""
+
+from functools import reduce
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import broadcast, coalesce, col, current_timestamp, lit, month, when, year
+
+from mvp_dados.arquivo_zip import cabecalho, rdd_linhas
+from mvp_dados.esquema import COLUNA_CORROMPIDA, VERSAO, colunas, nome_na_tabela, tipo_da_coluna
+from mvp_dados.layout import particoes
+from mvp_dados.ligas import LIGAS, liga_do_arquivo
+
+# Propriedade da tabela bronze com a versão do esquema com que ela foi gravada
+PROPRIEDADE_VERSAO = "mvp_dados.versao_esquema"
+
+# Colunas da tabela bronze convertidas na carga (mvp_dados/datas.py), com tipo diferente do lido do
+# arquivo: nome na tabela -> tipo
+COLUNAS_CONVERTIDAS = {
+    "DateMatch": "DATE",
+    "TimeMatch": "TIMESTAMP",
+    "InicioLocal": "TIMESTAMP",
+}
+
+
+def _colunas_do_cabecalho(colunas_arquivo):
+    """Nomes das colunas de um cabeçalho; colunas sem nome (vírgulas no final da linha) viram _vazia<n>."""
+    return [coluna.strip() or f"_vazia{i}" for i, coluna in enumerate(colunas_arquivo)]
+
+
+def agrupar_por_cabecalho(arquivos):
+    """Agrupa os arquivos pelo cabeçalho (lendo apenas a primeira linha de cada um): cabeçalho -> arquivos."""
+    grupos = {}
+    for arquivo in arquivos:
+        grupos.setdefault(tuple(_colunas_do_cabecalho(cabecalho(arquivo))), []).append(arquivo)
+    return grupos
+
+
+def colunas_da_tabela(grupos):
+    """Colunas (nome na tabela, tipo) que os arquivos agrupados por agrupar_por_cabecalho geram na
+    tabela bronze, além das colunas do esquema atual. Permite evoluir o esquema antes da gravação."""
+    resultado = {nome_na_tabela(nome): tipo for nome, tipo in colunas()}
+    resultado.update(COLUNAS_CONVERTIDAS)
+    for colunas_arquivo, arquivos in grupos.items():
+        extras = {extra for arquivo in arquivos for extra in liga_do_arquivo(arquivo).colunas_extras}
+        for coluna in colunas_arquivo:
+            if coluna not in extras and not coluna.startswith("_vazia"):
+                resultado.setdefault(nome_na_tabela(coluna), tipo_da_coluna(coluna))
+    return resultado
+
+
+def ler_arquivos(spark, arquivos):
+    """Lê os .csv (de dentro dos .zip) com o esquema do cabeçalho de cada um e une os resultados pelo nome.
+
+    As linhas que não puderem ser convertidas para os tipos do esquema ficam na coluna COLUNA_CORROMPIDA;
+    a coluna _arquivo indica o arquivo de origem de cada linha. Cada arquivo é lido separadamente (uma
+    partição), e a origem é uma coluna constante do seu DataFrame: como não faz parte do texto da linha,
+    não é deslocada em linhas com campos faltando ou sobrando.
+    """
+    dfs = []
+    for colunas_arquivo, caminhos in agrupar_por_cabecalho(arquivos).items():
+        esquema = ", ".join(f"`{coluna}` {tipo_da_coluna(coluna)}" for coluna in colunas_arquivo)
+        esquema += f", `{COLUNA_CORROMPIDA}` STRING"
+        extras = {extra for caminho in caminhos for extra in liga_do_arquivo(caminho).colunas_extras}
+        leitor = (spark.read
+                  .schema(esquema)
+                  .option("mode", "PERMISSIVE")
+                  .option("columnNameOfCorruptRecord", COLUNA_CORROMPIDA))
+        dfs += [leitor.csv(rdd_linhas(spark, [caminho]))
+                .drop(*extras, *[c for c in colunas_arquivo if c.startswith("_vazia")])
+                .withColumn("_arquivo", lit(caminho))
+                for caminho in caminhos]
+    if not dfs:
+        return spark.createDataFrame([], f"{', '.join(f'`{n}` {t}' for n, t in colunas())}, "
+                                         f"`_arquivo` STRING, `{COLUNA_CORROMPIDA}` STRING")
+    return reduce(lambda df1, df2: df1.unionByName(df2, allowMissingColumns=True), dfs)
+
+
+def separar_quarentena(df_lido):
+    """Separa as linhas lidas em (linhas válidas, linhas para a tabela bronze.quarentena).
+
+    df_lido deve estar em cache: o Spark não permite filtrar pela coluna de registros corrompidos
+    diretamente sobre a leitura do .csv.
+    """
+    df_quarentena = (df_lido.filter(col(COLUNA_CORROMPIDA).isNotNull())
+                     .select(col("_arquivo").alias("Arquivo"),
+                             col(COLUNA_CORROMPIDA).alias("Registro"),
+                             lit(VERSAO).alias("VersaoEsquema"),
+                             current_timestamp().alias("DataIngestao")))
+    # A coluna _arquivo continua nas linhas válidas, para a normalização das datas (mvp_dados/datas.py)
+    df_validas = df_lido.filter(col(COLUNA_CORROMPIDA).isNull()).drop(COLUNA_CORROMPIDA)
+    return df_validas, df_quarentena
+
+
+def preparar(spark, df):
+    """Calcula a temporada e troca o código da liga pelo nome cadastrado no registro.
+
+    df já deve ter as datas normalizadas (mvp_dados.datas.normalizar); as colunas auxiliares da
+    normalização são descartadas.
+    """
+    df = df.drop("_arquivo", "_data_arquivo")
+
+    # Temporada (ano de início) de cada partida: as temporadas europeias começam em julho/agosto
+    df = df.withColumn("Temporada", when(month(col("Date")) >= 7, year(col("Date"))).otherwise(year(col("Date")) - 1))
+
+    # Troque o código da liga pelo nome cadastrado no registro (tabela pequena, enviada a todos os executores)
+    df_nomes_ligas = spark.createDataFrame([(liga.codigo, liga.nome) for liga in LIGAS], "Div STRING, NomeLiga STRING")
+    return (df.join(broadcast(df_nomes_ligas), "Div", "left")
+            .withColumn("Div", coalesce(col("NomeLiga"), col("Div")))
+            .drop("NomeLiga"))
+
+
+def renomear(df):
+    """Renomeia as colunas para os nomes da tabela bronze (nome_na_tabela)."""
+    return df.toDF(*[nome_na_tabela(coluna) for coluna in df.columns])
+
+
+def completar_colunas(df):
+    """Acrescenta, nulas, as colunas do esquema atual que não existem nos arquivos lidos (temporadas antigas)."""
+    tipos = {nome_na_tabela(nome): tipo for nome, tipo in colunas()}
+    tipos.update(COLUNAS_CONVERTIDAS)
+    for nome, tipo in tipos.items():
+        if nome not in df.columns:
+            df = df.withColumn(nome, lit(None).cast(tipo))
+    return df
+
+
+def comentar(df, comentarios):
+    """Acrescenta as descrições às colunas (metadado "comment"), que o Delta grava no esquema da tabela
+    na mesma transação dos dados, sem um ALTER TABLE por coluna."""
+    return df.select(*[col(c).alias(c, metadata={"comment": comentarios[c]}) if c in comentarios else col(c)
+                       for c in df.columns])
+
+
+def comentarios_divergentes(spark, tabela, comentarios):
+    """Colunas da tabela cuja descrição difere da esperada: lista de (coluna, descrição esperada)."""
+    atuais = {campo.name: campo.metadata.get("comment") for campo in spark.table(tabela).schema.fields}
+    return [(coluna, comentario) for coluna, comentario in comentarios.items()
+            if coluna in atuais and atuais[coluna] != comentario]
+
+
+def versao_da_tabela(spark, tabela):
+    """Versão do esquema (esquema.VERSAO) com que a tabela foi gravada, ou None se não registrada."""
+    propriedades = dict(spark.sql(f"SHOW TBLPROPERTIES {tabela}").collect())
+    versao = propriedades.get(PROPRIEDADE_VERSAO)
+    return int(versao) if versao is not None else None
+
+
+def registrar_versao(spark, tabela):
+    """Registra nas propriedades da tabela a versão do esquema com que ela foi gravada."""
+    spark.sql(f"ALTER TABLE {tabela} SET TBLPROPERTIES ('{PROPRIEDADE_VERSAO}' = '{VERSAO}')")
+
+
+def condicao_chave(tabela, chave):
+    """Condição do MERGE (t = tabela, s = carga) pela chave e pelas colunas de partição da tabela.
+
+    <=> compara também valores nulos. As colunas de partição entram na condição para que o MERGE leia
+    apenas as partições das partidas carregadas.
+    """
+    colunas_chave = chave + [c for c in particoes(tabela) if c not in chave]
+    return " AND ".join(f"t.`{c}` <=> s.`{c}`" for c in colunas_chave)
+
+
+def condicao_alterada(colunas_carga, colunas_tabela, chave):
+    """Condição do MERGE para atualizar uma partida já gravada somente se alguma coluna mudou.
+
+    Colunas da carga que ainda não existem na tabela (acrescentadas ao esquema pelo próprio MERGE) não
+    podem ser referenciadas como t.<coluna>: a partida conta como alterada se a coluna nova vier preenchida.
+    """
+    existentes = {coluna.lower() for coluna in colunas_tabela}
+    condicoes = [f"NOT (t.`{c}` <=> s.`{c}`)" if c.lower() in existentes else f"s.`{c}` IS NOT NULL"
+                 for c in colunas_carga if c not in chave]
+    return " OR ".join(condicoes) or "FALSE"
+
+
+def partidas_alteradas(spark, tabela, df_carga):
+    """Partidas da carga novas ou alteradas em relação à tabela (comparando todas as colunas).
+
+    Apenas as partições (temporada e liga) da carga são lidas da tabela. Colunas que a tabela ainda não
+    tem só tornam a partida diferente quando vêm preenchidas. Sem a tabela, todas as partidas são novas.
+    """
+    if not spark.catalog.tableExists(tabela):
+        return df_carga
+    particoes_carga = df_carga.select("Temporada", "League").distinct().collect()
+    filtro = " OR ".join(f"(Temporada = {p.Temporada} AND League = '{p.League}')" for p in particoes_carga)
+    df_tabela = spark.table(tabela).where(filtro or "FALSE")
+    iguais = [col(f"s.`{c}`").eqNullSafe(col(f"t.`{c}`")) for c in df_carga.columns if c in df_tabela.columns]
+    iguais += [col(f"s.`{c}`").isNull() for c in df_carga.columns if c not in df_tabela.columns]
+    return df_carga.alias("s").join(df_tabela.alias("t"), reduce(lambda a, b: a & b, iguais), "left_anti")
+
+
+def mesclar_partidas(spark, tabela, df_carga, chave):
+    """MERGE das partidas carregadas na tabela: insere as novas e atualiza as que mudaram.
+
+    Colunas novas da carga (de arquivos de outras temporadas) são acrescentadas ao esquema da tabela.
+    """
+    spark.conf.set("spark.databricks.delta.schema.autoMerge.enabled", "true")
+    alterada = condicao_alterada(df_carga.columns, spark.table(tabela).columns, chave)
+    (DeltaTable.forName(spark, tabela).alias("t")
+        .merge(df_carga.alias("s"), condicao_chave(tabela, chave))
+        .whenMatchedUpdateAll(condition=alterada)
+        .whenNotMatchedInsertAll()
+        .execute())
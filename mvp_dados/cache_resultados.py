@@ -0,0 +1,197 @@
+"""Cache dos resultados das consultas de análise, válido enquanto as tabelas consultadas não mudarem.
+
+As consultas da seção "Solução do Problema" retornam poucas linhas, mas leem as tabelas inteiras a cada
+execução do notebook, mesmo que as tabelas só mudem nas cargas. Cada resultado é guardado em um arquivo
+Parquet no diretório do cache, identificado por uma chave calculada a partir:
+- do texto da consulta (com os espaços normalizados) ou do código da função que gera o DataFrame;
+- da identidade (id do DESCRIBE DETAIL), da versão atual (Delta) e do instante desse commit de cada
+  tabela consultada: uma tabela apagada e recriada (carga completa) recomeça da versão 0, mas com outro
+  id e outros instantes de commit.
+
+Enquanto nenhuma das tabelas receber um novo commit, a mesma consulta encontra o resultado no cache e ele
+é lido com o pandas, no driver, sem executar jobs no cluster. A versão de cada tabela é o maior número
+de commit (arquivos NNN.json) do diretório _delta_log, listado pelo driver no caminho local da tabela
+(/dbfs/...); o caminho e o id são obtidos do catálogo (DESCRIBE DETAIL) uma vez por tabela e consultados
+de novo quando a versão volta para trás (tabela recriada na sessão). Tabelas cujo log
+não pode ser listado localmente (por exemplo, em um armazenamento externo sem montagem) usam o histórico
+Delta, que executa uma consulta no Spark. Depois de uma carga, a chave muda e a consulta é executada de
+novo. As entradas menos usadas recentemente (data de modificação do arquivo, atualizada a cada acerto)
+são removidas quando o cache passa dos limites de quantidade ou de tamanho.
+
+A gravação e a leitura dos resultados (DataFrame.to_parquet e pandas.read_parquet) requerem o pyarrow,
+já instalado no Databricks Runtime; em outros ambientes: pip install pyarrow.
+"""
+
+import hashlib
+import os
+import re
+
+import pandas as pd
+
+# Limites do cache: entradas, tamanho total dos arquivos e linhas de um resultado armazenado
+MAX_ENTRADAS = 256
+MAX_BYTES = 64 * 2**20
+MAX_LINHAS = 100_000
+
+# Arquivo de commit do log Delta: versão com 20 dígitos
+_COMMIT_DELTA = re.compile(r"^(\d{20})\.json$")
+
+# Tabelas citadas em uma consulta (banco.tabela depois de FROM ou JOIN)
+_TABELAS_CONSULTA = re.compile(r"\b(?:FROM|JOIN)\s+`?([A-Za-z_]\w*\.[A-Za-z_]\w*)`?", re.IGNORECASE)
+
+
+def tabelas_da_consulta(consulta):
+    """Tabelas (banco.tabela) lidas pela consulta SQL, em ordem alfabética."""
+    return sorted({tabela.lower() for tabela in _TABELAS_CONSULTA.findall(consulta)})
+
+
+def versao_do_log(diretorio_log):
+    """Última versão da tabela Delta pelos nomes dos arquivos de commit do _delta_log, ou None se não houver."""
+    versoes = [int(encontrado.group(1)) for encontrado in map(_COMMIT_DELTA.match, os.listdir(diretorio_log))
+               if encontrado]
+    return max(versoes, default=None)
+
+
+def caminho_local(local):
+    """Caminho no sistema de arquivos do driver para o local da tabela (dbfs:/ ou file:), ou None."""
+    if local.startswith("dbfs:/"):
+        return "/dbfs/" + local[len("dbfs:/"):].lstrip("/")
+    if local.startswith("file:"):
+        return "/" + local[len("file:"):].lstrip("/")
+    return None
+
+
+def assinatura_codigo(codigo):
+    """Texto que identifica o código (bytecode, constantes e nomes) de uma função, estável entre sessões."""
+    partes = [codigo.co_code.hex(), *codigo.co_names]
+    for constante in codigo.co_consts:
+        partes.append(assinatura_codigo(constante) if hasattr(constante, "co_code") else repr(constante))
+    return "|".join(partes)
+
+
+class CacheResultados:
+    """Cache de resultados (pandas.DataFrame) em Parquet, por consulta e versão das tabelas.
+
+    acertos e falhas contam as consultas atendidas pelo cache e as executadas no Spark; remocoes, as
+    entradas descartadas pelos limites; nao_armazenados, os resultados maiores que max_linhas.
+    """
+
+    def __init__(self, spark, diretorio, max_entradas=MAX_ENTRADAS, max_bytes=MAX_BYTES, max_linhas=MAX_LINHAS):
+        self.spark = spark
+        self.diretorio = diretorio
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.max_linhas = max_linhas
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self.nao_armazenados = 0
+        self._detalhes = {}
+        self._versoes = {}
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _detalhe(self, tabela, atualizar=False):
+        """(id da tabela, diretório _delta_log no driver ou None se não for acessível), do catálogo."""
+        if atualizar or tabela not in self._detalhes:
+            detalhe = self.spark.sql(f"DESCRIBE DETAIL {tabela}").first()
+            local = caminho_local(detalhe["location"])
+            diretorio = os.path.join(local, "_delta_log") if local else None
+            self._detalhes[tabela] = (detalhe["id"], diretorio if diretorio and os.path.isdir(diretorio) else None)
+        return self._detalhes[tabela]
+
+    def versao(self, tabela):
+        """Identidade e versão atual da tabela Delta: "id@versão@instante do commit", com o último commit
+        do _delta_log ou, se ele não for acessível, do histórico."""
+        identidade, diretorio = self._detalhe(tabela)
+        versao = versao_do_log(diretorio) if diretorio else None
+        if versao is not None and versao < self._versoes.get(tabela, -1):
+            # Versão menor que a já vista: a tabela foi recriada, com outro id (e talvez outro local)
+            identidade, diretorio = self._detalhe(tabela, atualizar=True)
+            versao = versao_do_log(diretorio) if diretorio else None
+        if versao is not None:
+            # Instante do commit: distingue a mesma versão de uma tabela recriada no mesmo local
+            instante = os.stat(os.path.join(diretorio, f"{versao:020d}.json")).st_mtime_ns
+        else:
+            from delta.tables import DeltaTable
+
+            versao, instante = DeltaTable.forName(self.spark, tabela).history(1).select("version", "timestamp").first()
+        self._versoes[tabela] = versao
+        return f"{identidade}@{versao}@{instante}"
+
+    def chave(self, identificacao, tabelas):
+        """Chave da entrada: hash da identificação da consulta e da identidade e versão das tabelas."""
+        versoes = ",".join(f"{tabela}@{self.versao(tabela)}" for tabela in sorted(tabelas))
+        return hashlib.sha256(f"{identificacao}\n{versoes}".encode("utf-8")).hexdigest()
+
+    def _arquivo(self, chave):
+        return os.path.join(self.diretorio, f"{chave}.parquet")
+
+    def _obter(self, identificacao, tabelas, executar):
+        """Resultado do cache, se houver; senão, executa (DataFrame do Spark), armazena e retorna."""
+        arquivo = self._arquivo(self.chave(identificacao, tabelas))
+        if os.path.exists(arquivo):
+            self.acertos += 1
+            os.utime(arquivo)
+            return pd.read_parquet(arquivo)
+
+        self.falhas += 1
+        df = executar()
+        resultado = df.limit(self.max_linhas + 1).toPandas()
+        if len(resultado) > self.max_linhas:
+            # Resultado grande demais para o cache: retorna o DataFrame do Spark
+            self.nao_armazenados += 1
+            return df
+        temporario = os.path.join(self.diretorio, f".{os.path.basename(arquivo)}.tmp")
+        resultado.to_parquet(temporario, index=False)
+        os.replace(temporario, arquivo)
+        self.remover_excedentes()
+        return resultado
+
+    def consultar(self, consulta, tabelas=None):
+        """Executa a consulta SQL ou lê o resultado do cache; tabelas=None usa as tabelas citadas na consulta."""
+        identificacao = " ".join(consulta.split())
+        tabelas = tabelas if tabelas is not None else tabelas_da_consulta(consulta)
+        return self._obter(identificacao, tabelas, lambda: self.spark.sql(consulta))
+
+    def calcular(self, funcao, *tabelas):
+        """Resultado de funcao(DataFrame de cada tabela) ou do cache, identificado pelo código da função."""
+        identificacao = f"{funcao.__module__}.{funcao.__qualname__}:{assinatura_codigo(funcao.__code__)}"
+        return self._obter(identificacao, tabelas, lambda: funcao(*[self.spark.table(t) for t in tabelas]))
+
+    def entradas(self):
+        """Entradas do cache, da usada mais recentemente para a menos: lista de (arquivo, bytes, último uso)."""
+        entradas = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(".parquet") and not nome.startswith("."):
+                informacao = os.stat(os.path.join(self.diretorio, nome))
+                entradas.append((nome, informacao.st_size, informacao.st_mtime))
+        return sorted(entradas, key=lambda entrada: entrada[2], reverse=True)
+
+    def remover_excedentes(self):
+        """Remove as entradas menos usadas recentemente até o cache voltar aos limites."""
+        total = 0
+        for posicao, (nome, tamanho, _) in enumerate(self.entradas()):
+            total += tamanho
+            if posicao >= self.max_entradas or total > self.max_bytes:
+                os.remove(os.path.join(self.diretorio, nome))
+                self.remocoes += 1
+                total -= tamanho
+
+    def limpar(self):
+        """Remove todas as entradas."""
+        for nome, _, _ in self.entradas():
+            os.remove(os.path.join(self.diretorio, nome))
+
+    def estatisticas(self):
+        """Contadores de uso e ocupação do cache."""
+        entradas = self.entradas()
+        consultas = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acertos": self.acertos / consultas if consultas else None,
+            "remocoes": self.remocoes,
+            "nao_armazenados": self.nao_armazenados,
+            "entradas": len(entradas),
+            "bytes": sum(tamanho for _, tamanho, _ in entradas),
+        }
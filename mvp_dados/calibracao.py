@@ -0,0 +1,116 @@
+"""Qualidade das probabilidades das casas de apostas: scores e calibração (confiabilidade).
+
+Para cada partida e cada previsor (o mercado, com as probabilidades PercentH/D/A da média das casas,
+e cada casa, com as probabilidades implícitas nas suas cotações sem a margem) são calculados:
+- Brier: soma dos quadrados das diferenças entre as probabilidades e o resultado (0 a 2);
+- RPS (ranked probability score): como o Brier, mas sobre as probabilidades acumuladas na ordem
+  H, D, A, o que penaliza menos errar por um empate (0 a 1);
+- log-loss: menos o logaritmo da probabilidade dada ao resultado ocorrido.
+Quanto menores, melhores as previsões.
+
+Para o diagrama de confiabilidade, as probabilidades de cada resultado são divididas em faixas com
+quantidades parecidas de previsões (limites pelos quantis aproximados) e, em cada faixa, a
+probabilidade média é comparada com a frequência com que o resultado ocorreu.
+
+Os scores por liga, temporada e mês e as faixas de confiabilidade saem de uma única agregação
+(GROUPING SETS) sobre as previsões; as duas tabelas têm poucas centenas de linhas.
+"""
+
+from mvp_dados.casas import RESULTADOS, casas_presentes
+
+# Quantidade de faixas do diagrama de confiabilidade
+FAIXAS = 10
+
+# Probabilidade mínima considerada no log-loss (evita log(0))
+PROBABILIDADE_MINIMA = 1e-15
+
+CHAVES_SCORES = ["Previsor", "League", "Temporada", "Mes"]
+CHAVES_CONFIABILIDADE = ["Previsor", "Faixa"]
+
+
+def stack_previsores(casas):
+    """Expressão SQL stack() com uma linha por partida e previsor: (Previsor, ProbH, ProbD, ProbA), de 0 a 1.
+
+    O mercado usa PercentH/D/A (camada silver); as casas, as probabilidades implícitas normalizadas.
+    """
+    valores = ["'Mercado', " + ", ".join(f"Percent{r} / 100" for r in RESULTADOS)]
+    for prefixo, nome in casas:
+        soma = " + ".join(f"1 / `{prefixo}{r}`" for r in RESULTADOS)
+        valores.append(f"'{nome}', " + ", ".join(f"(1 / `{prefixo}{r}`) / ({soma})" for r in RESULTADOS))
+    return f"stack({len(valores)}, {', '.join(valores)}) AS (Previsor, ProbH, ProbD, ProbA)"
+
+
+def _ocorreu(resultado):
+    return f"CASE WHEN FTR = '{resultado}' THEN 1 ELSE 0 END"
+
+
+# Scores de uma previsão (ProbH, ProbD, ProbA) em relação ao resultado (FTR)
+BRIER = " + ".join(f"POW(Prob{r} - {_ocorreu(r)}, 2)" for r in RESULTADOS)
+RPS = (f"(POW(ProbH - {_ocorreu('H')}, 2) + "
+       f"POW(ProbH + ProbD - {_ocorreu('H')} - {_ocorreu('D')}, 2)) / 2")
+LOG_LOSS = (f"-LN(GREATEST(CASE FTR WHEN 'H' THEN ProbH WHEN 'D' THEN ProbD ELSE ProbA END, "
+            f"{PROBABILIDADE_MINIMA}))")
+
+
+def previsoes(df_silver):
+    """Uma linha por partida, previsor e resultado possível, com os scores da previsão na linha do H.
+
+    Colunas: League, Temporada, Mes, Previsor, Resultado, Prob, Ocorreu, Brier, RPS, LogLoss.
+    """
+    from pyspark.sql.functions import expr
+
+    por_previsor = (df_silver
+                    .select("League", "Temporada", expr("MONTH(DateMatch) AS Mes"), "FTR",
+                            expr(stack_previsores(casas_presentes(df_silver.columns))))
+                    .where("FTR IN ('H', 'D', 'A') AND ProbH IS NOT NULL AND ProbD IS NOT NULL AND ProbA IS NOT NULL")
+                    .withColumn("Brier", expr(BRIER))
+                    .withColumn("RPS", expr(RPS))
+                    .withColumn("LogLoss", expr(LOG_LOSS)))
+    valores = ", ".join(f"'{r}', Prob{r}, {_ocorreu(r)}, " + ("Brier, RPS, LogLoss" if r == "H" else
+                                                               "CAST(NULL AS DOUBLE), CAST(NULL AS DOUBLE), "
+                                                               "CAST(NULL AS DOUBLE)")
+                        for r in RESULTADOS)
+    return por_previsor.select("League", "Temporada", "Mes", "Previsor",
+                               expr(f"stack(3, {valores}) AS (Resultado, Prob, Ocorreu, Brier, RPS, LogLoss)"))
+
+
+def faixa_sql(limites):
+    """Expressão SQL com a faixa (0 a len(limites)) da probabilidade Prob, dados os limites internos."""
+    if not limites:
+        return "0"
+    return " + ".join(f"CASE WHEN Prob >= {limite} THEN 1 ELSE 0 END" for limite in limites)
+
+
+def avaliar(spark, df_silver, faixas=FAIXAS, erro_relativo=0.001):
+    """Scores por previsor, liga, temporada e mês e faixas de confiabilidade por previsor.
+
+    Retorna (df_scores, df_confiabilidade). Os limites das faixas são quantis aproximados das
+    probabilidades; as duas tabelas vêm da mesma agregação.
+    """
+    df_previsoes = previsoes(df_silver)
+    quantis = [i / faixas for i in range(1, faixas)]
+    limites = sorted(set(df_previsoes.approxQuantile("Prob", quantis, erro_relativo)))
+
+    df_previsoes.selectExpr("*", f"{faixa_sql(limites)} AS Faixa").createOrReplaceTempView("previsoes_calibracao")
+    df_agregado = spark.sql(f"""
+        SELECT {", ".join(dict.fromkeys(CHAVES_SCORES + CHAVES_CONFIABILIDADE))},
+               GROUPING(Faixa) = 1 AS PorPeriodo,
+               COUNT(Brier) AS Partidas,
+               AVG(Brier) AS Brier,
+               AVG(RPS) AS RPS,
+               AVG(LogLoss) AS LogLoss,
+               COUNT(*) AS Previsoes,
+               MIN(Prob) AS ProbMinima,
+               MAX(Prob) AS ProbMaxima,
+               AVG(Prob) AS ProbMedia,
+               AVG(Ocorreu) AS FrequenciaObservada
+        FROM previsoes_calibracao
+        GROUP BY GROUPING SETS (({", ".join(CHAVES_SCORES)}), ({", ".join(CHAVES_CONFIABILIDADE)}))
+    """).cache()
+
+    df_scores = (df_agregado.where("PorPeriodo")
+                 .select(*CHAVES_SCORES, "Partidas", "Brier", "RPS", "LogLoss"))
+    df_confiabilidade = (df_agregado.where("NOT PorPeriodo")
+                         .select(*CHAVES_CONFIABILIDADE, "Previsoes", "ProbMinima", "ProbMaxima", "ProbMedia",
+                                 "FrequenciaObservada"))
+    return df_scores, df_confiabilidade
@@ -0,0 +1,71 @@
+"""Casas de apostas descritas no catálogo de dados (notes.txt) e utilitários para as colunas de cotações.
+
+Os arquivos da temporada 2023-24 trazem cotações de apenas 6 destas casas; as funções abaixo
+consideram somente as casas cujas colunas existem na tabela consultada.
+"""
+
+# (prefixo das colunas de cotação, nome da casa)
+CASAS_APOSTA = [
+    ("B365", "Bet365"),
+    ("BS", "Blue Square"),
+    ("BW", "Bet&Win"),
+    ("GB", "Gamebookers"),
+    ("IW", "Interwetten"),
+    ("LB", "Ladbrokes"),
+    ("PS", "Pinnacle"),
+    ("SO", "Sporting Odds"),
+    ("SB", "Sportingbet"),
+    ("SJ", "Stan James"),
+    ("SY", "Stanleybet"),
+    ("VC", "VC Bet"),
+    ("WH", "William Hill"),
+]
+
+# Cotações consolidadas do mercado, com o mesmo formato de colunas das casas
+MERCADO = [
+    ("Max", "Máximo do mercado"),
+    ("Avg", "Média do mercado"),
+]
+
+RESULTADOS = ("H", "D", "A")
+
+
+def casas_presentes(colunas):
+    """Casas de CASAS_APOSTA com as três colunas de cotação 1X2 (H, D e A) presentes em colunas."""
+    colunas = set(colunas)
+    return [(prefixo, nome) for prefixo, nome in CASAS_APOSTA
+            if all(f"{prefixo}{resultado}" in colunas for resultado in RESULTADOS)]
+
+
+def casas_com_fechamento(colunas):
+    """Casas (e cotações do mercado) com as cotações 1X2 de abertura e de fechamento presentes em colunas."""
+    colunas = set(colunas)
+    return [(prefixo, nome) for prefixo, nome in CASAS_APOSTA + MERCADO
+            if all(f"{prefixo}{resultado}" in colunas and f"{prefixo}C{resultado}" in colunas
+                   for resultado in RESULTADOS)]
+
+
+def stack_odds(casas, por_resultado=False):
+    """Expressão SQL stack() que transforma as cotações 1X2 das casas informadas em linhas.
+
+    Gera uma linha por casa (CasaAposta, OddH, OddD, OddA) ou, com por_resultado=True, uma linha por
+    casa e resultado (CasaAposta, Resultado, Odd).
+    """
+    if por_resultado:
+        valores = [f"'{nome}', '{resultado}', `{prefixo}{resultado}`"
+                   for prefixo, nome in casas for resultado in RESULTADOS]
+        return f"stack({len(valores)}, {', '.join(valores)}) AS (CasaAposta, Resultado, Odd)"
+    valores = [f"'{nome}', " + ", ".join(f"`{prefixo}{resultado}`" for resultado in RESULTADOS)
+               for prefixo, nome in casas]
+    return f"stack({len(valores)}, {', '.join(valores)}) AS (CasaAposta, OddH, OddD, OddA)"
+
+
+def stack_movimento(casas):
+    """Expressão SQL stack() com uma linha por casa e as cotações 1X2 de abertura e de fechamento.
+
+    Colunas geradas: CasaAposta, OddH, OddD, OddA (abertura) e OddCH, OddCD, OddCA (fechamento).
+    """
+    valores = [f"'{nome}', " + ", ".join(f"`{prefixo}{c}{resultado}`" for c in ("", "C") for resultado in RESULTADOS)
+               for prefixo, nome in casas]
+    return (f"stack({len(valores)}, {', '.join(valores)}) "
+            f"AS (CasaAposta, OddH, OddD, OddA, OddCH, OddCD, OddCA)")
@@ -0,0 +1,141 @@
+"""Catálogo de colunas do football-data (notes.txt) e verificação de mudanças de layout (schema drift).
+
+O notes.txt é convertido em um catálogo (coluna -> descrição, seção e tipo), incluindo as colunas de
+cotações de fechamento, que o arquivo descreve apenas pela regra do "C" depois da sigla da casa.
+Antes de qualquer leitura pelo Spark, o cabeçalho de cada arquivo é comparado com o catálogo e com o
+esquema atual da tabela bronze, para decidir o que fazer com cada arquivo:
+- "carregar": todas as colunas já existem na tabela bronze;
+- "evoluir": há colunas do catálogo que ainda não existem na tabela e serão acrescentadas a ela;
+- "quarentena": há colunas fora do catálogo, colunas repetidas ou faltam colunas essenciais; o arquivo
+  não é carregado.
+Colunas que a liga declara como extras no registro (como Referee) são descartadas na leitura.
+"""
+
+import re
+from dataclasses import dataclass, field
+
+from mvp_dados.esquema import COLUNAS, COLUNAS_HISTORICAS, COLUNAS_OPCIONAIS, nome_na_tabela
+
+# Descrições das colunas calculadas na carga, que não vêm do notes.txt
+COMENTARIOS_DERIVADOS = {
+    "Temporada": "Season start year (derived from DateMatch)",
+    "TimeMatch": "Kick-off instant in UTC (Date and Time, published in UK time)",
+    "InicioLocal": "Kick-off in the league's local time zone",
+}
+
+# Colunas sem as quais um arquivo não pode ser carregado (chave da partida e resultado)
+COLUNAS_ESSENCIAIS = ("Div", "Date", "HomeTeam", "AwayTeam", "FTR")
+
+# Seções do notes.txt cujas colunas são cotações (e têm versão de fechamento)
+_SECOES_COTACOES = ("1X2", "total goals", "Asian handicap")
+
+# Siglas que recebem o "C" das cotações de fechamento
+_PREFIXO_FECHAMENTO = re.compile(r"^(B365|BS|BW|GB|IW|LB|PS|P|SO|SB|SJ|SY|VC|WH|Max|Avg|AH)(?=H|D|A|>|<|h$)")
+
+_ENTRADA = re.compile(r"^(\S+(?: and \S+)?) = (.+)$")
+
+
+@dataclass(frozen=True)
+class ColunaCatalogo:
+    nome: str          # nome da coluna no .csv
+    descricao: str     # descrição do notes.txt
+    secao: str         # seção do notes.txt ("Key to results data", "Match Statistics", ...)
+    tipo: str          # tipo SQL na tabela bronze
+    fechamento: bool = False
+
+
+@dataclass
+class Diagnostico:
+    arquivo: str
+    acao: str                                         # "carregar", "evoluir" ou "quarentena"
+    novas: list = field(default_factory=list)         # colunas do catálogo acrescentadas à tabela
+    descartadas: list = field(default_factory=list)   # colunas extras da liga, descartadas na leitura
+    desconhecidas: list = field(default_factory=list) # colunas fora do catálogo e da tabela
+    ausentes: list = field(default_factory=list)      # colunas essenciais que faltam no arquivo
+    repetidas: list = field(default_factory=list)     # colunas que aparecem mais de uma vez
+
+
+def _tipo(nome, descricao, secao):
+    """Tipo da coluna: o do esquema (mvp_dados/esquema.py) ou deduzido da seção e da descrição."""
+    tipos = dict(COLUNAS)
+    tipos.update({coluna: tipo for coluna, (_, tipo) in COLUNAS_OPCIONAIS.items()})
+    tipos.update(COLUNAS_HISTORICAS)
+    if nome in tipos:
+        return tipos[nome]
+    if descricao.startswith("Number of"):
+        return "INT"
+    if any(s in secao for s in _SECOES_COTACOES):
+        return "DOUBLE"
+    if secao.startswith("Match Statistics"):
+        return "INT"
+    return "STRING"
+
+
+def _fechamento(nome):
+    """Nome da coluna de cotação de fechamento correspondente, ou None se a coluna não tiver uma."""
+    encontrado = _PREFIXO_FECHAMENTO.match(nome)
+    if encontrado is None:
+        return None
+    return f"{encontrado.group(1)}C{nome[encontrado.end():]}"
+
+
+def ler_catalogo(texto):
+    """Converte o conteúdo do notes.txt em um catálogo: nome da coluna no .csv -> ColunaCatalogo."""
+    catalogo = {}
+    secao = ""
+    for linha in texto.splitlines():
+        linha = linha.strip()
+        if linha.startswith("Key to") or linha.startswith("Match Statistics"):
+            secao = linha.rstrip(":")
+            continue
+        encontrado = _ENTRADA.match(linha)
+        if not secao or encontrado is None:
+            continue
+        descricao = encontrado.group(2).strip()
+        # "FTHG and HG": nomes alternativos da mesma coluna, com o mesmo tipo
+        nomes = encontrado.group(1).split(" and ")
+        tipo = _tipo(nomes[0], descricao, secao)
+        for nome in nomes:
+            catalogo[nome] = ColunaCatalogo(nome, descricao, secao, tipo)
+            fechamento = _fechamento(nome) if any(s in secao for s in _SECOES_COTACOES) else None
+            if fechamento:
+                catalogo[fechamento] = ColunaCatalogo(fechamento, f"{descricao} (closing odds)", secao, tipo,
+                                                      fechamento=True)
+    return catalogo
+
+
+def comentarios_bronze(catalogo):
+    """Descrição de cada coluna da tabela bronze (nome na tabela -> descrição), a partir do catálogo."""
+    comentarios = {nome_na_tabela(coluna.nome): coluna.descricao for coluna in catalogo.values()}
+    comentarios.update(COMENTARIOS_DERIVADOS)
+    return comentarios
+
+
+def verificar_cabecalho(arquivo, colunas_arquivo, catalogo, colunas_bronze, extras=()):
+    """Compara o cabeçalho de um arquivo com o catálogo e com as colunas atuais da tabela bronze.
+
+    colunas_bronze são os nomes das colunas na tabela (vazio se ela ainda não existir) e extras,
+    as colunas que o registro de ligas manda descartar.
+    """
+    colunas_bronze = set(colunas_bronze)
+    diagnostico = Diagnostico(arquivo, "carregar")
+    vistas = set()
+    for coluna in colunas_arquivo:
+        if coluna and coluna in vistas:
+            diagnostico.repetidas.append(coluna)
+        vistas.add(coluna)
+        if coluna in extras:
+            diagnostico.descartadas.append(coluna)
+        elif nome_na_tabela(coluna) in colunas_bronze:
+            continue
+        elif coluna in catalogo:
+            diagnostico.novas.append(coluna)
+        elif coluna:
+            diagnostico.desconhecidas.append(coluna)
+    diagnostico.ausentes = [coluna for coluna in COLUNAS_ESSENCIAIS if coluna not in vistas]
+
+    if diagnostico.desconhecidas or diagnostico.ausentes or diagnostico.repetidas:
+        diagnostico.acao = "quarentena"
+    elif diagnostico.novas and colunas_bronze:
+        diagnostico.acao = "evoluir"
+    return diagnostico
@@ -0,0 +1,162 @@
+"""Normalização das datas e dos horários das partidas, com o formato da data detectado por arquivo.
+
+O formato da coluna Date muda entre as temporadas do football-data (dd/mm/yyyy nas recentes, dd/mm/yy
+nas antigas) e pode mudar em arquivos futuros; por isso, ele é detectado em uma amostra das primeiras
+linhas de cada arquivo, lida de dentro do .zip pelo driver, e cada arquivo é convertido com o seu
+próprio formato, em uma única expressão (sem uma leitura a mais dos dados).
+
+Nos formatos com o ano em dois dígitos, o século não é deixado para a biblioteca: o yy do Spark resolve
+sempre para 2000-2099 e o %y do Python, 69-99 para 1900-1999, o que levaria as temporadas dos anos 1990
+para os anos 2090 no Spark. O ano de referência do arquivo é o da primeira data da amostra, no século
+que não a coloca no futuro, e cada data recebe o ano, com os mesmos dois dígitos, mais próximo dele
+(corrigir_ano, usada pelo Spark e pela execução local); assim, uma temporada como 1999-00 fica em 1999
+e 2000.
+
+O football-data publica os horários (coluna Time) no horário do Reino Unido. O início da partida
+(TimeMatch) é o instante em UTC, e InicioLocal é o horário no fuso da liga (Liga.fuso_horario). Como
+nas demais funções de fuso do Spark, os valores supõem a sessão em UTC (o padrão do Databricks).
+
+Datas que não puderem ser convertidas não viram partidas sem data silenciosamente: se a proporção
+de datas nulas de um arquivo passar de LIMITE_DATAS_NULAS, o arquivo inteiro é rejeitado; abaixo do
+limite, apenas as linhas sem data vão para a quarentena.
+
+A detecção do formato não depende do Spark (é usada também pela execução local, mvp_dados/local.py);
+o pyspark só é importado pelas funções que montam as expressões.
+"""
+
+import re
+from datetime import date, datetime
+
+from mvp_dados.arquivo_zip import amostra, cabecalho
+from mvp_dados.esquema import FORMATO_HORA, VERSAO
+from mvp_dados.ligas import LIGAS
+
+# Fuso horário dos horários publicados pelo football-data
+FUSO_ARQUIVOS = "Europe/London"
+
+# Formatos aceitos na coluna Date: (padrão do Spark, padrão do strptime, expressão regular)
+FORMATOS_DATA = (
+    ("dd/MM/yyyy", "%d/%m/%Y", re.compile(r"^\d{2}/\d{2}/\d{4}$")),
+    ("dd/MM/yy", "%d/%m/%y", re.compile(r"^\d{2}/\d{2}/\d{2}$")),
+    ("dd-MM-yyyy", "%d-%m-%Y", re.compile(r"^\d{2}-\d{2}-\d{4}$")),
+    ("yyyy-MM-dd", "%Y-%m-%d", re.compile(r"^\d{4}-\d{2}-\d{2}$")),
+)
+
+# Proporção máxima de datas nulas (não convertidas) aceita em um arquivo
+LIMITE_DATAS_NULAS = 0.01
+
+
+def detectar_formato(valores):
+    """Formato (FORMATOS_DATA) que reconhece todos os valores não vazios da amostra, ou None."""
+    valores = [valor.strip() for valor in valores if valor and valor.strip()]
+    for formato in FORMATOS_DATA:
+        if valores and all(formato[2].match(valor) for valor in valores):
+            return formato
+    return None
+
+
+def ano_referencia(valores, formato):
+    """Ano completo da primeira data da amostra, se o formato tiver o ano em dois dígitos; senão, None.
+
+    O século é o mais recente que não coloca a data depois do ano atual.
+    """
+    if formato is None or "%y" not in formato[1]:
+        return None
+    valor = next(valor.strip() for valor in valores if valor and valor.strip())
+    ano = datetime.strptime(valor, formato[1]).year % 100
+    return ano + (2000 if 2000 + ano <= date.today().year else 1900)
+
+
+def corrigir_ano(ano, referencia):
+    """Ano com os mesmos dois últimos dígitos mais próximo do ano de referência (de referencia - 50 a
+    referencia + 49).
+
+    Funciona com inteiros, séries do pandas e colunas do Spark (ano com o século atribuído pela
+    biblioteca, sempre maior que referencia - 50 no Spark).
+    """
+    inicio = referencia - 50
+    return (ano - inicio) % 100 + inicio
+
+
+def formatos_por_arquivo(arquivos, linhas=20):
+    """Padrão do Spark da coluna Date de cada arquivo e ano de referência dos anos em dois dígitos
+    (ano_referencia): arquivo -> (padrão, ano), com (None, None) se o formato não for reconhecido.
+
+    Lê apenas o cabeçalho e as primeiras linhas de cada arquivo.
+    """
+    formatos = {}
+    for arquivo in arquivos:
+        colunas_arquivo = [coluna.strip() for coluna in cabecalho(arquivo)]
+        posicao = colunas_arquivo.index("Date")
+        valores = [linha[posicao] for linha in amostra(arquivo, linhas) if len(linha) > posicao]
+        formato = detectar_formato(valores)
+        formatos[arquivo] = (formato[0], ano_referencia(valores, formato)) if formato else (None, None)
+    return formatos
+
+
+def normalizar(df, formatos):
+    """Converte a data de cada linha com o formato do seu arquivo (coluna _arquivo, formatos de
+    formatos_por_arquivo) e calcula o início
+    da partida: Time passa a ser o instante do início (UTC) e InicioLocal, o horário no fuso da liga.
+
+    Linhas de arquivos sem formato reconhecido ficam com a data nula. O texto original da data fica na
+    coluna _data_arquivo, para a quarentena.
+    """
+    from pyspark.sql.functions import (col, concat_ws, create_map, dayofmonth, from_utc_timestamp, lit, make_date,
+                                       month, to_date, to_timestamp, to_utc_timestamp, trim, when, year)
+
+    data = trim(col("Date"))
+    df = df.withColumn("_data_arquivo", data)
+    por_formato = {}
+    for arquivo, formato in formatos.items():
+        if formato[0]:
+            por_formato.setdefault(formato, []).append(arquivo)
+    convertida = lit(None).cast("date")
+    for (padrao, referencia), arquivos in por_formato.items():
+        data_arquivo = to_date(data, padrao)
+        if referencia is not None:
+            data_arquivo = make_date(corrigir_ano(year(data_arquivo), referencia), month(data_arquivo),
+                                     dayofmonth(data_arquivo))
+        convertida = when(col("_arquivo").isin(arquivos), data_arquivo).otherwise(convertida)
+    df = df.withColumn("Date", convertida)
+
+    # Início da partida: data e horário do arquivo (horário do Reino Unido) convertidos para UTC
+    # (arquivos de temporadas antigas não têm a coluna Time)
+    hora = trim(col("Time")) if "Time" in df.columns else lit(None).cast("string")
+    data_hora = when(hora != "", concat_ws(" ", col("Date").cast("string"), hora))
+    inicio = to_utc_timestamp(to_timestamp(data_hora, f"yyyy-MM-dd {FORMATO_HORA}"), FUSO_ARQUIVOS)
+    fusos = create_map(*[lit(valor) for liga in LIGAS for valor in (liga.codigo, liga.fuso_horario)])
+    return (df.withColumn("Time", inicio)
+            .withColumn("InicioLocal", from_utc_timestamp(col("Time"), fusos[col("Div")])))
+
+
+def datas_nulas_por_arquivo(df):
+    """Linhas e datas nulas de cada arquivo, após normalizar: arquivo -> (linhas, datas nulas).
+
+    Uma única agregação sobre o DataFrame (em cache na carga), sem ler de novo os arquivos.
+    """
+    from pyspark.sql.functions import col, count, lit, sum as soma, when
+
+    return {linha["_arquivo"]: (linha["Linhas"], linha["DatasNulas"])
+            for linha in df.groupBy("_arquivo")
+                           .agg(count(lit(1)).alias("Linhas"),
+                                soma(when(col("Date").isNull(), 1).otherwise(0)).alias("DatasNulas"))
+                           .collect()}
+
+
+def arquivos_acima_do_limite(contagens, limite=LIMITE_DATAS_NULAS):
+    """Arquivos cuja proporção de datas nulas passa do limite: arquivo -> proporção."""
+    return {arquivo: nulas / linhas for arquivo, (linhas, nulas) in contagens.items()
+            if linhas and nulas / linhas > limite}
+
+
+def separar_datas_nulas(df):
+    """Separa as linhas normalizadas em (linhas com data, linhas sem data para a tabela bronze.quarentena)."""
+    from pyspark.sql.functions import col, current_timestamp, lit, struct, to_json
+
+    df_quarentena = (df.filter(col("Date").isNull())
+                     .select(col("_arquivo").alias("Arquivo"),
+                             to_json(struct(*[col(c) for c in df.columns if c != "_arquivo"])).alias("Registro"),
+                             lit(VERSAO).alias("VersaoEsquema"),
+                             current_timestamp().alias("DataIngestao")))
+    return df.filter(col("Date").isNotNull()), df_quarentena
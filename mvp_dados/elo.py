@@ -0,0 +1,140 @@
+"""Ratings Elo das equipes, calculados em ordem cronológica sobre as partidas da camada silver.
+
+Serve de base de comparação para o VencedorAposta: antes de cada partida, os ratings das duas equipes
+dão as probabilidades de vitória do mandante, empate e vitória do visitante (modelo de Elo-Davidson,
+com vantagem de mando), que podem ser comparadas com as probabilidades implícitas nas cotações
+(PercentH/D/A). Depois da partida, os ratings são atualizados pelo resultado.
+
+Os ratings de uma liga dependem apenas das partidas dela. As partidas de uma mesma data são
+processadas juntas, em operações NumPy sobre todas elas (uma equipe não joga duas vezes no mesmo
+dia), e não partida a partida. No Spark, cada liga é processada em paralelo (applyInPandas).
+
+O estado (último rating de cada equipe, estado_spark) funciona como checkpoint: as partidas novas
+partem dele e aplicam apenas as suas próprias atualizações. Quando chegam partidas novas ou corrigidas
+com datas já processadas, o estado é calculado (estado_spark) apenas com as partidas anteriores à
+primeira data alterada da liga, e todas as partidas a partir dela são recalculadas.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Rating de uma equipe sem partidas anteriores
+RATING_INICIAL = 1500.0
+
+# Fator de atualização: variação máxima do rating em uma partida
+K = 20.0
+
+# Vantagem do mandante, em pontos de rating
+VANTAGEM_MANDO = 60.0
+
+# Parâmetro de empate do modelo de Davidson: ~26% de empates entre equipes equivalentes
+PARAMETRO_EMPATE = 0.7
+
+# Fração da distância até o rating médio descontada no início de cada temporada
+REGRESSAO_TEMPORADA = 0.2
+
+# Colunas de entrada (uma linha por partida) e do estado (uma linha por equipe)
+COLUNAS_PARTIDAS = ["League", "Temporada", "DateMatch", "HomeTeam", "AwayTeam", "FTR"]
+COLUNAS_ESTADO = ["League", "Equipe", "Rating", "Temporada", "DateMatch", "Partidas"]
+
+# Colunas calculadas para cada partida, com o tipo na tabela
+COLUNAS_ELO = {
+    "EloH": "double", "EloA": "double",
+    "EloProbH": "double", "EloProbD": "double", "EloProbA": "double",
+    "EloPrevisto": "string",
+    "EloHPos": "double", "EloAPos": "double",
+}
+
+
+def probabilidades(rating_h, rating_a):
+    """Probabilidades (H, D, A), em %, de uma partida entre equipes com os ratings informados."""
+    forca_h = 10 ** ((np.asarray(rating_h) + VANTAGEM_MANDO) / 400)
+    forca_a = 10 ** (np.asarray(rating_a) / 400)
+    empate = PARAMETRO_EMPATE * np.sqrt(forca_h * forca_a)
+    total = forca_h + forca_a + empate
+    return forca_h / total * 100, empate / total * 100, forca_a / total * 100
+
+
+def calcular(partidas, estado=None):
+    """Ratings antes e depois de cada partida de uma liga, a partir do estado (checkpoint) anterior.
+
+    partidas tem as colunas COLUNAS_PARTIDAS e estado, as colunas COLUNAS_ESTADO (ou é vazio). Retorna
+    as partidas, em ordem cronológica, com as colunas COLUNAS_ELO.
+    """
+    partidas = partidas.sort_values(["DateMatch", "HomeTeam"], kind="stable").reset_index(drop=True)
+    estado = estado if estado is not None else pd.DataFrame(columns=COLUNAS_ESTADO)
+
+    equipes = pd.Index(pd.unique(pd.concat([estado["Equipe"], partidas["HomeTeam"], partidas["AwayTeam"]])))
+    ratings = np.full(len(equipes), RATING_INICIAL)
+    temporadas = np.full(len(equipes), -1)
+    if len(estado):
+        posicoes = equipes.get_indexer(estado["Equipe"])
+        ratings[posicoes] = estado["Rating"].to_numpy(dtype=float)
+        temporadas[posicoes] = estado["Temporada"].to_numpy(dtype=int)
+
+    casa = equipes.get_indexer(partidas["HomeTeam"])
+    fora = equipes.get_indexer(partidas["AwayTeam"])
+    temporada = partidas["Temporada"].to_numpy(dtype=int)
+    pontos = partidas["FTR"].map({"H": 1.0, "D": 0.5, "A": 0.0}).to_numpy(dtype=float)
+
+    antes_h, antes_a = np.empty(len(partidas)), np.empty(len(partidas))
+    depois_h, depois_a = np.empty(len(partidas)), np.empty(len(partidas))
+
+    # Um bloco por data: as partidas do bloco partem dos ratings ao fim da data anterior
+    _, inicios = np.unique(partidas["DateMatch"].to_numpy(), return_index=True)
+    limites = list(inicios[1:]) + [len(partidas)]
+    for inicio, fim in zip(inicios, limites):
+        h, a, t = casa[inicio:fim], fora[inicio:fim], temporada[inicio:fim]
+
+        # Primeira partida da equipe na temporada: o rating se aproxima da média
+        for indices in (h, a):
+            nova = (temporadas[indices] >= 0) & (temporadas[indices] < t)
+            ratings[indices[nova]] += REGRESSAO_TEMPORADA * (RATING_INICIAL - ratings[indices[nova]])
+            temporadas[indices] = np.maximum(temporadas[indices], t)
+
+        antes_h[inicio:fim], antes_a[inicio:fim] = ratings[h], ratings[a]
+        prob_h, prob_d, _ = probabilidades(ratings[h], ratings[a])
+        esperado = (prob_h + prob_d / 2) / 100
+        # Partidas sem resultado não alteram os ratings
+        variacao = np.nan_to_num(K * (pontos[inicio:fim] - esperado))
+        np.add.at(ratings, h, variacao)
+        np.add.at(ratings, a, -variacao)
+        depois_h[inicio:fim], depois_a[inicio:fim] = ratings[h], ratings[a]
+
+    prob_h, prob_d, prob_a = probabilidades(antes_h, antes_a)
+    previsto = np.select([(prob_h >= prob_d) & (prob_h >= prob_a), prob_d >= prob_a], ["H", "D"], "A")
+    return partidas.assign(EloH=antes_h, EloA=antes_a, EloProbH=prob_h, EloProbD=prob_d, EloProbA=prob_a,
+                           EloPrevisto=previsto, EloHPos=depois_h, EloAPos=depois_a)
+
+
+def calcular_spark(df_partidas, df_estado):
+    """Calcula os ratings no Spark, uma liga por grupo (em paralelo): retorna as partidas com COLUNAS_ELO.
+
+    df_estado pode ser vazio (primeira carga); as ligas sem partidas novas não são processadas.
+    """
+    esquema = ", ".join(f"`{coluna}` {tipo}" for coluna, tipo in df_partidas.dtypes)
+    esquema += ", " + ", ".join(f"`{coluna}` {tipo}" for coluna, tipo in COLUNAS_ELO.items())
+    colunas = df_partidas.columns
+
+    def por_liga(partidas, estado):
+        if partidas.empty:
+            return pd.DataFrame(columns=colunas + list(COLUNAS_ELO))
+        return calcular(partidas, estado)
+
+    return (df_partidas.groupBy("League")
+            .cogroup(df_estado.select(*COLUNAS_ESTADO).groupBy("League"))
+            .applyInPandas(por_liga, esquema))
+
+
+def estado_spark(df_elo):
+    """Estado (COLUNAS_ESTADO) a partir das partidas já calculadas: último rating de cada equipe."""
+    from pyspark.sql import Window
+    from pyspark.sql.functions import col, count, expr, lit, row_number
+
+    lados = df_elo.select("League", "Temporada", "DateMatch",
+                          expr("stack(2, HomeTeam, EloHPos, AwayTeam, EloAPos) AS (Equipe, Rating)"))
+    equipe = Window.partitionBy("League", "Equipe")
+    return (lados.withColumn("Partidas", count(lit(1)).over(equipe))
+            .withColumn("_ordem", row_number().over(equipe.orderBy(col("DateMatch").desc())))
+            .where(col("_ordem") == 1)
+            .select(*COLUNAS_ESTADO))
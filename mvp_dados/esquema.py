@@ -0,0 +1,143 @@
+"""Esquema tipado dos arquivos .csv do football-data (layout da temporada 2023-24).
+
+O esquema é usado na leitura dos arquivos no lugar do inferSchema, que percorre cada arquivo
+duas vezes. Ao mudar colunas ou tipos, incremente VERSAO.
+
+Os arquivos de temporadas anteriores têm outras colunas (casas de apostas que deixaram de ser
+publicadas, estatísticas que não existem mais); tipo_da_coluna e nome_na_tabela mapeiam qualquer
+coluna do cabeçalho para o esquema unificado da tabela bronze.
+"""
+
+import re
+
+VERSAO = 3
+
+# Coluna que recebe o conteúdo das linhas que não puderam ser convertidas para o esquema
+COLUNA_CORROMPIDA = "_corrupt_record"
+
+# Formato da coluna Time (horário do início da partida), lida como texto e convertida em
+# mvp_dados/datas.py junto com a data
+FORMATO_HORA = "HH:mm"
+
+_RESULTADO = [
+    ("Div", "STRING"),
+    ("Date", "STRING"),
+    ("Time", "STRING"),
+    ("HomeTeam", "STRING"),
+    ("AwayTeam", "STRING"),
+    ("FTHG", "INT"),
+    ("FTAG", "INT"),
+    ("FTR", "STRING"),
+    ("HTHG", "INT"),
+    ("HTAG", "INT"),
+    ("HTR", "STRING"),
+]
+
+_ESTATISTICAS = [(coluna, "INT") for coluna in [
+    "HS", "AS", "HST", "AST", "HF", "AF", "HC", "AC", "HY", "AY", "HR", "AR",
+]]
+
+_CASAS_1X2 = ["B365", "BW", "IW", "PS", "WH", "VC"]
+
+
+def _odds(fechamento):
+    """Colunas de cotações de abertura (fechamento=False) ou de fechamento (fechamento=True)."""
+    c = "C" if fechamento else ""
+    colunas = [f"{casa}{c}{resultado}" for casa in _CASAS_1X2 for resultado in "HDA"]
+    colunas += [f"Max{c}H", f"Max{c}D", f"Max{c}A", f"Avg{c}H", f"Avg{c}D", f"Avg{c}A"]
+    colunas += [f"B365{c}>2.5", f"B365{c}<2.5", f"P{c}>2.5", f"P{c}<2.5",
+                f"Max{c}>2.5", f"Max{c}<2.5", f"Avg{c}>2.5", f"Avg{c}<2.5"]
+    colunas += [f"AH{c}h", f"B365{c}AHH", f"B365{c}AHA", f"P{c}AHH", f"P{c}AHA",
+                f"Max{c}AHH", f"Max{c}AHA", f"Avg{c}AHH", f"Avg{c}AHA"]
+    return [(coluna, "DOUBLE") for coluna in colunas]
+
+
+# Colunas do arquivo, na ordem do cabeçalho
+COLUNAS = _RESULTADO + _ESTATISTICAS + _odds(fechamento=False) + _odds(fechamento=True)
+
+# Colunas de temporadas anteriores, que não são cotações: coluna -> tipo
+COLUNAS_HISTORICAS = {
+    "HG": "INT", "AG": "INT",
+    "Attendance": "INT",
+    "HFKC": "INT", "AFKC": "INT",
+    "HHW": "INT", "AHW": "INT",
+    "HO": "INT", "AO": "INT",
+    "HBP": "INT", "ABP": "INT",
+    "Bb1X2": "INT", "BbOU": "INT", "BbAH": "INT",
+}
+
+# Colunas de cotações de qualquer casa (inclusive as que deixaram de ser publicadas), do mercado
+# (Max, Avg) ou do Betbrain (BbMx, BbAv), de abertura ou de fechamento (C)
+_COTACAO = re.compile(r"^(B365|BS|BW|GB|IW|LB|PS|P|SO|SB|SJ|SY|VC|WH|Max|Avg|BbMx|BbAv|Bb)C?"
+                      r"(H|D|A|>2\.5|<2\.5|AHH|AHA|AHh|AH)$")
+
+# Colunas que aparecem apenas em alguns arquivos: coluna -> (coluna após a qual aparece, tipo)
+COLUNAS_OPCIONAIS = {
+    "Referee": ("HTR", "STRING"),
+}
+
+# Colunas renomeadas na tabela bronze: nomes que são palavras reservadas do SQL ou que têm
+# espaços ou caracteres inválidos
+NOMES_TABELA = {
+    "Div": "League",
+    "Date": "DateMatch",
+    "Time": "TimeMatch",
+    "AS": "ASS",
+    "FTHG and HG": "FTHGandHG",
+    "FTAG and AG": "FTAGandAG",
+    "FTR and Res": "FTRandRes",
+    "B365>2.5": "B365O25",
+    "B365<2.5": "B365U25",
+    "P>2.5": "PO25",
+    "P<2.5": "PU25",
+    "Max>2.5": "MaxO25",
+    "Max<2.5": "MaxU25",
+    "Avg>2.5": "AvgO25",
+    "Avg<2.5": "AvgU25",
+    "B365C>2.5": "B365CO25",
+    "B365C<2.5": "B365CU25",
+    "PC>2.5": "PCO25",
+    "PC<2.5": "PCU25",
+    "MaxC>2.5": "MaxCO25",
+    "MaxC<2.5": "MaxCU25",
+    "AvgC>2.5": "AvgCO25",
+    "AvgC<2.5": "AvgCU25",
+}
+
+
+def tipo_da_coluna(nome):
+    """Tipo de uma coluna de qualquer temporada: o do esquema, DOUBLE para cotações ou STRING."""
+    tipos = dict(COLUNAS)
+    tipos.update({coluna: tipo for coluna, (_, tipo) in COLUNAS_OPCIONAIS.items()})
+    tipos.update(COLUNAS_HISTORICAS)
+    if nome in tipos:
+        return tipos[nome]
+    if _COTACAO.match(nome):
+        return "DOUBLE"
+    return "STRING"
+
+
+def nome_na_tabela(nome):
+    """Nome da coluna na tabela bronze: NOMES_TABELA ou, para colunas de outras temporadas, o nome
+    sem os caracteres inválidos (">2.5" vira "O25" e "<2.5" vira "U25")."""
+    if nome in NOMES_TABELA:
+        return NOMES_TABELA[nome]
+    return re.sub(r"[^0-9A-Za-z_]", "", nome.replace(">2.5", "O25").replace("<2.5", "U25"))
+
+
+def colunas(extras=(), ausentes=()):
+    """Colunas do layout, incluindo as colunas opcionais informadas em extras e sem as colunas ausentes."""
+    resultado = [(nome, tipo) for nome, tipo in COLUNAS if nome not in ausentes]
+    for extra in extras:
+        anterior, tipo = COLUNAS_OPCIONAIS[extra]
+        posicao = [nome for nome, _ in resultado].index(anterior) + 1
+        resultado.insert(posicao, (extra, tipo))
+    return resultado
+
+
+def esquema_ddl(extras=(), ausentes=(), coluna_corrompida=COLUNA_CORROMPIDA):
+    """Esquema no formato DDL aceito por spark.read.schema(), na ordem das colunas do arquivo."""
+    campos = [f"`{nome}` {tipo}" for nome, tipo in colunas(extras, ausentes)]
+    if coluna_corrompida:
+        campos.append(f"`{coluna_corrompida}` STRING")
+    return ", ".join(campos)
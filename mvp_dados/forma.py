@@ -0,0 +1,66 @@
+"""Forma recente das equipes (feature store): médias das últimas partidas de cada equipe.
+
+Cada partida da camada silver vira duas linhas, uma na perspectiva do mandante e outra na do
+visitante (Equipe, Adversario, Mando), com os números da equipe na partida: gols marcados e sofridos,
+chutes no alvo, escanteios, pontos e força implícita nas cotações (probabilidade normalizada de vitória
+da equipe, PercentH ou PercentA). As colunas Media* são as médias das JANELA partidas anteriores da
+equipe (sem a própria partida, que ainda não aconteceu quando as cotações são publicadas), calculadas
+com funções de janela particionadas por equipe.
+
+Como a janela de uma equipe só depende das partidas dela, uma carga incremental recalcula apenas as
+equipes com partidas novas ou alteradas, e apenas as linhas a partir da primeira partida alterada.
+"""
+
+from pyspark.sql import Window
+from pyspark.sql.functions import avg, col, count, expr, lit
+
+# Quantidade de partidas anteriores consideradas nas médias
+JANELA = 5
+
+# Números da equipe em cada partida, com as médias calculadas na janela
+METRICAS = ("GolsPro", "GolsContra", "ChutesNoAlvo", "ChutesNoAlvoContra", "Escanteios", "EscanteiosContra",
+            "Pontos", "ForcaImplicita")
+
+# Chave de uma linha da tabela: uma equipe joga no máximo uma partida por dia
+CHAVE_FORMA = ["Equipe", "DateMatch"]
+
+_PERSPECTIVAS = (
+    # (mando, colunas da equipe, colunas do adversário)
+    ("H", ("HomeTeam", "FTHG", "HST", "HC", "PercentH"), ("AwayTeam", "FTAG", "AST", "AC")),
+    ("A", ("AwayTeam", "FTAG", "AST", "AC", "PercentA"), ("HomeTeam", "FTHG", "HST", "HC")),
+)
+
+
+def stack_perspectivas():
+    """Expressão SQL stack() com uma linha por partida e mando (mandante e visitante)."""
+    valores = []
+    for mando, (equipe, gols, chutes, escanteios, forca), (adversario, gols_contra, chutes_contra,
+                                                          escanteios_contra) in _PERSPECTIVAS:
+        valores.append(f"'{mando}', {equipe}, {adversario}, {gols}, {gols_contra}, {chutes}, {chutes_contra}, "
+                       f"{escanteios}, {escanteios_contra}, {forca}")
+    return (f"stack({len(valores)}, {', '.join(valores)}) AS (Mando, Equipe, Adversario, GolsPro, GolsContra, "
+            f"ChutesNoAlvo, ChutesNoAlvoContra, Escanteios, EscanteiosContra, ForcaImplicita)")
+
+
+def partidas_por_equipe(df, equipes=None):
+    """Uma linha por partida e equipe (mandante e visitante), opcionalmente apenas das equipes informadas.
+
+    O filtro pelos times é aplicado antes do stack, para aproveitar o Z-order da tabela silver.
+    """
+    if equipes is not None:
+        df = df.where(col("HomeTeam").isin(equipes) | col("AwayTeam").isin(equipes))
+    df = (df.select("Temporada", "League", "DateMatch", "HomeTeam", "AwayTeam", "FTR", expr(stack_perspectivas()))
+          .withColumn("Pontos", expr("CASE WHEN FTR = Mando THEN 3 WHEN FTR = 'D' THEN 1 ELSE 0 END"))
+          .drop("FTR"))
+    if equipes is not None:
+        df = df.where(col("Equipe").isin(equipes))
+    return df
+
+
+def forma_equipes(df_partidas, janela=JANELA):
+    """Acrescenta às linhas de partidas_por_equipe as médias das `janela` partidas anteriores da equipe."""
+    anteriores = Window.partitionBy("Equipe").orderBy("DateMatch").rowsBetween(-janela, -1)
+    df = df_partidas.withColumn("PartidasNaJanela", count(lit(1)).over(anteriores)).withColumn("Janela", lit(janela))
+    for metrica in METRICAS:
+        df = df.withColumn(f"Media{metrica}", avg(metrica).over(anteriores))
+    return df
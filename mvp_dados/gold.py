@@ -0,0 +1,71 @@
+"""Agregações da camada gold (acertos por temporada, liga e mês), compartilhadas pelo notebook
+"MVP Dados" e pela carga contínua do notebook "Streaming".
+
+Cada tabela gold é recalculada por partição (temporada, liga e mês): na carga incremental, apenas as
+partições com partidas novas ou alteradas são agregadas de novo e gravadas com um MERGE pela chave. Os
+grupos dessas partições que deixaram de existir (por exemplo, uma casa sem cotações depois de uma
+correção do arquivo) são removidos pelo mesmo MERGE; as demais partições não são lidas nem alteradas.
+"""
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import broadcast, count, expr, sum as soma
+
+from mvp_dados.casas import casas_presentes, stack_odds
+
+CHAVES_GOLD = ["Temporada", "League", "Mes"]
+
+
+def agregar_acertos(df):
+    """Partidas, acertos absolutos e soma dos percentuais do resultado ocorrido."""
+    return (df.groupBy(*CHAVES_GOLD)
+            .agg(count("*").alias("Partidas"),
+                 soma(expr("CASE WHEN FTR = VencedorAposta THEN 1 ELSE 0 END")).alias("AcertosAbsolutos"),
+                 soma("Percentual").alias("SomaPercentual"),
+                 count("Percentual").alias("PartidasComPercentual")))
+
+
+def agregar_acertos_casas(df):
+    """Partidas e acertos do favorito (menor cotação) de cada casa de apostas."""
+    return (df.select(*CHAVES_GOLD, "FTR", expr(stack_odds(casas_presentes(df.columns))))
+            .where("OddH IS NOT NULL AND OddD IS NOT NULL AND OddA IS NOT NULL")
+            .withColumn("Favorito", expr("""CASE
+                                              WHEN OddH < OddD AND OddH < OddA THEN 'H'
+                                              WHEN OddD < OddH AND OddD < OddA THEN 'D'
+                                              ELSE 'A'
+                                          END"""))
+            .groupBy(*CHAVES_GOLD, "CasaAposta")
+            .agg(count("*").alias("Partidas"),
+                 soma(expr("CASE WHEN FTR = Favorito THEN 1 ELSE 0 END")).alias("Acertos")))
+
+
+# Tabelas gold: (função de agregação, chave)
+TABELAS_GOLD = {
+    "gold.acertos_liga_mes": (agregar_acertos, CHAVES_GOLD),
+    "gold.acertos_casa_mes": (agregar_acertos_casas, CHAVES_GOLD + ["CasaAposta"]),
+}
+
+
+def filtro_particoes(particoes, prefixo=""):
+    """Condição SQL que seleciona as partições (Temporada, League, Mes) informadas; FALSE se não houver nenhuma."""
+    if not particoes:
+        return "FALSE"
+    valores = ", ".join("({}, '{}', {})".format(temporada, liga.replace("'", "\\'"), mes)
+                        for temporada, liga, mes in particoes)
+    colunas = ", ".join(f"{prefixo}`{c}`" for c in CHAVES_GOLD)
+    return f"({colunas}) IN ({valores})"
+
+
+def mesclar_gold(spark, tabela, df_silver, particoes):
+    """Reagrega as partições informadas (Temporada, League, Mes) da silver e as grava na tabela gold (MERGE).
+
+    df_silver deve ter a coluna Mes. Grupos das partições que não existem mais na agregação são removidos.
+    """
+    agregar, chave = TABELAS_GOLD[tabela]
+    df_particoes = spark.createDataFrame(list(particoes), "Temporada INT, League STRING, Mes INT")
+    df_agregado = agregar(df_silver.join(broadcast(df_particoes), CHAVES_GOLD))
+    (DeltaTable.forName(spark, tabela).alias("t")
+        .merge(df_agregado.alias("s"), " AND ".join(f"t.`{c}` <=> s.`{c}`" for c in chave))
+        .whenMatchedUpdateAll()
+        .whenNotMatchedInsertAll()
+        .whenNotMatchedBySourceDelete(condition=filtro_particoes(particoes, "t."))
+        .execute())
@@ -0,0 +1,92 @@
+"""Layout físico das tabelas Delta do pipeline: particionamento, Z-order e compactação.
+
+As consultas de análise filtram ou agrupam por liga e por período e buscam partidas pelos times,
+por isso as tabelas são particionadas por temporada e liga e ordenadas (Z-order) pela data da
+partida e pelos times, o que permite ao Delta pular arquivos com base nas estatísticas de cada um.
+"""
+
+# Média de arquivos por partição a partir da qual a tabela é compactada no notebook "MVP Dados"; o
+# notebook "Compactacao" compacta todas as tabelas, independentemente da quantidade de arquivos
+ARQUIVOS_POR_PARTICAO = 4
+
+LAYOUT_TABELAS = {
+    "bronze.europa": {
+        "particoes": ("Temporada", "League"),
+        "zorder": ("DateMatch", "HomeTeam", "AwayTeam"),
+    },
+    "silver.europa": {
+        "particoes": ("Temporada", "League"),
+        "zorder": ("DateMatch", "HomeTeam", "AwayTeam"),
+    },
+    "silver.movimento_odds": {
+        "particoes": ("League",),
+        "zorder": ("DateMatch", "CasaAposta"),
+    },
+    "silver.liquidacao_mercados": {
+        "particoes": ("League",),
+        "zorder": ("DateMatch", "CasaAposta"),
+    },
+    "silver.forma_equipes": {
+        "particoes": ("Temporada",),
+        "zorder": ("Equipe", "DateMatch"),
+    },
+    "silver.elo_partidas": {
+        "particoes": ("League",),
+        "zorder": ("DateMatch", "HomeTeam", "AwayTeam"),
+    },
+}
+
+
+def particoes(tabela):
+    """Colunas de particionamento configuradas para a tabela."""
+    return list(LAYOUT_TABELAS.get(tabela, {}).get("particoes", ()))
+
+
+def layout_atualizado(spark, tabela):
+    """Indica se o particionamento atual da tabela é o configurado em LAYOUT_TABELAS."""
+    atuais = spark.sql(f"DESCRIBE DETAIL {tabela}").first()["partitionColumns"]
+    return list(atuais) == particoes(tabela)
+
+
+def compactar(spark, tabela):
+    """Compacta os arquivos pequenos da tabela e os reordena pelas colunas de Z-order configuradas."""
+    zorder = LAYOUT_TABELAS.get(tabela, {}).get("zorder", ())
+    comando = f"OPTIMIZE {tabela}"
+    if zorder:
+        comando += f" ZORDER BY ({', '.join(zorder)})"
+    return spark.sql(comando).first()["metrics"]
+
+
+def precisa_compactar(spark, tabela, arquivos_por_particao=ARQUIVOS_POR_PARTICAO):
+    """Indica se a tabela acumulou arquivos pequenos: mais de arquivos_por_particao arquivos por partição, em média."""
+    arquivos, _ = arquivos_da_tabela(spark, tabela)
+    quantidade_particoes = spark.sql(f"SHOW PARTITIONS {tabela}").count() if particoes(tabela) else 1
+    return arquivos > arquivos_por_particao * max(quantidade_particoes, 1)
+
+
+def arquivos_da_tabela(spark, tabela):
+    """Quantidade de arquivos e tamanho em bytes da versão atual da tabela."""
+    detalhe = spark.sql(f"DESCRIBE DETAIL {tabela}").first()
+    return detalhe["numFiles"], detalhe["sizeInBytes"]
+
+
+def leitura_da_consulta(df):
+    """Executa a consulta e retorna (arquivos lidos, bytes lidos), somando as métricas das leituras do plano.
+
+    Os valores já consideram as partições e os arquivos descartados pelo Delta; são None quando o
+    plano executado não expõe essas métricas.
+    """
+    df.collect()
+    plano = df._jdf.queryExecution().executedPlan()
+    if plano.nodeName() == "AdaptiveSparkPlan":
+        plano = plano.executedPlan()
+
+    arquivos = bytes_lidos = None
+    folhas = plano.collectLeaves()
+    for i in range(folhas.size()):
+        metricas = folhas.apply(i).metrics()
+        if metricas.get("numFiles").isDefined():
+            arquivos = (arquivos or 0) + metricas.get("numFiles").get().value()
+        if metricas.get("filesSize").isDefined():
+            bytes_lidos = (bytes_lidos or 0) + metricas.get("filesSize").get().value()
+    return arquivos, bytes_lidos
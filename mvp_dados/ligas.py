@@ -0,0 +1,51 @@
+"""Registro das ligas carregadas pelo pipeline.
+
+Para incluir uma liga (ou outra divisão), basta acrescentar uma entrada em LIGAS: os arquivos cujo
+nome corresponder a um dos padrões serão carregados na próxima execução, sem mudanças no notebook.
+"""
+
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+
+
+@dataclass(frozen=True)
+class Liga:
+    codigo: str                   # código da coluna Div no football-data
+    nome: str                     # nome exibido nas consultas (coluna League)
+    arquivos: tuple               # padrões (glob) dos nomes dos arquivos da liga
+    colunas_extras: tuple = ()    # colunas que só os arquivos desta liga possuem (descartadas na carga)
+    colunas_ausentes: tuple = ()  # colunas do esquema padrão que os arquivos desta liga não possuem
+    fuso_horario: str = "Europe/London"  # fuso horário local da liga (início das partidas)
+
+
+LIGAS = [
+    Liga("E0", "Inglaterra", ("PL[0-9][0-9].csv", "E0*.csv"), colunas_extras=("Referee",)),
+    Liga("I1", "Itália", ("SerieA[0-9][0-9].csv", "I1*.csv"), fuso_horario="Europe/Rome"),
+    Liga("SP1", "Espanha", ("LaLiga[0-9][0-9].csv", "SP1*.csv"), fuso_horario="Europe/Madrid"),
+    Liga("D1", "Alemanha", ("Bundesliga[0-9][0-9].csv", "D1*.csv"), fuso_horario="Europe/Berlin"),
+    Liga("F1", "França", ("Ligue1*.csv", "F1*.csv"), fuso_horario="Europe/Paris"),
+    Liga("E1", "Inglaterra (2ª divisão)", ("E1*.csv",), colunas_extras=("Referee",)),
+    Liga("I2", "Itália (2ª divisão)", ("I2*.csv",), fuso_horario="Europe/Rome"),
+    Liga("SP2", "Espanha (2ª divisão)", ("SP2*.csv",), fuso_horario="Europe/Madrid"),
+    Liga("D2", "Alemanha (2ª divisão)", ("D2*.csv",), fuso_horario="Europe/Berlin"),
+    Liga("F2", "França (2ª divisão)", ("F2*.csv",), fuso_horario="Europe/Paris"),
+]
+
+
+def liga_do_arquivo(caminho):
+    """Liga cujo padrão de nome de arquivo corresponde ao caminho informado, ou None."""
+    nome = caminho.rstrip("/").rsplit("/", 1)[-1]
+    for liga in LIGAS:
+        if any(fnmatchcase(nome, padrao) for padrao in liga.arquivos):
+            return liga
+    return None
+
+
+def agrupar_por_layout(caminhos):
+    """Agrupa os arquivos de ligas registradas por layout: (colunas_extras, colunas_ausentes) -> caminhos."""
+    grupos = {}
+    for caminho in caminhos:
+        liga = liga_do_arquivo(caminho)
+        if liga is not None:
+            grupos.setdefault((liga.colunas_extras, liga.colunas_ausentes), []).append(caminho)
+    return grupos
@@ -0,0 +1,104 @@
+"""Liquidação das apostas de handicap asiático e de mais/menos de 2,5 gols a partir do placar final.
+
+Cada linha da tabela gerada é uma partida, uma casa (ou o máximo/média do mercado), um mercado
+("AH" ou "OU25") e um momento (cotações de abertura ou de fechamento), com os dois lados da aposta:
+o mandante e o visitante no handicap asiático, mais e menos gols no total de gols.
+
+O resultado de cada lado é um fator: 1 (vitória), 0,5 (meia vitória), 0 (devolução), -0,5 (meia
+derrota) ou -1 (derrota). Nas linhas de quarto (como -0,75 ou +1,25), a aposta é dividida em duas
+metades, nas linhas vizinhas (-0,5 e -1; +1 e +1,5), e o fator é a média dos resultados das metades.
+O lucro por unidade apostada é fator x (cotação - 1) quando o fator é positivo e o próprio fator
+quando é negativo.
+
+Tudo é calculado com expressões SQL sobre as colunas (stack e CASE), em uma única projeção da
+tabela silver, sem UDFs.
+"""
+
+# Casas com cotações de handicap asiático e de mais/menos gols: (prefixo das colunas, nome). O prefixo
+# da Pinnacle nestes mercados é "P" (e não "PS", como no 1X2).
+CASAS_MERCADOS = [
+    ("B365", "Bet365"),
+    ("P", "Pinnacle"),
+    ("Max", "Máximo do mercado"),
+    ("Avg", "Média do mercado"),
+]
+
+# Momento das cotações: (nome, sufixo do prefixo da casa, coluna da linha do handicap asiático)
+MOMENTOS = [
+    ("abertura", "", "AHh"),
+    ("fechamento", "C", "AHCh"),
+]
+
+# Nomes dos fatores de resultado
+RESULTADOS_LIQUIDACAO = {1.0: "vitória", 0.5: "meia vitória", 0.0: "devolução", -0.5: "meia derrota", -1.0: "derrota"}
+
+
+def mercados_presentes(colunas):
+    """(casa, momento, mercado, linha, cotação do lado 1, cotação do lado 2) com colunas presentes em colunas."""
+    colunas = set(colunas)
+    mercados = []
+    for momento, c, coluna_linha in MOMENTOS:
+        for prefixo, nome in CASAS_MERCADOS:
+            ah = (f"{prefixo}{c}AHH", f"{prefixo}{c}AHA")
+            if coluna_linha in colunas and all(coluna in colunas for coluna in ah):
+                mercados.append((nome, momento, "AH", coluna_linha) + ah)
+            ou = (f"{prefixo}{c}O25", f"{prefixo}{c}U25")
+            if all(coluna in colunas for coluna in ou):
+                mercados.append((nome, momento, "OU25", "2.5") + ou)
+    return mercados
+
+
+def stack_mercados(mercados):
+    """Expressão SQL stack() com uma linha por casa, momento e mercado de mercados_presentes."""
+    valores = [f"'{nome}', '{momento}', '{mercado}', CAST({linha} AS DOUBLE), `{odd1}`, `{odd2}`"
+               for nome, momento, mercado, linha, odd1, odd2 in mercados]
+    return (f"stack({len(valores)}, {', '.join(valores)}) "
+            f"AS (CasaAposta, Momento, Mercado, Linha, Odd1, Odd2)")
+
+
+# Vantagem do lado 1 (mandante ou mais gols) sobre a linha: positiva quando o lado 1 vence a aposta
+MARGEM = "CASE Mercado WHEN 'AH' THEN FTHG - FTAG + Linha ELSE FTHG + FTAG - Linha END"
+
+# Distância de cada metade até a linha: 0,25 nas linhas de quarto e 0 nas linhas inteiras ou de meio gol
+QUARTO = "CASE WHEN (Linha * 4) % 2 <> 0 THEN 0.25 ELSE 0 END"
+
+# Fator de resultado do lado 1: média dos resultados (1, 0 ou -1) das duas metades
+FATOR = f"(SIGNUM(({MARGEM}) - ({QUARTO})) + SIGNUM(({MARGEM}) + ({QUARTO}))) / 2"
+
+
+def lucro_sql(fator, odd):
+    """Expressão SQL do lucro por unidade apostada, dado o fator de resultado e a cotação."""
+    return f"CASE WHEN {fator} > 0 THEN {fator} * ({odd} - 1) ELSE {fator} END"
+
+
+def nome_resultado_sql(fator):
+    """Expressão SQL com o nome do resultado (RESULTADOS_LIQUIDACAO) do fator."""
+    casos = " ".join(f"WHEN {valor} THEN '{nome}'" for valor, nome in RESULTADOS_LIQUIDACAO.items())
+    return f"CASE {fator} {casos} END"
+
+
+def liquidar(df_silver):
+    """Liquida os mercados de handicap asiático e de mais/menos 2,5 gols de todas as partidas.
+
+    Colunas: chave da partida, placar, CasaAposta, Momento, Mercado, Linha, Odd1/Odd2, Fator1/Fator2,
+    Resultado1/Resultado2, Lucro1/Lucro2, Prob1/Prob2 (probabilidades sem a margem, em %), Margem
+    (em %), Favorito (lado de menor cotação) e AcertoFavorito (o favorito venceu ou meio-venceu).
+    """
+    from pyspark.sql.functions import expr
+
+    df = (df_silver
+          .select("Temporada", "League", "DateMatch", "HomeTeam", "AwayTeam", "FTHG", "FTAG",
+                  expr(stack_mercados(mercados_presentes(df_silver.columns))))
+          .where("Linha IS NOT NULL AND Odd1 IS NOT NULL AND Odd2 IS NOT NULL "
+                 "AND FTHG IS NOT NULL AND FTAG IS NOT NULL"))
+    return (df.withColumn("Fator1", expr(FATOR))
+            .withColumn("Fator2", expr("-Fator1"))
+            .withColumn("Resultado1", expr(nome_resultado_sql("Fator1")))
+            .withColumn("Resultado2", expr(nome_resultado_sql("Fator2")))
+            .withColumn("Lucro1", expr(lucro_sql("Fator1", "Odd1")))
+            .withColumn("Lucro2", expr(lucro_sql("Fator2", "Odd2")))
+            .withColumn("Margem", expr("(1 / Odd1 + 1 / Odd2 - 1) * 100"))
+            .withColumn("Prob1", expr("(1 / Odd1) * 100 / (1 / Odd1 + 1 / Odd2)"))
+            .withColumn("Prob2", expr("100 - Prob1"))
+            .withColumn("Favorito", expr("CASE WHEN Odd1 < Odd2 THEN 1 WHEN Odd2 < Odd1 THEN 2 END"))
+            .withColumn("AcertoFavorito", expr("CASE Favorito WHEN 1 THEN Fator1 > 0 WHEN 2 THEN Fator2 > 0 END")))
@@ -0,0 +1,242 @@
+"""Execução local do pipeline (bronze -> silver -> gold -> análise) com DuckDB, sem cluster Databricks.
+
+Lê os .csv das ligas cadastradas direto do archive.zip, aplica o mesmo esquema, as mesmas renomeações,
+a mesma chave de partida e as mesmas colunas derivadas do notebook (estas calculadas pelo módulo
+mvp_dados.probabilidades, com resultados idênticos aos do Spark SQL) e grava as tabelas em Parquet,
+particionadas como em mvp_dados/layout.py.
+
+Uso:
+    python -m mvp_dados.local [archive.zip] [diretorio_saida]
+"""
+
+import os
+import sys
+import time
+import uuid
+import zipfile
+from datetime import datetime
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from mvp_dados.esquema import NOMES_TABELA, VERSAO, colunas
+from mvp_dados.casas import casas_presentes
+from mvp_dados.datas import FUSO_ARQUIVOS, LIMITE_DATAS_NULAS, ano_referencia, corrigir_ano, detectar_formato
+from mvp_dados.layout import particoes
+from mvp_dados.ligas import LIGAS, liga_do_arquivo
+from mvp_dados.probabilidades import derivar
+from mvp_dados.qualidade import agregacoes_sql, relatorio
+
+# Chave de uma partida (a mesma do MERGE da tabela bronze no notebook)
+CHAVE_PARTIDA = ["League", "DateMatch", "HomeTeam", "AwayTeam"]
+
+CHAVES_GOLD = ["Temporada", "League", "Mes"]
+
+
+def _converter(texto, tipo):
+    """Converte uma coluna lida como texto para o tipo do esquema (None = valor inválido para o tipo)."""
+    if tipo == "INT":
+        return pd.to_numeric(texto, errors="coerce").astype("Int64")
+    if tipo == "DOUBLE":
+        return pd.to_numeric(texto, errors="coerce").astype("float64")
+    return texto
+
+
+def ler_arquivo(conteudo, nome, liga):
+    """Lê um .csv de liga com o esquema tipado: retorna (linhas válidas, linhas em quarentena).
+
+    Como no modo PERMISSIVE do Spark, uma linha com algum valor que não pode ser convertido para o
+    tipo da coluna não vira nulos silenciosamente: ela vai para a quarentena. As datas e os horários
+    são normalizados como em mvp_dados/datas.py: linhas sem data vão para a quarentena e, acima de
+    LIMITE_DATAS_NULAS, o arquivo inteiro.
+    """
+    texto = pd.read_csv(conteudo, dtype=str)
+    esquema = colunas(ausentes=liga.colunas_ausentes)
+    df = pd.DataFrame({coluna: _converter(texto[coluna], tipo) if coluna in texto else None
+                       for coluna, tipo in esquema})
+
+    invalida = np.zeros(len(df), dtype=bool)
+    for coluna, _ in esquema:
+        if coluna in texto:
+            invalida |= (texto[coluna].notna() & df[coluna].isna()).to_numpy()
+
+    # Data com o formato detectado nas primeiras linhas do arquivo e início da partida (horário do
+    # Reino Unido) em UTC e no fuso da liga
+    valores = texto["Date"].head(20).fillna("").tolist()
+    formato = detectar_formato(valores)
+    datas = pd.to_datetime(texto["Date"].str.strip(), format=formato[1] if formato else "%d/%m/%Y", errors="coerce")
+    referencia = ano_referencia(valores, formato)
+    if referencia is not None:
+        datas = pd.to_datetime(pd.DataFrame({"year": corrigir_ano(datas.dt.year, referencia),
+                                             "month": datas.dt.month, "day": datas.dt.day}), errors="coerce")
+    if formato is None or datas.isna().mean() > LIMITE_DATAS_NULAS:
+        datas[:] = pd.NaT
+    hora = texto["Time"].str.strip() if "Time" in texto else ""
+    inicio = (pd.to_datetime(datas.dt.strftime("%Y-%m-%d") + " " + hora, format="%Y-%m-%d %H:%M", errors="coerce")
+              .dt.tz_localize(FUSO_ARQUIVOS, ambiguous="NaT", nonexistent="NaT"))
+    df["Date"] = datas
+    df["Time"] = inicio.dt.tz_convert("UTC").dt.tz_localize(None)
+    df["InicioLocal"] = inicio.dt.tz_convert(liga.fuso_horario).dt.tz_localize(None)
+    invalida |= datas.isna().to_numpy()
+
+    quarentena = pd.DataFrame({
+        "Arquivo": nome,
+        "Registro": texto[invalida].to_csv(header=False, index=False).splitlines(),
+        "VersaoEsquema": VERSAO,
+    })
+    return df[~invalida], quarentena
+
+
+def ler_zip(caminho_zip):
+    """Lê os arquivos das ligas cadastradas no archive.zip: retorna (partidas, quarentena)."""
+    partidas, quarentena = [], []
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        for nome in sorted(arquivo_zip.namelist()):
+            liga = liga_do_arquivo(nome)
+            if liga is None:
+                continue
+            with arquivo_zip.open(nome) as conteudo:
+                validas, invalidas = ler_arquivo(conteudo, nome, liga)
+            partidas.append(validas)
+            quarentena.append(invalidas)
+    return pd.concat(partidas, ignore_index=True), pd.concat(quarentena, ignore_index=True)
+
+
+def criar_bronze(con, partidas):
+    """Tabela bronze: temporada, nome da liga, colunas renomeadas e uma linha por partida."""
+    con.register("partidas_lidas", partidas)
+    con.register("nomes_ligas", pd.DataFrame([(liga.codigo, liga.nome) for liga in LIGAS],
+                                             columns=["Div", "NomeLiga"]))
+    renomeadas = ", ".join(f'p."{coluna}" AS "{NOMES_TABELA.get(coluna, coluna)}"'
+                           for coluna in partidas.columns if coluna not in ("Div", "Date"))
+    con.execute(f"""
+        CREATE OR REPLACE TABLE bronze_europa AS
+        WITH convertidas AS (
+            SELECT COALESCE(l.NomeLiga, p.Div) AS League,
+                   p.Date::DATE AS DateMatch,
+                   {renomeadas}
+            FROM partidas_lidas p
+            LEFT JOIN nomes_ligas l ON l.Div = p.Div
+        )
+        SELECT *,
+               CASE WHEN MONTH(DateMatch) >= 7 THEN YEAR(DateMatch) ELSE YEAR(DateMatch) - 1 END AS Temporada
+        FROM convertidas
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY {", ".join(CHAVE_PARTIDA)}) = 1
+    """)
+
+
+def criar_silver(con):
+    """Tabela silver: bronze com as colunas derivadas (máximos, médias, favorito e probabilidades)."""
+    bronze = con.table("bronze_europa").df()
+    silver = pd.concat([bronze, derivar(bronze)], axis=1)
+    con.register("silver_derivada", silver)
+    # O pandas converte DATE em datetime; a coluna volta ao tipo da bronze
+    con.execute("CREATE OR REPLACE TABLE silver_europa AS "
+                "SELECT * REPLACE (DateMatch::DATE AS DateMatch) FROM silver_derivada")
+
+
+def verificar_qualidade(con):
+    """Relatório de qualidade da tabela silver (mvp_dados/qualidade.py), com uma única agregação."""
+    linha = con.execute(f"SELECT {', '.join(agregacoes_sql())} FROM silver_europa").fetchone()
+    metricas = dict(zip([coluna[0] for coluna in con.description], linha))
+    linhas = relatorio(metricas, str(uuid.uuid4()), datetime.now(), "silver.europa")
+    con.register("relatorio_qualidade", pd.DataFrame(linhas, columns=[
+        "IdExecucao", "DataExecucao", "Tabela", "Expectativa", "Descricao", "Linhas", "Violacoes",
+        "Proporcao", "Tolerancia", "Aprovada"]))
+    con.execute("CREATE OR REPLACE TABLE silver_relatorio_qualidade AS SELECT * FROM relatorio_qualidade")
+    return con.table("silver_relatorio_qualidade").df()
+
+
+def criar_gold(con):
+    """Tabelas gold de acertos por temporada, liga e mês (geral e por casa de apostas)."""
+    chaves = ", ".join(CHAVES_GOLD)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE gold_acertos_liga_mes AS
+        SELECT {chaves},
+               COUNT(*) AS Partidas,
+               SUM(CASE WHEN FTR = VencedorAposta THEN 1 ELSE 0 END) AS AcertosAbsolutos,
+               SUM(Percentual) AS SomaPercentual,
+               COUNT(Percentual) AS PartidasComPercentual
+        FROM (SELECT *, MONTH(DateMatch) AS Mes FROM silver_europa)
+        GROUP BY ALL
+    """)
+
+    colunas_silver = [linha[0] for linha in con.execute("DESCRIBE silver_europa").fetchall()]
+    odds = ", ".join(f'({prefixo}H, {prefixo}D, {prefixo}A) AS "{nome}"'
+                     for prefixo, nome in casas_presentes(colunas_silver))
+    con.execute(f"""
+        CREATE OR REPLACE TABLE gold_acertos_casa_mes AS
+        SELECT {chaves}, CasaAposta,
+               COUNT(*) AS Partidas,
+               SUM(CASE WHEN FTR = Favorito THEN 1 ELSE 0 END) AS Acertos
+        FROM (
+            SELECT *,
+                   CASE
+                       WHEN OddH < OddD AND OddH < OddA THEN 'H'
+                       WHEN OddD < OddH AND OddD < OddA THEN 'D'
+                       ELSE 'A'
+                   END AS Favorito
+            FROM (UNPIVOT (SELECT *, MONTH(DateMatch) AS Mes FROM silver_europa)
+                  ON {odds}
+                  INTO NAME CasaAposta VALUE OddH, OddD, OddA)
+            WHERE OddH IS NOT NULL AND OddD IS NOT NULL AND OddA IS NOT NULL
+        )
+        GROUP BY ALL
+    """)
+
+
+def analisar(con):
+    """Índices de acerto das casas de apostas, geral, por liga e por mês, a partir da camada gold."""
+    indices = """ROUND(SUM(AcertosAbsolutos) * 100.0 / SUM(Partidas), 2) AS PercentualAbsoluto,
+                 ROUND(SUM(SomaPercentual) / SUM(PartidasComPercentual), 2) AS PercentualPonderado"""
+    return {
+        "geral": con.sql(f"SELECT {indices} FROM gold_acertos_liga_mes").df(),
+        "liga": con.sql(f"SELECT League, {indices} FROM gold_acertos_liga_mes GROUP BY League ORDER BY League").df(),
+        "mes": con.sql(f"SELECT Mes, {indices} FROM gold_acertos_liga_mes GROUP BY Mes ORDER BY Mes").df(),
+    }
+
+
+def gravar(con, destino):
+    """Grava as tabelas em Parquet em <destino>/<banco>/<tabela>, com o particionamento do notebook."""
+    for tabela in ("bronze.europa", "bronze.quarentena", "silver.europa", "silver.relatorio_qualidade",
+                   "gold.acertos_liga_mes", "gold.acertos_casa_mes"):
+        banco, nome = tabela.split(".")
+        os.makedirs(f"{destino}/{banco}", exist_ok=True)
+        if particoes(tabela):
+            con.execute(f"COPY {banco}_{nome} TO '{destino}/{banco}/{nome}' "
+                        f"(FORMAT PARQUET, OVERWRITE_OR_IGNORE, PARTITION_BY ({', '.join(particoes(tabela))}))")
+        else:
+            con.execute(f"COPY {banco}_{nome} TO '{destino}/{banco}/{nome}.parquet' (FORMAT PARQUET)")
+
+
+def executar(caminho_zip="archive.zip", destino="saida_local"):
+    """Executa todas as etapas: retorna (resultados da análise, tempo em segundos de cada etapa)."""
+    con = duckdb.connect()
+    tempos = {}
+
+    def etapa(nome, funcao):
+        inicio = time.perf_counter()
+        retorno = funcao()
+        tempos[nome] = round(time.perf_counter() - inicio, 3)
+        return retorno
+
+    partidas, quarentena = etapa("leitura", lambda: ler_zip(caminho_zip))
+    con.register("bronze_quarentena", quarentena)
+    etapa("bronze", lambda: criar_bronze(con, partidas))
+    etapa("silver", lambda: criar_silver(con))
+    qualidade = etapa("qualidade", lambda: verificar_qualidade(con))
+    etapa("gold", lambda: criar_gold(con))
+    resultados = etapa("análise", lambda: analisar(con))
+    resultados["qualidade"] = qualidade[["Expectativa", "Violacoes", "Proporcao", "Aprovada"]]
+    etapa("gravação", lambda: gravar(con, destino))
+    tempos["total"] = round(sum(tempos.values()), 3)
+    return resultados, tempos
+
+
+if __name__ == "__main__":
+    resultados, tempos = executar(*sys.argv[1:3])
+    for nome, df in resultados.items():
+        titulo = "Relatório de qualidade" if nome == "qualidade" else f"Índice de acerto ({nome})"
+        print(f"{titulo}:\n{df.to_string(index=False)}\n")
+    print("Tempo por etapa (s):", tempos)
@@ -0,0 +1,206 @@
+"""Métricas de execução das etapas do pipeline, gravadas na tabela Delta ops.pipeline_metrics.
+
+Para cada etapa (uma função que grava uma tabela Delta ou executa uma consulta) são registrados:
+- a duração total, medida no driver;
+- as métricas dos estágios dos jobs do Spark executados pela etapa: registros e bytes lidos e
+  gravados, shuffle (leitura e escrita) e spill (memória e disco). Os jobs da etapa são os do grupo de
+  jobs da célula (statusTracker) criados durante a etapa, e as métricas dos seus estágios vêm da API
+  REST da Spark UI do próprio driver;
+- as métricas do commit Delta da etapa (DESCRIBE HISTORY): linhas, bytes e arquivos adicionados e
+  removidos (arquivos reescritos por um MERGE, UPDATE ou overwrite), sem ler a tabela de novo.
+
+As etapas de uma execução do notebook compartilham o mesmo IdExecucao. A view ops.etapas_mais_lentas
+resume as últimas execuções: duração média, máxima e da última execução de cada etapa, com o shuffle e o
+spill médios, da etapa mais lenta para a mais rápida.
+
+Sem acesso ao SparkContext ou à Spark UI (por exemplo, com o Spark Connect), as métricas dos estágios
+(shuffle, spill, bytes lidos) ficam nulas e as demais continuam sendo registradas.
+"""
+
+import json
+import time
+import urllib.request
+from datetime import datetime
+
+TABELA_METRICAS = "ops.pipeline_metrics"
+VIEW_ETAPAS_LENTAS = "ops.etapas_mais_lentas"
+
+# Quantidade de execuções (as mais recentes) resumidas na view
+EXECUCOES_RESUMO = 10
+
+# Tempo máximo (s) de espera para que a Spark UI registre o fim dos estágios da etapa
+ESPERA_ESTAGIOS = 5
+
+COLUNAS_METRICAS = [
+    ("IdExecucao", "STRING"),
+    ("DataInicio", "TIMESTAMP"),
+    ("Etapa", "STRING"),
+    ("Tabela", "STRING"),
+    ("Operacao", "STRING"),
+    ("VersaoTabela", "LONG"),
+    ("DuracaoS", "DOUBLE"),
+    ("LinhasEntrada", "LONG"),
+    ("LinhasSaida", "LONG"),
+    ("BytesLidos", "LONG"),
+    ("BytesGravados", "LONG"),
+    ("ArquivosAdicionados", "LONG"),
+    ("ArquivosRemovidos", "LONG"),
+    ("Jobs", "INT"),
+    ("Estagios", "INT"),
+    ("ShuffleLeituraBytes", "LONG"),
+    ("ShuffleEscritaBytes", "LONG"),
+    ("SpillMemoriaBytes", "LONG"),
+    ("SpillDiscoBytes", "LONG"),
+]
+
+ESQUEMA_METRICAS = ", ".join(f"{coluna} {tipo}" for coluna, tipo in COLUNAS_METRICAS)
+
+# Métricas do commit Delta: coluna -> chaves de operationMetrics, na ordem de preferência (WRITE, MERGE,
+# UPDATE/DELETE/OPTIMIZE)
+METRICAS_DELTA = {
+    "LinhasEntrada": ("numSourceRows",),
+    "LinhasSaida": ("numOutputRows", "numUpdatedRows", "numDeletedRows"),
+    "BytesGravados": ("numOutputBytes", "numTargetBytesAdded", "numAddedBytes"),
+    "ArquivosAdicionados": ("numFiles", "numTargetFilesAdded", "numAddedFiles"),
+    "ArquivosRemovidos": ("numRemovedFiles", "numTargetFilesRemoved"),
+}
+
+# Métricas dos estágios do Spark (API REST da Spark UI): coluna -> campo de cada estágio
+METRICAS_ESTAGIOS = {
+    "LinhasEntrada": "inputRecords",
+    "LinhasSaida": "outputRecords",
+    "BytesLidos": "inputBytes",
+    "BytesGravados": "outputBytes",
+    "ShuffleLeituraBytes": "shuffleReadBytes",
+    "ShuffleEscritaBytes": "shuffleWriteBytes",
+    "SpillMemoriaBytes": "memoryBytesSpilled",
+    "SpillDiscoBytes": "diskBytesSpilled",
+}
+
+
+def _ultimo_commit(spark, tabela):
+    """Último commit (linha do DESCRIBE HISTORY) da tabela Delta, ou None se ela não existir."""
+    if tabela is None or not spark.catalog.tableExists(tabela):
+        return None
+    from delta.tables import DeltaTable
+
+    return DeltaTable.forName(spark, tabela).history(1).collect()[0]
+
+
+def _jobs_da_celula(sc):
+    """Ids dos jobs do grupo de jobs da thread atual (no Databricks, o da célula em execução)."""
+    return set(sc.statusTracker().getJobIdsForGroup(sc.getLocalProperty("spark.jobGroup.id")))
+
+
+def _estagios(sc, estagios):
+    """Dados de cada tentativa dos estágios informados, pela API REST da Spark UI."""
+    url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/stages"
+    tentativas = []
+    for estagio in sorted(estagios):
+        with urllib.request.urlopen(f"{url}/{estagio}?details=false", timeout=10) as resposta:
+            tentativas += json.load(resposta)
+    return tentativas
+
+
+def metricas_spark(sc, jobs):
+    """Soma das métricas dos estágios dos jobs informados (METRICAS_ESTAGIOS), mais Jobs e Estagios.
+
+    Os eventos de fim de estágio são processados de forma assíncrona pela Spark UI: espera até
+    ESPERA_ESTAGIOS segundos pelos estágios ainda em execução.
+    """
+    infos = [info for info in (sc.statusTracker().getJobInfo(job) for job in jobs) if info is not None]
+    estagios = {estagio for info in infos for estagio in info.stageIds}
+    limite = time.time() + ESPERA_ESTAGIOS
+    tentativas = _estagios(sc, estagios)
+    while any(t["status"] in ("ACTIVE", "PENDING") for t in tentativas) and time.time() < limite:
+        time.sleep(0.2)
+        tentativas = _estagios(sc, estagios)
+    metricas = {coluna: sum(t.get(campo, 0) for t in tentativas) for coluna, campo in METRICAS_ESTAGIOS.items()}
+    metricas.update({"Jobs": len(infos), "Estagios": len(estagios)})
+    return metricas
+
+
+def metricas_delta(commit):
+    """Métricas do commit Delta (METRICAS_DELTA), mais Operacao e VersaoTabela; nulas sem commit."""
+    if commit is None:
+        return {"Operacao": None, "VersaoTabela": None}
+    operacao = commit["operationMetrics"] or {}
+    metricas = {"Operacao": commit["operation"], "VersaoTabela": commit["version"]}
+    for coluna, chaves in METRICAS_DELTA.items():
+        valor = next((operacao[chave] for chave in chaves if chave in operacao), None)
+        metricas[coluna] = int(valor) if valor is not None else None
+    return metricas
+
+
+def medir_etapa(spark, id_execucao, etapa, tabela, funcao):
+    """Executa funcao e mede a etapa: retorna (retorno de funcao, métricas da etapa).
+
+    tabela é a tabela Delta gravada pela etapa, ou None (consultas). As linhas de entrada e saída e os
+    bytes gravados vêm do commit Delta quando ele os informa e, senão, dos estágios do Spark.
+    """
+    anterior = _ultimo_commit(spark, tabela)
+    try:
+        sc = spark.sparkContext
+    except NotImplementedError:  # Spark Connect: sem SparkContext
+        sc = None
+    if sc is not None and sc.uiWebUrl is not None:
+        jobs_anteriores = _jobs_da_celula(sc)
+
+    data_inicio = datetime.now()
+    inicio = time.time()
+    retorno = funcao()
+    duracao = time.time() - inicio
+
+    metricas = dict.fromkeys(coluna for coluna, _ in COLUNAS_METRICAS)
+    metricas.update({"IdExecucao": id_execucao, "DataInicio": data_inicio, "Etapa": etapa, "Tabela": tabela,
+                     "DuracaoS": round(duracao, 2)})
+    if sc is not None and sc.uiWebUrl is not None:
+        try:
+            metricas.update(metricas_spark(sc, _jobs_da_celula(sc) - jobs_anteriores))
+        except OSError as erro:  # Spark UI inacessível
+            print(f"Métricas dos estágios indisponíveis para a etapa {etapa}: {erro}")
+
+    # Apenas um commit novo pertence à etapa
+    commit = _ultimo_commit(spark, tabela)
+    if commit is not None and anterior is not None and commit["version"] == anterior["version"]:
+        commit = None
+    metricas.update({coluna: valor for coluna, valor in metricas_delta(commit).items() if valor is not None})
+    return retorno, metricas
+
+
+def gravar_metricas(spark, metricas, tabela=TABELA_METRICAS):
+    """Acrescenta as métricas das etapas (lista de dicionários de medir_etapa) à tabela Delta."""
+    banco = tabela.split(".")[0]
+    spark.sql(f"CREATE DATABASE IF NOT EXISTS {banco}")
+    (spark.createDataFrame(metricas, ESQUEMA_METRICAS)
+        .write.format("delta").mode("append").option("mergeSchema", "true")
+        .saveAsTable(tabela))
+
+
+def criar_view_etapas_lentas(spark, execucoes=EXECUCOES_RESUMO, tabela=TABELA_METRICAS, view=VIEW_ETAPAS_LENTAS):
+    """Cria (ou substitui) a view com as etapas mais lentas das últimas execuções."""
+    spark.sql(f"""
+        CREATE OR REPLACE VIEW {view} AS
+        WITH ultimas_execucoes AS (
+            SELECT IdExecucao, MIN(DataInicio) AS InicioExecucao
+            FROM {tabela}
+            GROUP BY IdExecucao
+            ORDER BY InicioExecucao DESC
+            LIMIT {execucoes}
+        )
+        SELECT Etapa,
+               Tabela,
+               COUNT(*) AS Execucoes,
+               ROUND(AVG(DuracaoS), 2) AS DuracaoMediaS,
+               MAX(DuracaoS) AS DuracaoMaximaS,
+               MAX_BY(DuracaoS, DataInicio) AS DuracaoUltimaS,
+               ROUND(AVG(LinhasSaida)) AS LinhasSaidaMedia,
+               ROUND(AVG(ArquivosRemovidos), 1) AS ArquivosRemovidosMedia,
+               ROUND(AVG(ShuffleLeituraBytes + ShuffleEscritaBytes) / POW(2, 20), 1) AS ShuffleMedioMB,
+               ROUND(AVG(SpillMemoriaBytes + SpillDiscoBytes) / POW(2, 20), 1) AS SpillMedioMB,
+               MAX(DataInicio) AS UltimaExecucao
+        FROM {tabela}
+        JOIN ultimas_execucoes USING (IdExecucao)
+        GROUP BY Etapa, Tabela
+        ORDER BY DuracaoMediaS DESC
+    """)
@@ -0,0 +1,183 @@
+"""Cálculo vetorizado (NumPy) das colunas derivadas da camada silver, sem depender do Spark.
+
+Reproduz as expressões da lista DERIVACOES_SILVER (mvp_dados/silver.py: MaiorValor*, Media*, VencedorAposta,
+PercentAbsol*, Percent* e Percentual) sobre arrays NumPy, com os mesmos arredondamentos e tipos
+(FLOAT = float32) do Spark SQL, de forma que os resultados sejam idênticos aos da tabela silver.
+Pode ser usado localmente, sobre os .csv do archive.zip, ou no Spark através dos wrappers de pandas UDF.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Casas de apostas usadas nas médias e máximos, na mesma ordem das expressões SQL
+CASAS_MEDIA = ("B365", "BW", "IW", "PS", "WH", "VC")
+
+RESULTADOS = ("H", "D", "A")
+
+# Colunas calculadas por derivar(), com o tipo da coluna na tabela silver
+COLUNAS_DERIVADAS = {
+    "MaiorValorH": "double", "MaiorValorD": "double", "MaiorValorA": "double",
+    "MediaH": "double", "MediaD": "double", "MediaA": "double",
+    "VencedorAposta": "string",
+    "PercentAbsolH": "float", "PercentAbsolD": "float", "PercentAbsolA": "float",
+    "PercentH": "float", "PercentD": "float", "PercentA": "float",
+    "Percentual": "float",
+}
+
+
+def arredondar(valores, casas=2):
+    """Arredondamento "meia unidade para cima" (HALF_UP), como a função ROUND do Spark SQL.
+
+    O Spark arredonda a representação decimal do número (2.0749999999999997 -> 2.07 e 2.075 -> 2.08),
+    o que equivale a arredondar para cima quando o valor é maior ou igual ao double mais próximo
+    da fronteira (k + 0.5) / 10**casas.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    fator = 10.0 ** casas
+    absolutos = np.abs(valores)
+    inteiros = np.floor(absolutos * fator)
+    fronteira = (2 * inteiros + 1) / (2 * fator)
+    inteiros = np.where(absolutos >= fronteira, inteiros + 1, inteiros)
+    return np.sign(valores) * (inteiros / fator)
+
+
+def maiores(odds):
+    """Maior cotação de cada partida (linhas) entre as casas (colunas), ignorando valores nulos (NaN).
+
+    Equivale a GREATEST(...): NaN apenas quando todas as casas estão sem cotação.
+    """
+    odds = np.asarray(odds, dtype=np.float64)
+    resultado = np.full(odds.shape[0], np.nan)
+    for coluna in odds.T:
+        resultado = np.fmax(resultado, coluna)
+    return resultado
+
+
+def medias(odds):
+    """Média das cotações de cada partida entre as casas com cotação, arredondada em 2 casas.
+
+    As cotações são somadas na ordem das colunas, como na expressão SQL, para que o resultado em
+    ponto flutuante seja o mesmo. NaN quando nenhuma casa tem cotação.
+    """
+    odds = np.asarray(odds, dtype=np.float64)
+    soma = np.zeros(odds.shape[0])
+    quantidade = np.zeros(odds.shape[0], dtype=np.int64)
+    for coluna in odds.T:
+        presente = ~np.isnan(coluna)
+        soma = soma + np.where(presente, coluna, 0.0)
+        quantidade += presente
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media = np.where(quantidade > 0, soma / quantidade, np.nan)
+    return arredondar(media, 2)
+
+
+def vencedor_aposta(media_h, media_d, media_a):
+    """Resultado favorito (menor cotação média): 'H', 'D' ou 'A'. Empates e nulos resultam em 'A'."""
+    media_h, media_d, media_a = (np.asarray(m, dtype=np.float64) for m in (media_h, media_d, media_a))
+    return np.select([(media_h < media_d) & (media_h < media_a), (media_d < media_h) & (media_d < media_a)],
+                     ["H", "D"], default="A").astype(object)
+
+
+def probabilidades(media_h, media_d, media_a):
+    """Probabilidades implícitas com a margem (PercentAbsol*) e normalizadas para somar 100% (Percent*).
+
+    Retorna dois arrays float32 de forma (3, n), na ordem H, D, A.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        absolutas = np.stack([((1.0 / np.asarray(m, dtype=np.float64)) * 100).astype(np.float32)
+                              for m in (media_h, media_d, media_a)])
+        soma = absolutas[0] + absolutas[1] + absolutas[2]
+        # FLOAT * 100 é calculado em float32; a divisão, em float64 (como no Spark)
+        normalizadas = ((absolutas * np.float32(100)).astype(np.float64) / soma.astype(np.float64)).astype(np.float32)
+    return absolutas, normalizadas
+
+
+def percentual(ftr, percent_h, percent_d, percent_a):
+    """Probabilidade (normalizada) atribuída ao resultado ocorrido (FTR); 0 quando FTR não é H, D ou A."""
+    ftr = np.asarray(ftr, dtype=object)
+    return np.select([ftr == "H", ftr == "D", ftr == "A"],
+                     [percent_h, percent_d, percent_a], default=0).astype(np.float32)
+
+
+def _odds(df, resultado, casas):
+    """Matriz (partidas x casas) com as cotações de um resultado; casas sem coluna ficam NaN."""
+    return np.column_stack([pd.to_numeric(df[f"{casa}{resultado}"], errors="coerce").to_numpy(dtype=np.float64)
+                            if f"{casa}{resultado}" in df else np.full(len(df), np.nan)
+                            for casa in casas])
+
+
+def derivar(df, casas=CASAS_MEDIA):
+    """Calcula as colunas derivadas da camada silver para um DataFrame pandas com as colunas de cotações e FTR."""
+    resultado = pd.DataFrame(index=df.index)
+    for r in RESULTADOS:
+        odds = _odds(df, r, casas)
+        resultado[f"MaiorValor{r}"] = maiores(odds)
+        resultado[f"Media{r}"] = medias(odds)
+
+    resultado["VencedorAposta"] = vencedor_aposta(resultado["MediaH"], resultado["MediaD"], resultado["MediaA"])
+
+    absolutas, normalizadas = probabilidades(resultado["MediaH"], resultado["MediaD"], resultado["MediaA"])
+    for i, r in enumerate(RESULTADOS):
+        resultado[f"PercentAbsol{r}"] = absolutas[i]
+    for i, r in enumerate(RESULTADOS):
+        resultado[f"Percent{r}"] = normalizadas[i]
+
+    resultado["Percentual"] = percentual(df["FTR"], *normalizadas)
+    return resultado
+
+
+def derivar_em_lotes(lotes, casas=CASAS_MEDIA):
+    """Aplica derivar() a cada lote (DataFrame pandas) e devolve cada lote com as colunas derivadas."""
+    for lote in lotes:
+        yield pd.concat([lote, derivar(lote, casas)], axis=1)
+
+
+def udfs_spark(casas=CASAS_MEDIA):
+    """Wrappers Spark (pandas UDF) das funções deste módulo.
+
+    Retorna um dicionário com:
+    - "media" e "maior": recebem struct(<cotações das casas, na ordem de casas>) e retornam DOUBLE;
+    - "vencedor": recebe MediaH, MediaD, MediaA e retorna STRING;
+    - "percentual": recebe FTR, MediaH, MediaD, MediaA e retorna FLOAT;
+    - "derivar": função que recebe um DataFrame Spark e acrescenta todas as colunas derivadas
+      com mapInPandas, processando os dados em lotes Arrow.
+    """
+    from pyspark.sql.functions import pandas_udf
+
+    @pandas_udf("double")
+    def media(odds: pd.DataFrame) -> pd.Series:
+        return pd.Series(medias(odds.to_numpy(dtype=np.float64, na_value=np.nan)))
+
+    @pandas_udf("double")
+    def maior(odds: pd.DataFrame) -> pd.Series:
+        return pd.Series(maiores(odds.to_numpy(dtype=np.float64, na_value=np.nan)))
+
+    @pandas_udf("string")
+    def vencedor(media_h: pd.Series, media_d: pd.Series, media_a: pd.Series) -> pd.Series:
+        return pd.Series(vencedor_aposta(media_h, media_d, media_a))
+
+    @pandas_udf("float")
+    def percentual_resultado(ftr: pd.Series, media_h: pd.Series, media_d: pd.Series,
+                             media_a: pd.Series) -> pd.Series:
+        _, normalizadas = probabilidades(media_h, media_d, media_a)
+        return pd.Series(percentual(ftr, *normalizadas))
+
+    def derivar_spark(df):
+        esquema = df.schema.simpleString()[len("struct<"):-1]
+        esquema += "," + ",".join(f"{coluna}:{tipo}" for coluna, tipo in COLUNAS_DERIVADAS.items())
+        return df.mapInPandas(lambda lotes: derivar_em_lotes(lotes, casas), f"struct<{esquema}>")
+
+    return {"media": media, "maior": maior, "vencedor": vencedor,
+            "percentual": percentual_resultado, "derivar": derivar_spark}
+
+
+def partidas_do_zip(caminho_zip):
+    """Lê com pandas os .csv das ligas cadastradas direto do archive.zip, para uso local (sem Spark)."""
+    import zipfile
+
+    from mvp_dados.ligas import liga_do_arquivo
+
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        partidas = [pd.read_csv(arquivo_zip.open(nome)) for nome in sorted(arquivo_zip.namelist())
+                    if liga_do_arquivo(nome) is not None]
+    return pd.concat(partidas, ignore_index=True)
@@ -0,0 +1,94 @@
+"""Expectativas de qualidade dos dados verificadas em todas as partidas da camada silver.
+
+Cada expectativa é uma condição SQL que identifica as partidas que a violam (cotações máximas e
+médias do mercado coerentes com as das casas, margem de cada casa dentro de limites, cotações
+preenchidas por casa e resultado coerente com o placar). As violações são contadas como métricas
+observadas (Dataset.observe) na mesma execução que grava a tabela silver, sem consultas a mais;
+a execução local (mvp_dados/local.py) usa as mesmas condições em uma única agregação.
+
+Uma expectativa é aprovada quando a proporção de partidas que a violam não passa da sua tolerância.
+"""
+
+from dataclasses import dataclass
+
+from mvp_dados.probabilidades import CASAS_MEDIA, RESULTADOS
+
+# Limites da margem (soma das probabilidades implícitas 1/H + 1/D + 1/A) de uma casa de apostas
+MARGEM_MINIMA = 1.0
+MARGEM_MAXIMA = 1.25
+
+# Diferença relativa aceita entre a média do mercado (Avg*) e a média das casas do arquivo (Media*)
+DIFERENCA_MEDIA = 0.10
+
+# Esquema da tabela de relatório de qualidade (uma linha por expectativa em cada execução)
+ESQUEMA_RELATORIO = ("IdExecucao STRING, DataExecucao TIMESTAMP, Tabela STRING, Expectativa STRING, "
+                     "Descricao STRING, Linhas LONG, Violacoes LONG, Proporcao DOUBLE, Tolerancia DOUBLE, "
+                     "Aprovada BOOLEAN")
+
+
+@dataclass(frozen=True)
+class Expectativa:
+    nome: str                # nome da métrica (letras, números e _)
+    descricao: str
+    violacao: str            # condição SQL verdadeira nas partidas que violam a expectativa
+    tolerancia: float = 0.0  # proporção de partidas com violação aceita
+
+
+def _expectativas():
+    expectativas = []
+    for r in RESULTADOS:
+        expectativas.append(Expectativa(
+            f"maximo_{r}", f"Max{r} não é menor que a maior cotação das casas (MaiorValor{r})",
+            f"Max{r} < MaiorValor{r}", 0.01))
+        expectativas.append(Expectativa(
+            f"media_{r}", f"Avg{r} não passa de Max{r} e difere no máximo {DIFERENCA_MEDIA:.0%} de Media{r}",
+            f"Avg{r} > Max{r} OR ABS(Avg{r} - Media{r}) > {DIFERENCA_MEDIA} * Media{r}", 0.01))
+    for casa in CASAS_MEDIA:
+        h, d, a = (f"{casa}{r}" for r in RESULTADOS)
+        expectativas.append(Expectativa(
+            f"margem_{casa}", f"Margem de {casa} (1/H + 1/D + 1/A) entre {MARGEM_MINIMA} e {MARGEM_MAXIMA}",
+            f"1 / {h} + 1 / {d} + 1 / {a} NOT BETWEEN {MARGEM_MINIMA} AND {MARGEM_MAXIMA}"))
+        expectativas.append(Expectativa(
+            f"preenchidas_{casa}", f"Cotações H, D e A de {casa} preenchidas",
+            f"{h} IS NULL OR {d} IS NULL OR {a} IS NULL", 0.05))
+    expectativas.append(Expectativa(
+        "resultado", "FTR coerente com o placar (FTHG, FTAG)",
+        "FTR IS NULL OR FTHG IS NULL OR FTAG IS NULL OR "
+        "FTR <> CASE WHEN FTHG > FTAG THEN 'H' WHEN FTHG < FTAG THEN 'A' ELSE 'D' END"))
+    return expectativas
+
+
+EXPECTATIVAS = _expectativas()
+
+
+def agregacoes_sql(expectativas=EXPECTATIVAS):
+    """Expressões SQL das métricas: linhas avaliadas e violações de cada expectativa.
+
+    Uma condição nula (cotação ausente) não conta como violação.
+    """
+    return ["COUNT(*) AS linhas"] + [f"SUM(CASE WHEN {e.violacao} THEN 1 ELSE 0 END) AS {e.nome}"
+                                     for e in expectativas]
+
+
+def observar(df, expectativas=EXPECTATIVAS):
+    """DataFrame que calcula as métricas das expectativas enquanto é gravado: (df observado, Observation).
+
+    Os valores ficam disponíveis em observacao.get depois da ação (a gravação da tabela).
+    """
+    from pyspark.sql import Observation
+    from pyspark.sql.functions import expr
+
+    observacao = Observation("qualidade")
+    return df.observe(observacao, *[expr(agregacao) for agregacao in agregacoes_sql(expectativas)]), observacao
+
+
+def relatorio(metricas, id_execucao, data_execucao, tabela, expectativas=EXPECTATIVAS):
+    """Linhas do relatório de qualidade (ESQUEMA_RELATORIO) a partir das métricas: nome -> valor."""
+    linhas = metricas["linhas"] or 0
+    resultado = []
+    for e in expectativas:
+        violacoes = metricas[e.nome] or 0
+        proporcao = violacoes / linhas if linhas else 0.0
+        resultado.append((id_execucao, data_execucao, tabela, e.nome, e.descricao, linhas, violacoes,
+                          proporcao, e.tolerancia, proporcao <= e.tolerancia))
+    return resultado
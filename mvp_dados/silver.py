@@ -0,0 +1,62 @@
+"""Colunas derivadas da camada silver, compartilhadas pelo notebook "MVP Dados" (carga completa da
+tabela silver.europa) e pela carga contínua do notebook "Streaming" (MERGE das partidas alteradas).
+
+Cada coluna é uma expressão SQL sobre as colunas da bronze e as derivadas declaradas antes dela; o
+Spark combina todas em uma única projeção. O módulo mvp_dados/probabilidades.py reproduz as mesmas
+expressões com NumPy.
+"""
+
+from pyspark.sql.functions import expr
+
+# Colunas derivadas da camada silver: (coluna, expressão SQL, tipo).
+# Cada expressão pode usar as colunas declaradas antes dela.
+DERIVACOES_SILVER = [
+    ("MaiorValorH", "GREATEST(B365H, BWH, IWH, PSH, WHH, VCH)", "DOUBLE"),
+    ("MaiorValorD", "GREATEST(B365D, BWD, IWD, PSD, WHD, VCD)", "DOUBLE"),
+    ("MaiorValorA", "GREATEST(B365A, BWA, IWA, PSA, WHA, VCA)", "DOUBLE"),
+    ("MediaH", """ROUND((COALESCE(B365H, 0) + COALESCE(BWH, 0) + COALESCE(IWH, 0) + COALESCE(PSH, 0) + COALESCE(WHH, 0) + COALESCE(VCH, 0)) /
+                        (CASE WHEN B365H IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN BWH IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN IWH IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN PSH IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN WHH IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN VCH IS NOT NULL THEN 1 ELSE 0 END), 2)""", "DOUBLE"),
+    ("MediaD", """ROUND((COALESCE(B365D, 0) + COALESCE(BWD, 0) + COALESCE(IWD, 0) + COALESCE(PSD, 0) + COALESCE(WHD, 0) + COALESCE(VCD, 0)) /
+                        (CASE WHEN B365D IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN BWD IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN IWD IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN PSD IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN WHD IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN VCD IS NOT NULL THEN 1 ELSE 0 END), 2)""", "DOUBLE"),
+    ("MediaA", """ROUND((COALESCE(B365A, 0) + COALESCE(BWA, 0) + COALESCE(IWA, 0) + COALESCE(PSA, 0) + COALESCE(WHA, 0) + COALESCE(VCA, 0)) /
+                        (CASE WHEN B365A IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN BWA IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN IWA IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN PSA IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN WHA IS NOT NULL THEN 1 ELSE 0 END +
+                         CASE WHEN VCA IS NOT NULL THEN 1 ELSE 0 END), 2)""", "DOUBLE"),
+    ("VencedorAposta", """CASE
+                              WHEN MediaH < MediaD AND MediaH < MediaA THEN 'H'
+                              WHEN MediaD < MediaH AND MediaD < MediaA THEN 'D'
+                              ELSE 'A'
+                          END""", "STRING"),
+    ("PercentAbsolH", "(1 / MediaH) * 100", "FLOAT"),
+    ("PercentAbsolD", "(1 / MediaD) * 100", "FLOAT"),
+    ("PercentAbsolA", "(1 / MediaA) * 100", "FLOAT"),
+    ("PercentH", "(PercentAbsolH * 100) / (PercentAbsolH + PercentAbsolD + PercentAbsolA)", "FLOAT"),
+    ("PercentD", "(PercentAbsolD * 100) / (PercentAbsolH + PercentAbsolD + PercentAbsolA)", "FLOAT"),
+    ("PercentA", "(PercentAbsolA * 100) / (PercentAbsolH + PercentAbsolD + PercentAbsolA)", "FLOAT"),
+    ("Percentual", """CASE
+                          WHEN FTR = 'H' THEN PercentH
+                          WHEN FTR = 'D' THEN PercentD
+                          WHEN FTR = 'A' THEN PercentA
+                          ELSE 0
+                      END""", "FLOAT"),
+]
+
+
+def derivar_silver(df):
+    """Acrescenta as colunas derivadas da camada silver. O Spark combina tudo em uma única projeção."""
+    for coluna, expressao, tipo in DERIVACOES_SILVER:
+        df = df.withColumn(coluna, expr(expressao).cast(tipo))
+    return df
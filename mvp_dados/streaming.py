@@ -0,0 +1,294 @@
+"""Carga contínua (streaming) dos .csv do football-data depositados em um diretório de entrada.
+
+Durante a temporada, o football-data republica o .csv de cada liga (E0.csv, I1.csv, ...) a cada
+rodada, com todas as partidas já disputadas. Cada nova versão de um arquivo é depositada no diretório
+de entrada em um subdiretório próprio (depositar): a fonte de arquivos do Structured Streaming
+identifica os arquivos pelo caminho e não relê um arquivo sobrescrito. Uma consulta (iniciar) monitora
+o diretório e processa os arquivos novos em micro-lotes (foreachBatch):
+
+1. os arquivos do lote passam pelas mesmas etapas da carga do notebook "MVP Dados": verificação do
+   cabeçalho contra o catálogo, leitura com o esquema tipado, normalização das datas e quarentena;
+   se uma partida aparece em mais de um arquivo do lote, vale a versão do arquivo mais recente;
+2. as partidas novas ou alteradas em relação à tabela bronze (comparando todas as colunas) são
+   registradas na tabela bronze.lotes_streaming, com o identificador do lote;
+3. apenas essas partidas são gravadas na bronze (MERGE), recalculadas na silver (derivar_silver e
+   MERGE) e têm as suas partições (temporada, liga e mês) reagregadas nas tabelas gold (MERGE).
+
+Exatamente uma vez: o checkpoint da consulta garante que cada arquivo entra em um único lote e que um
+lote interrompido é reprocessado com os mesmos arquivos. As partidas alteradas são registradas antes
+de qualquer outra gravação, em um append idempotente do Delta (txnAppId/txnVersion): ao reprocessar
+o lote, o registro original é mantido (mesmo que a bronze já tenha sido atualizada) e as etapas
+seguintes, MERGEs dos mesmos dados, produzem o mesmo resultado. As gravações na quarentena também são
+idempotentes.
+
+As demais tabelas derivadas da silver (movimento_odds, forma_equipes, ratings Elo etc.) continuam
+sendo recalculadas pelo notebook "MVP Dados".
+
+Execução local, com um diretório local como entrada (requer pyspark e delta-spark): os .csv das ligas
+do archive.zip são depositados no diretório e processados até o fim (Trigger.AvailableNow). Executar de
+novo deposita novas versões dos mesmos arquivos, que não devem alterar nenhuma partida:
+    python -m mvp_dados.streaming [diretorio_entrada] [diretorio_checkpoint] [archive.zip]
+"""
+
+import os
+import shutil
+import sys
+import urllib.request
+from datetime import datetime, timezone
+from urllib.parse import unquote
+
+from delta.tables import DeltaTable
+from pyspark.sql import Window
+from pyspark.sql.functions import broadcast, col, create_map, current_timestamp, lit, month, row_number
+
+from mvp_dados.arquivo_zip import abrir, cabecalho, caminho_membro, ler_texto, membros_ligas
+from mvp_dados.bronze import (completar_colunas, comentar, condicao_chave, ler_arquivos, mesclar_partidas,
+                              partidas_alteradas, preparar, registrar_versao, renomear, separar_quarentena, versao_da_tabela)
+from mvp_dados.catalogo import comentarios_bronze, ler_catalogo, verificar_cabecalho
+from mvp_dados.datas import (arquivos_acima_do_limite, datas_nulas_por_arquivo, formatos_por_arquivo, normalizar,
+                             separar_datas_nulas)
+from mvp_dados.esquema import VERSAO
+from mvp_dados.gold import CHAVES_GOLD, TABELAS_GOLD, mesclar_gold
+from mvp_dados.layout import particoes
+from mvp_dados.ligas import liga_do_arquivo
+from mvp_dados.silver import derivar_silver
+
+# Chave natural de uma partida (a mesma do notebook "MVP Dados")
+CHAVE_PARTIDA = ["League", "DateMatch", "HomeTeam", "AwayTeam"]
+
+# Partidas novas ou alteradas por cada lote: chave da partida, partição gold e identificação do lote
+TABELA_LOTES = "bronze.lotes_streaming"
+
+# Esquema da fonte binaryFile (apenas o caminho e a data de modificação são lidos)
+ESQUEMA_ENTRADA = "path STRING, modificationTime TIMESTAMP, length LONG, content BINARY"
+
+ESQUEMA_QUARENTENA_ARQUIVOS = ("Arquivo STRING, Motivo STRING, Desconhecidas ARRAY<STRING>, Ausentes ARRAY<STRING>, "
+                               "Repetidas ARRAY<STRING>, ProporcaoDatasNulas DOUBLE")
+
+
+def caminho_spark(caminho):
+    """Caminho do diretório para o Spark: "/dbfs/..." vira "dbfs:/..."; os demais, caminhos locais (file:)."""
+    if caminho.startswith("/dbfs/"):
+        return "dbfs:" + caminho[len("/dbfs"):]
+    return "file:" + os.path.abspath(caminho)
+
+
+def caminho_local(caminho):
+    """Inverso de caminho_spark, para os caminhos da fonte de arquivos: acessível com open() em todos os nós."""
+    caminho = unquote(caminho)
+    if caminho.startswith("dbfs:"):
+        return "/dbfs" + caminho[len("dbfs:"):]
+    if caminho.startswith("file:"):
+        return "/" + caminho[len("file:"):].lstrip("/")
+    return caminho
+
+
+def depositar(origem, diretorio_entrada, nome=None):
+    """Deposita uma versão do .csv (URL, caminho local ou caminho_membro de um .zip) no diretório de entrada.
+
+    Cada versão vai para um subdiretório próprio, com o nome original do arquivo (reconhecido por
+    liga_do_arquivo). O arquivo é gravado com um nome temporário e renomeado ao final, para que a
+    consulta nunca leia um arquivo incompleto. Retorna o caminho do arquivo depositado.
+    """
+    nome = nome or origem.rstrip("/").rsplit("/", 1)[-1]
+    momento = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    destino = os.path.join(diretorio_entrada, momento, nome)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = os.path.join(os.path.dirname(destino), f".{nome}.tmp")
+    if origem.startswith(("http://", "https://")):
+        urllib.request.urlretrieve(origem, temporario)
+    else:
+        with abrir(origem) as conteudo, open(temporario, "wb") as arquivo:
+            shutil.copyfileobj(conteudo, arquivo)
+    os.replace(temporario, destino)
+    return destino
+
+
+def _ler_lote(spark, arquivos, catalogo):
+    """Lê os arquivos do lote: retorna (partidas, linhas em quarentena, arquivos rejeitados, leitura em cache).
+
+    arquivos: caminho -> data de modificação. Os arquivos rejeitados são linhas para a tabela
+    bronze.quarentena_arquivos (ESQUEMA_QUARENTENA_ARQUIVOS).
+    """
+    colunas_bronze = spark.table("bronze.europa").columns if spark.catalog.tableExists("bronze.europa") else []
+    rejeitados = []
+    validos = []
+    for arquivo in sorted(arquivos, key=arquivos.get):
+        diagnostico = verificar_cabecalho(arquivo, cabecalho(arquivo), catalogo, colunas_bronze,
+                                          liga_do_arquivo(arquivo).colunas_extras)
+        if diagnostico.acao == "quarentena":
+            rejeitados.append((arquivo, "cabeçalho", diagnostico.desconhecidas, diagnostico.ausentes,
+                               diagnostico.repetidas, None))
+        else:
+            validos.append(arquivo)
+
+    df_lido = ler_arquivos(spark, validos).cache()
+    df_validas, df_quarentena = separar_quarentena(df_lido)
+    df_normalizado = normalizar(df_validas, formatos_por_arquivo(validos))
+    datas_invalidas = arquivos_acima_do_limite(datas_nulas_por_arquivo(df_normalizado))
+    if datas_invalidas:
+        df_normalizado = df_normalizado.filter(~col("_arquivo").isin(list(datas_invalidas)))
+        rejeitados += [(arquivo, "datas", [], [], [], proporcao) for arquivo, proporcao in datas_invalidas.items()]
+    df_normalizado, df_datas_nulas = separar_datas_nulas(df_normalizado)
+
+    # Versão mais recente de cada partida: a do arquivo com a maior data de modificação
+    modificacao = lit(None).cast("timestamp")
+    if validos:
+        modificacao = create_map(*[lit(valor) for arquivo in validos for valor in (arquivo, arquivos[arquivo])])
+        modificacao = modificacao[col("_arquivo")]
+    df_partidas = completar_colunas(renomear(preparar(spark, df_normalizado.withColumn("_modificacao", modificacao))))
+    ordem = Window.partitionBy(*CHAVE_PARTIDA).orderBy(col("_modificacao").desc())
+    df_partidas = (df_partidas.withColumn("_ordem", row_number().over(ordem))
+                   .where(col("_ordem") == 1)
+                   .drop("_ordem", "_modificacao"))
+    return df_partidas, df_quarentena.unionByName(df_datas_nulas), rejeitados, df_lido
+
+
+def registrar_alteracoes(spark, df_carga, id_lote, id_aplicacao):
+    """Registra em TABELA_LOTES as partidas do lote novas ou alteradas em relação à bronze e retorna as
+    chaves registradas para o lote (as da primeira execução, se o lote estiver sendo reprocessado)."""
+    # Mesma comparação da carga em lote do notebook (apenas as partições do lote são lidas da bronze)
+    df_alteradas = partidas_alteradas(spark, "bronze.europa", df_carga)
+    (df_alteradas.select(*CHAVE_PARTIDA, "Temporada", month("DateMatch").alias("Mes"))
+        .withColumn("IdAplicacao", lit(id_aplicacao))
+        .withColumn("IdLote", lit(id_lote))
+        .withColumn("DataIngestao", current_timestamp())
+        .write.format("delta").mode("append")
+        .option("txnAppId", id_aplicacao).option("txnVersion", id_lote)
+        .saveAsTable(TABELA_LOTES))
+    return (spark.table(TABELA_LOTES)
+            .where((col("IdAplicacao") == id_aplicacao) & (col("IdLote") == id_lote))
+            .select(*CHAVE_PARTIDA, "Temporada", "Mes"))
+
+
+def gravar_bronze(spark, df_alteradas):
+    """Grava as partidas alteradas na bronze.europa (MERGE), criando a tabela na primeira carga."""
+    if not spark.catalog.tableExists("bronze.europa"):
+        df_alteradas.write.format("delta").partitionBy(*particoes("bronze.europa")).saveAsTable("bronze.europa")
+        registrar_versao(spark, "bronze.europa")
+        return
+    # Mesmo MERGE da carga em lote do notebook (inclusive para colunas novas no esquema)
+    mesclar_partidas(spark, "bronze.europa", df_alteradas, CHAVE_PARTIDA)
+
+
+def gravar_silver(spark, df_chaves):
+    """Recalcula as colunas derivadas das partidas alteradas e as grava na silver.europa (MERGE)."""
+    df_bronze = spark.table("bronze.europa")
+    if not spark.catalog.tableExists("silver.europa"):
+        (derivar_silver(df_bronze).write.format("delta")
+            .partitionBy(*particoes("silver.europa")).saveAsTable("silver.europa"))
+        return
+    df_alteradas = derivar_silver(df_bronze.join(broadcast(df_chaves.select(*CHAVE_PARTIDA, "Temporada")),
+                                                 CHAVE_PARTIDA + ["Temporada"], "left_semi"))
+    (DeltaTable.forName(spark, "silver.europa").alias("t")
+        .merge(df_alteradas.alias("s"), condicao_chave("silver.europa", CHAVE_PARTIDA))
+        .whenMatchedUpdateAll()
+        .whenNotMatchedInsertAll()
+        .execute())
+
+
+def gravar_gold(spark, df_chaves):
+    """Reagrega as partições (temporada, liga e mês) das partidas alteradas em cada tabela gold (MERGE)."""
+    df_silver = spark.table("silver.europa").withColumn("Mes", month("DateMatch"))
+    particoes_alteradas = [tuple(linha) for linha in df_chaves.select(*CHAVES_GOLD).distinct().collect()]
+    for tabela, (agregar, _) in TABELAS_GOLD.items():
+        if not spark.catalog.tableExists(tabela):
+            agregar(df_silver).write.format("delta").saveAsTable(tabela)
+            continue
+        mesclar_gold(spark, tabela, df_silver, particoes_alteradas)
+
+
+def processar_lote(spark, df_lote, id_lote, catalogo, id_aplicacao):
+    """Processa um micro-lote da consulta: bronze, silver e gold apenas das partidas novas ou alteradas."""
+    arquivos = {caminho_local(linha.path): linha.modificationTime
+                for linha in df_lote.select("path", "modificationTime").collect()}
+    # Arquivos que não são de ligas cadastradas são ignorados
+    arquivos = {arquivo: modificacao for arquivo, modificacao in arquivos.items()
+                if liga_do_arquivo(arquivo) is not None}
+    if not arquivos:
+        return
+
+    df_partidas, df_quarentena, rejeitados, df_lido = _ler_lote(spark, arquivos, catalogo)
+    df_carga = comentar(df_partidas, comentarios_bronze(catalogo)).cache()
+
+    df_chaves = registrar_alteracoes(spark, df_carga, id_lote, id_aplicacao).cache()
+    if not df_chaves.isEmpty():
+        gravar_bronze(spark, df_carga.join(df_chaves.select(*CHAVE_PARTIDA, "Temporada"),
+                                           CHAVE_PARTIDA + ["Temporada"], "left_semi"))
+        gravar_silver(spark, df_chaves)
+        gravar_gold(spark, df_chaves)
+
+    # Quarentena, também idempotente no reprocessamento do lote
+    if not df_quarentena.isEmpty():
+        (df_quarentena.write.format("delta").mode("append")
+            .option("txnAppId", id_aplicacao).option("txnVersion", id_lote)
+            .saveAsTable("bronze.quarentena"))
+    if rejeitados:
+        (spark.createDataFrame(rejeitados, ESQUEMA_QUARENTENA_ARQUIVOS)
+            .withColumn("DataIngestao", current_timestamp())
+            .write.format("delta").mode("append").option("mergeSchema", "true")
+            .option("txnAppId", id_aplicacao).option("txnVersion", id_lote)
+            .saveAsTable("bronze.quarentena_arquivos"))
+
+    for df in (df_chaves, df_carga, df_lido):
+        df.unpersist()
+
+
+def iniciar(spark, diretorio_entrada, diretorio_checkpoint, catalogo, intervalo="1 minute", arquivos_por_lote=None,
+            disponiveis=False):
+    """Inicia a consulta que monitora o diretório de entrada e retorna o StreamingQuery.
+
+    Os diretórios são caminhos locais ("/dbfs/..." no Databricks). Com disponiveis=True, a consulta
+    processa os arquivos já depositados e termina (Trigger.AvailableNow); caso contrário, verifica o
+    diretório a cada intervalo. O checkpoint identifica a consulta: reiniciá-la com o mesmo diretório
+    de checkpoint continua do último lote concluído.
+    """
+    if spark.catalog.tableExists("bronze.europa") and versao_da_tabela(spark, "bronze.europa") != VERSAO:
+        raise ValueError(f"A tabela bronze.europa não está na versão {VERSAO} do esquema: "
+                         f"execute a carga completa do notebook \"MVP Dados\" antes da carga contínua")
+
+    # Colunas novas (de arquivos de outras temporadas) são acrescentadas às tabelas pelos MERGEs
+    spark.conf.set("spark.databricks.delta.schema.autoMerge.enabled", "true")
+    id_aplicacao = f"{__name__}:{diretorio_checkpoint}"
+
+    leitura = spark.readStream.format("binaryFile").schema(ESQUEMA_ENTRADA)
+    if arquivos_por_lote:
+        leitura = leitura.option("maxFilesPerTrigger", arquivos_por_lote)
+    escrita = (leitura.load(f"{caminho_spark(diretorio_entrada)}/*/*.csv")
+               .select("path", "modificationTime")
+               .writeStream.queryName("carga_continua")
+               .option("checkpointLocation", caminho_spark(diretorio_checkpoint))
+               .foreachBatch(lambda df_lote, id_lote: processar_lote(spark, df_lote, id_lote, catalogo,
+                                                                     id_aplicacao)))
+    escrita = escrita.trigger(availableNow=True) if disponiveis else escrita.trigger(processingTime=intervalo)
+    return escrita.start()
+
+
+def executar(diretorio_entrada="entrada_streaming", diretorio_checkpoint="checkpoint_streaming",
+             caminho_zip="archive.zip"):
+    """Execução local: deposita os .csv das ligas do .zip no diretório de entrada e processa todos os lotes."""
+    from delta import configure_spark_with_delta_pip
+    from pyspark.sql import SparkSession
+
+    construtor = (SparkSession.builder.master("local[*]").appName(__name__)
+                  .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
+                  .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog"))
+    spark = configure_spark_with_delta_pip(construtor).getOrCreate()
+    for banco in ("bronze", "silver", "gold"):
+        spark.sql(f"CREATE DATABASE IF NOT EXISTS {banco}")
+
+    for caminho, _, _ in membros_ligas(caminho_zip):
+        print(f"Depositado: {depositar(caminho, diretorio_entrada)}")
+    catalogo = ler_catalogo(ler_texto(caminho_membro(caminho_zip, "notes.txt")))
+    iniciar(spark, diretorio_entrada, diretorio_checkpoint, catalogo, disponiveis=True).awaitTermination()
+
+    print("Partidas novas ou alteradas por lote:")
+    spark.table(TABELA_LOTES).groupBy("IdLote").count().orderBy("IdLote").show()
+    spark.sql("SELECT League, COUNT(*) AS Partidas FROM silver.europa GROUP BY League ORDER BY League").show()
+    spark.sql("SELECT ROUND(SUM(AcertosAbsolutos) * 100.0 / SUM(Partidas), 2) AS PercentualAbsoluto, "
+              "ROUND(SUM(SomaPercentual) / SUM(PartidasComPercentual), 2) AS PercentualPonderado "
+              "FROM gold.acertos_liga_mes").show()
+
+
+if __name__ == "__main__":
+    executar(*sys.argv[1:])
@@ -0,0 +1,27 @@
+"""Testes da banca simulada pelo backtest (mvp_dados/backtest.py) ao longo da temporada."""
+
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from mvp_dados.backtest import BANCA_INICIAL, Estrategia, avaliar
+
+FAVORITO = Estrategia("favorito", "favorito")
+
+
+def test_banca_acumulada_entre_os_meses_da_temporada():
+    # Aposta de 1 unidade no favorito (H) a 2,0: ganha em agosto, perde duas vezes em setembro
+    df = pd.DataFrame({
+        "League": "Inglaterra", "Temporada": 2023,
+        "DateMatch": [date(2023, 8, 12), date(2023, 9, 2), date(2023, 9, 16)],
+        "HomeTeam": ["A", "B", "C"], "AwayTeam": ["D", "E", "F"],
+        "VencedorAposta": "H", "FTR": ["H", "A", "D"],
+        "MediaH": 2.0, "MediaD": 3.5, "MediaA": 4.0,
+    })
+    agosto, setembro = avaliar(df, [FAVORITO]).itertuples(index=False)
+    assert (agosto.Mes, agosto.Lucro, agosto.Banca, agosto.MaxDrawdown) == (8, 1.0, BANCA_INICIAL + 1, 0.0)
+    # A banca de setembro parte da de agosto, e o rebaixamento é medido contra o pico de 101 unidades
+    assert (setembro.Mes, setembro.Lucro, setembro.Banca) == (9, -2.0, BANCA_INICIAL - 1)
+    assert setembro.ROI == pytest.approx(-1.0)
+    assert setembro.MaxDrawdown == pytest.approx(2 / 101 * 100)
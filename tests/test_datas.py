@@ -0,0 +1,32 @@
+"""Testes do século dos anos em dois dígitos (mvp_dados/datas.py), compartilhado pelo Spark e pela execução local."""
+
+import io
+
+import pandas as pd
+
+from mvp_dados.datas import FORMATOS_DATA, ano_referencia, corrigir_ano
+from mvp_dados.ligas import LIGAS
+from mvp_dados.local import ler_arquivo
+
+DD_MM_YY = FORMATOS_DATA[1]
+
+
+def test_ano_referencia_somente_com_dois_digitos():
+    assert ano_referencia(["", "19/08/95"], DD_MM_YY) == 1995
+    assert ano_referencia(["12/08/23"], DD_MM_YY) == 2023
+    assert ano_referencia(["12/08/2023"], FORMATOS_DATA[0]) is None
+
+
+def test_corrigir_ano_pelo_ano_de_referencia():
+    # %y do Python (1969-2068) e yy do Spark (2000-2099) levam ao mesmo ano
+    assert corrigir_ano(2095, 1995) == corrigir_ano(1995, 1995) == 1995
+    # temporada que atravessa a virada do século
+    assert corrigir_ano(2000, 1999) == 2000 and corrigir_ano(2099, 1999) == 1999
+    assert list(corrigir_ano(pd.Series([2023, 2024]), 2023)) == [2023, 2024]
+
+
+def test_ler_arquivo_temporada_dos_anos_1990():
+    csv = "Div,Date,HomeTeam,AwayTeam,FTHG,FTAG,FTR\nE0,19/08/99,A,B,1,0,H\nE0,15/05/00,B,A,0,0,D\n"
+    partidas, quarentena = ler_arquivo(io.StringIO(csv), "E0.csv", LIGAS[0])
+    assert list(partidas["Date"].dt.year) == [1999, 2000]
+    assert quarentena.empty
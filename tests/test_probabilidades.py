@@ -0,0 +1,106 @@
+"""Testes do cálculo vetorizado das colunas derivadas da camada silver (mvp_dados/probabilidades.py).
+
+Os valores esperados foram calculados à mão com as regras do Spark SQL: ROUND com HALF_UP sobre a
+representação decimal, FLOAT (float32) nas probabilidades e 'A' nos empates de VencedorAposta.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mvp_dados.probabilidades import (arredondar, derivar, maiores, medias, percentual, probabilidades,
+                                      vencedor_aposta)
+
+ARCHIVE_ZIP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archive.zip")
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    (2.075, 2.08),
+    (2.0749999999999997, 2.07),   # abaixo da fronteira na representação decimal
+    (-2.075, -2.08),              # simétrico para negativos
+    (1.005, 1.01),                # o double mais próximo de 1.005 arredonda para cima, como no Spark
+    (0.125, 0.13),                # HALF_UP, e não o arredondamento bancário do np.round (0.12)
+    (3.0, 3.0),
+])
+def test_arredondar_half_up(valor, esperado):
+    assert arredondar([valor], 2)[0] == esperado
+
+
+def test_arredondar_preserva_nulos():
+    assert np.isnan(arredondar([np.nan])[0])
+
+
+def test_maiores_ignora_nulos():
+    odds = np.array([[1.5, np.nan, 2.0],
+                     [np.nan, np.nan, np.nan]])
+    resultado = maiores(odds)
+    assert resultado[0] == 2.0
+    assert np.isnan(resultado[1])
+
+
+def test_medias_somente_das_casas_com_cotacao():
+    odds = np.array([[2.0, 2.1, np.nan],
+                     [1.11, 1.12, 1.12],
+                     [np.nan, np.nan, np.nan]])
+    resultado = medias(odds)
+    assert resultado[0] == 2.05
+    assert resultado[1] == 1.12   # 1.116666... arredondado em 2 casas
+    assert np.isnan(resultado[2])
+
+
+def test_vencedor_aposta_empates_e_nulos_resultam_em_a():
+    resultado = vencedor_aposta([2.0, 1.5, 3.0, np.nan, 2.0],
+                                [2.0, 3.0, 2.0, 1.0, 3.0],
+                                [3.0, 4.0, 4.0, 2.0, 2.0])
+    assert list(resultado) == ["A", "H", "D", "A", "A"]
+
+
+def test_probabilidades_em_float32():
+    absolutas, normalizadas = probabilidades([1.5, 2.0], [3.6, 4.0], [6.5, 4.0])
+    assert absolutas.dtype == np.float32 and normalizadas.dtype == np.float32
+    # 100 / 1.5, 100 / 3.6 e 100 / 6.5 convertidos para FLOAT
+    assert list(absolutas[:, 0]) == [np.float32(66.666664), np.float32(27.777779), np.float32(15.384615)]
+    # PercentAbsol * 100 em float32, dividido pela soma (109.829056) em double e convertido para FLOAT
+    assert list(normalizadas[:, 0]) == [np.float32(60.70039), np.float32(25.29183), np.float32(14.007783)]
+    assert list(absolutas[:, 1]) == [50, 25, 25]
+    assert list(normalizadas[:, 1]) == [50, 25, 25]
+
+
+def test_percentual_do_resultado_ocorrido():
+    resultado = percentual(["H", "D", "A", None], [50, 50, 50, 50], [30, 30, 30, 30], [20, 20, 20, 20])
+    assert list(resultado) == [50, 30, 20, 0]
+    assert resultado.dtype == np.float32
+
+
+def test_derivar_partida_calculada_a_mao():
+    df = pd.DataFrame({
+        "FTR": ["D"],
+        "B365H": [2.0], "B365D": [3.2], "B365A": [4.0],
+        "BWH": [2.1], "BWD": [3.3], "BWA": [3.8],
+        "IWH": [None], "IWD": [None], "IWA": [None],
+        "PSH": [2.05], "PSD": [3.4], "PSA": [4.1],
+        "WHH": [2.0], "WHD": [3.25], "WHA": [3.9],
+        "VCH": [2.05], "VCD": [3.35], "VCA": [4.0],
+    })
+    linha = derivar(df).iloc[0]
+    assert (linha["MaiorValorH"], linha["MaiorValorD"], linha["MaiorValorA"]) == (2.1, 3.4, 4.1)
+    # (2.0 + 2.1 + 2.05 + 2.0 + 2.05) / 5 = 2.04; (3.2 + 3.3 + 3.4 + 3.25 + 3.35) / 5 = 3.3;
+    # (4.0 + 3.8 + 4.1 + 3.9 + 4.0) / 5 = 3.96
+    assert (linha["MediaH"], linha["MediaD"], linha["MediaA"]) == (2.04, 3.3, 3.96)
+    assert linha["VencedorAposta"] == "H"
+    assert linha["PercentAbsolH"] == np.float32(100 / 2.04)
+    assert linha["Percentual"] == linha["PercentD"]
+    assert linha["PercentH"] + linha["PercentD"] + linha["PercentA"] == pytest.approx(100, abs=1e-4)
+
+
+@pytest.mark.skipif(not os.path.exists(ARCHIVE_ZIP), reason="archive.zip não encontrado")
+def test_indices_de_acerto_iguais_aos_do_notebook(tmp_path):
+    """Os índices calculados com as colunas derivadas são os publicados pelo notebook (Spark SQL)."""
+    pytest.importorskip("duckdb")
+    from mvp_dados.local import executar
+
+    resultados, _ = executar(ARCHIVE_ZIP, str(tmp_path))
+    geral = resultados["geral"].iloc[0]
+    assert (geral["PercentualAbsoluto"], geral["PercentualPonderado"]) == (55.05, 42.31)